@@ -0,0 +1,545 @@
+"""Optional in-memory analytics engine over a columnar snapshot of ``entries``.
+
+With ``ANALYTICS_ENGINE`` set (and NumPy installed), every process keeps
+the entries as NumPy columns: days since 1970, amounts as int64 cents, an
+income flag and category ids, plus the project links as CSR-style arrays
+(``indptr`` per row into ``edge_projects``, and ``edge_rows`` mapping each
+link back to its row). Like the SQL summaries with their rollup tables,
+whole months are answered from per-month cubes of counts and sums, kept
+current with ``np.add.at`` as rows come and go; only the partial months at
+the edges of a range are reduced from a boolean mask with ``bincount``.
+Sums run in float64 and are exact while they stay below 2**53 cents.
+
+The snapshot is loaded at startup and kept current from the change feed's
+``entry_changes`` log: before answering, a read applies the events
+committed since the snapshot's last one, so it sees every write of every
+worker that its ETag covers. Updates append a new row and mark the old
+one dead; dead rows are compacted away once they are a quarter of the
+snapshot. Batch updates reload their rows. Imports, seeding and rollup
+rebuilds (``imported``/``reset`` events) and pruned events need the whole
+snapshot again: it is reloaded in the background, and the summaries
+answer from SQL until it is in place.
+"""
+import asyncio
+import logging
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Optional
+import orjson
+from sqlalchemy import BigInteger, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from .models.change import EntryChange
+from .models.entry import Category, Entry, EntryType, Project, entry_projects
+from .rollups import next_month, whole_months
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is an optional dependency
+    np = None
+
+log = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+LOAD_BATCH_SIZE = 50_000
+# Compact once dead rows are this share of the snapshot
+COMPACT_RATIO = 0.25
+# Backoff between attempts to load the snapshot, in seconds
+RELOAD_DELAY = 1
+RELOAD_MAX_DELAY = 60
+# Events after which only a full reload brings the snapshot up to date
+RELOAD_OPS = ("imported", "reset")
+
+
+def to_days(d: date) -> int:
+    return (d - EPOCH).days
+
+
+def month_code(d: date) -> int:
+    """Months since 1970-01."""
+    return (d.year - 1970) * 12 + d.month - 1
+
+
+def month_date(code: int) -> date:
+    """Months since 1970-01 as the first day of that month."""
+    return date(1970 + code // 12, code % 12 + 1, 1)
+
+
+def month_parts(date_from: Optional[date], date_to: Optional[date]):
+    """The whole months of a range as (first, last) codes, or None, and the date ranges around them."""
+    full = whole_months(date_from, date_to)
+    if full is None:
+        return None, [(date_from, date_to)]
+    first, last = full
+    edges = []
+    if first and date_from < first:
+        edges.append((date_from, first - timedelta(days=1)))
+    if last and date_to >= next_month(last):
+        edges.append((next_month(last), date_to))
+    return (first and month_code(first), last and month_code(last)), edges
+
+
+class MonthCube:
+    """Counts and sums per month, key (category or project) and type; the rollup tables in memory."""
+
+    def __init__(self, dtype):
+        self.first = 0
+        self.counts = np.zeros((0, 0, 2), np.int64)
+        self.sums = np.zeros((0, 0, 2), dtype)
+
+    def _fit(self, months, keys):
+        months_now, keys_now, _ = self.counts.shape
+        lo, hi, width = int(months.min()), int(months.max()), max(int(keys.max()) + 1, keys_now)
+        if months_now:
+            lo, hi = min(lo, self.first), max(hi, self.first + months_now - 1)
+        if (lo, hi - lo + 1, width) == (self.first, months_now, keys_now):
+            return
+        offset = self.first - lo
+        for name in ("counts", "sums"):
+            old = getattr(self, name)
+            new = np.zeros((hi - lo + 1, width, 2), old.dtype)
+            if months_now:
+                new[offset:offset + months_now, :keys_now] = old
+            setattr(self, name, new)
+        self.first = lo
+
+    def add(self, months, keys, income, amounts, sign: int):
+        if not len(months):
+            return
+        self._fit(months, keys)
+        index = (months - self.first, keys, income.astype(np.intp))
+        np.add.at(self.counts, index, sign)
+        np.add.at(self.sums, index, amounts * sign)
+
+    def between(self, first: Optional[int], last: Optional[int]):
+        """Counts, sums and first month code of the months ``first`` to ``last``; None bounds stay open."""
+        months = len(self.counts)
+        lo = 0 if first is None else min(max(first - self.first, 0), months)
+        hi = months if last is None else min(max(last - self.first + 1, lo), months)
+        return self.counts[lo:hi], self.sums[lo:hi], self.first + lo
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.nbytes + self.sums.nbytes
+
+
+class ColumnarEntries:
+    """Growable columns of the entries and their project links; rows are only appended."""
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.edge_count = 0
+        self.dead = 0
+        self.days = np.zeros(capacity, np.int32)
+        # Months since 1970-01, derived from days once instead of per query
+        self.months = np.zeros(capacity, np.int32)
+        self.cents = np.zeros(capacity, np.int64)
+        self.income = np.zeros(capacity, np.bool_)
+        # 0 for entries without a category
+        self.categories = np.zeros(capacity, np.int32)
+        self.alive = np.zeros(capacity, np.bool_)
+        self.indptr = np.zeros(capacity + 1, np.int64)
+        self.edge_rows = np.zeros(capacity, np.int32)
+        self.edge_projects = np.zeros(capacity, np.int32)
+        # Row of each entry id, -1 where there is none
+        self.row_of_id = np.full(capacity, -1, np.int32)
+        self.by_category = MonthCube(np.int64)
+        self.by_project = MonthCube(np.int64)
+        # Each link's share of its entry, for the split allocation
+        self.by_project_split = MonthCube(np.float64)
+
+    @staticmethod
+    def _grown(array, needed: int, fill=0):
+        if needed <= len(array):
+            return array
+        grown = np.full(max(needed, 2 * len(array)), fill, array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def append(self, ids, days, cents, income, categories, project_counts, projects):
+        """Add rows; ``projects`` lists the project ids of all rows, ``project_counts`` per row."""
+        n, e = len(ids), len(projects)
+        start, end = self.size, self.size + n
+        for name in ("days", "months", "cents", "income", "categories", "alive"):
+            setattr(self, name, self._grown(getattr(self, name), end))
+        self.indptr = self._grown(self.indptr, end + 1)
+        self.edge_rows = self._grown(self.edge_rows, self.edge_count + e)
+        self.edge_projects = self._grown(self.edge_projects, self.edge_count + e)
+        self.row_of_id = self._grown(self.row_of_id, int(np.max(ids, initial=0)) + 1, -1)
+        # An entry added again replaces its old row
+        replaced = self.row_of_id[np.asarray(ids, np.int64)]
+        replaced = np.unique(replaced[replaced >= 0])
+        self._count(replaced, -1)
+        self.alive[replaced] = False
+        self.dead += len(replaced)
+
+        self.days[start:end] = days
+        self.months[start:end] = np.asarray(days, np.int32).astype("datetime64[D]").astype("datetime64[M]").astype(np.int32)
+        self.cents[start:end] = cents
+        self.income[start:end] = income
+        self.categories[start:end] = categories
+        self.alive[start:end] = True
+        counts = np.asarray(project_counts, np.int64)
+        self.indptr[start + 1:end + 1] = self.edge_count + np.cumsum(counts)
+        self.edge_rows[self.edge_count:self.edge_count + e] = np.repeat(np.arange(start, end, dtype=np.int32), counts)
+        self.edge_projects[self.edge_count:self.edge_count + e] = projects
+        self.row_of_id[np.asarray(ids)] = np.arange(start, end, dtype=np.int32)
+        self.size, self.edge_count = end, self.edge_count + e
+        self._count(np.arange(start, end), 1)
+
+    def _edges(self, rows):
+        """The link positions of ``rows``."""
+        starts = self.indptr[rows]
+        counts = self.indptr[rows + 1] - starts
+        return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+    def _count(self, rows, sign: int):
+        """Add ``rows`` to the month cubes, or take them out again with ``sign`` -1."""
+        if not len(rows):
+            return
+        months, income, cents = self.months[rows], self.income[rows], self.cents[rows]
+        self.by_category.add(months, self.categories[rows], income, cents, sign)
+        edges = self._edges(rows)
+        edge_rows, projects = self.edge_rows[edges], self.edge_projects[edges]
+        months, income, cents = self.months[edge_rows], self.income[edge_rows], self.cents[edge_rows]
+        self.by_project.add(months, projects, income, cents, sign)
+        links = self.indptr[edge_rows + 1] - self.indptr[edge_rows]
+        self.by_project_split.add(months, projects, income, cents / links, sign)
+
+    def add(self, entry: dict):
+        """Add one entry as the API returns it."""
+        projects = [p["id"] for p in entry["projects"]]
+        self.append([entry["id"]], [to_days(date.fromisoformat(entry["date"]))],
+                    [round(entry["amount"] * 100)], [entry["entry_type"] == EntryType.EINNAHME.value],
+                    [entry["category_id"] or 0], [len(projects)], projects)
+
+    def remove(self, ids):
+        ids = np.asarray(ids, np.int64)
+        ids = ids[ids < len(self.row_of_id)]
+        rows = self.row_of_id[ids]
+        rows = np.unique(rows[rows >= 0])
+        self._count(rows, -1)
+        self.alive[rows] = False
+        self.row_of_id[ids] = -1
+        self.dead += len(rows)
+        if self.dead > COMPACT_RATIO * self.size:
+            self.compact()
+
+    def compact(self):
+        """Drop dead rows and their links, keeping the order of the rest."""
+        n = self.size
+        keep = self.alive[:n]
+        ids = np.flatnonzero(self.row_of_id >= 0)
+        ids = ids[np.argsort(self.row_of_id[ids])]
+        edges = keep[self.edge_rows[:self.edge_count]]
+        fresh = ColumnarEntries(max(len(ids), 1024))
+        fresh.append(ids, self.days[:n][keep], self.cents[:n][keep], self.income[:n][keep],
+                     self.categories[:n][keep], np.diff(self.indptr[:n + 1])[keep],
+                     self.edge_projects[:self.edge_count][edges])
+        self.__dict__.update(fresh.__dict__)
+
+    def trim(self):
+        """Give back the spare capacity that growing left behind."""
+        for name in ("days", "months", "cents", "income", "categories", "alive"):
+            setattr(self, name, getattr(self, name)[:self.size].copy())
+        self.indptr = self.indptr[:self.size + 1].copy()
+        self.edge_rows = self.edge_rows[:self.edge_count].copy()
+        self.edge_projects = self.edge_projects[:self.edge_count].copy()
+        ids = np.flatnonzero(self.row_of_id >= 0)
+        self.row_of_id = self.row_of_id[:int(ids[-1]) + 1 if len(ids) else 0].copy()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in (
+            "days", "months", "cents", "income", "categories", "alive", "indptr", "edge_rows", "edge_projects", "row_of_id",
+            "by_category", "by_project", "by_project_split"))
+
+    def mask(self, date_from: Optional[date] = None, date_to: Optional[date] = None):
+        """The selected rows, or None for all of them."""
+        days = self.days[:self.size]
+        mask = self.alive[:self.size].copy() if self.dead else None
+        if date_from:
+            mask = days >= to_days(date_from) if mask is None else mask & (days >= to_days(date_from))
+        if date_to:
+            mask = days <= to_days(date_to) if mask is None else mask & (days <= to_days(date_to))
+        return mask
+
+    def column(self, name: str, mask):
+        column = getattr(self, name)[:self.size]
+        return column if mask is None else column[mask]
+
+    def monthly(self, date_from: Optional[date] = None, date_to: Optional[date] = None):
+        """(month code, is income, count, cents) per month and type, plus expense cents per category."""
+        full, edges = month_parts(date_from, date_to)
+        monthly, by_category = [], {}
+        for lo, hi in edges:
+            rows, categories = self._scan(lo, hi)
+            monthly += rows
+            for c, cents in categories:
+                by_category[c] = by_category.get(c, 0) + cents
+        if full:
+            counts, sums, first = self.by_category.between(*full)
+            month_counts, month_sums = counts.sum(axis=1), sums.sum(axis=1)
+            for m, income in zip(*np.nonzero(month_counts)):
+                monthly.append((first + int(m), bool(income), int(month_counts[m, income]), int(month_sums[m, income])))
+            expenses = counts[:, :, 0].sum(axis=0)
+            expense_sums = sums[:, :, 0].sum(axis=0)
+            for c in np.flatnonzero(expenses[1:]) + 1:
+                by_category[int(c)] = by_category.get(int(c), 0) + int(expense_sums[c])
+        return monthly, list(by_category.items())
+
+    def _scan(self, date_from: Optional[date], date_to: Optional[date]):
+        """``monthly`` for a range, reduced from the rows."""
+        mask = self.mask(date_from, date_to)
+        months = self.column("months", mask)
+        if not len(months):
+            return [], []
+        income = self.column("income", mask)
+        cents = self.column("cents", mask)
+        first = int(months.min())
+        key = (months - first) * 2 + income
+        counts = np.bincount(key)
+        sums = np.rint(np.bincount(key, weights=cents)).astype(np.int64)
+        monthly = [(first + int(k) // 2, bool(k % 2), int(counts[k]), int(sums[k])) for k in np.flatnonzero(counts)]
+
+        # Income and expense per category in one pass; the summary reports expenses
+        key = self.column("categories", mask) * 2 + income
+        counts = np.bincount(key)[0::2]
+        sums = np.rint(np.bincount(key, weights=cents)[0::2]).astype(np.int64)
+        return monthly, [(int(c), int(sums[c])) for c in np.flatnonzero(counts) if c > 0]
+
+    def project_monthly(self, allocation: str, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                        project_id: Optional[int] = None):
+        """(project id, month code, is income, amount in cents) per project, month and type."""
+        full, edges = month_parts(date_from, date_to)
+        result = []
+        for lo, hi in edges:
+            result += self._scan_projects(allocation, lo, hi, project_id)
+        if full:
+            cube = self.by_project_split if allocation == "split" else self.by_project
+            counts, sums, first = cube.between(*full)
+            keys = np.arange(counts.shape[1])
+            if project_id:
+                keys = keys[project_id:project_id + 1]
+                counts, sums = counts[:, keys], sums[:, keys]
+            for m, k, income in zip(*np.nonzero(counts)):
+                result.append((int(keys[k]), first + int(m), bool(income), float(sums[m, k, income])))
+        return result
+
+    def _scan_projects(self, allocation: str, date_from: Optional[date], date_to: Optional[date],
+                       project_id: Optional[int]):
+        """``project_monthly`` for a range, reduced from the links."""
+        rows = self.edge_rows[:self.edge_count]
+        projects = self.edge_projects[:self.edge_count]
+        mask = self.mask(date_from, date_to)
+        keep = None if mask is None else mask[rows]
+        if project_id and allocation == "full":
+            keep = projects == project_id if keep is None else keep & (projects == project_id)
+        if keep is not None:
+            rows, projects = rows[keep], projects[keep]
+        if not len(rows):
+            return []
+        cents = self.cents[rows].astype(np.float64)
+        if allocation == "split":
+            cents /= np.diff(self.indptr[:self.size + 1])[rows]
+        months = self.months[rows]
+        first, span = int(months.min()), int(months.max() - months.min()) + 1
+        key = (projects.astype(np.int64) * span + (months - first)) * 2 + self.income[rows]
+        counts = np.bincount(key)
+        sums = np.bincount(key, weights=cents)
+        result = []
+        for k in np.flatnonzero(counts):
+            project, rest = divmod(int(k), span * 2)
+            if project_id and project != project_id:
+                continue
+            result.append((project, first + rest // 2, bool(rest % 2), float(sums[k])))
+        return result
+
+
+def entry_rows(rows):
+    """Columns for ``append`` from (id, days, cents, income, category id, project ids) rows."""
+    projects = [p for r in rows for p in r[5] or ()]
+    return ([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows],
+            [r[4] or 0 for r in rows], [len(r[5] or ()) for r in rows], projects)
+
+
+def entries_query():
+    linked = (
+        select(func.array_agg(entry_projects.c.project_id))
+        .where(entry_projects.c.entry_id == Entry.id)
+        .scalar_subquery()
+    )
+    return select(Entry.id, (Entry.date - EPOCH).label("days"), (Entry.amount * 100).cast(BigInteger),
+                  Entry.entry_type == EntryType.EINNAHME, Entry.category_id, linked).order_by(Entry.id)
+
+
+class AnalyticsEngine:
+    """The process's snapshot, how far the change log is applied, and the names to report."""
+
+    def __init__(self):
+        self.enabled = False
+        self.entries: Optional[ColumnarEntries] = None
+        # Set while the snapshot waits for a reload; summaries then use SQL
+        self.stale = True
+        self.applied_id = 0
+        self.names: dict[str, tuple[int, dict[int, str]]] = {}
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.enabled and not self.stale
+
+    def start(self, bind: AsyncEngine):
+        if np is None:
+            log.warning("ANALYTICS_ENGINE is set but numpy is not installed; summaries stay on SQL")
+            return
+        self.enabled = True
+        self.reload(bind)
+
+    def reload(self, bind: AsyncEngine):
+        """Mark the snapshot stale and load it again in the background, unless that already runs."""
+        self.stale = True
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.keep_loading(bind))
+
+    async def keep_loading(self, bind: AsyncEngine):
+        delay = RELOAD_DELAY
+        while True:
+            try:
+                await self.load(bind)
+                return
+            except Exception:
+                log.exception("Could not load the analytics snapshot; retrying in %ds", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RELOAD_MAX_DELAY)
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def load(self, bind: AsyncEngine):
+        """Read all entries and the last change id from one snapshot of the database."""
+        started = time.perf_counter()
+        entries = ColumnarEntries()
+        async with bind.connect() as conn:
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+            async with conn.begin():
+                applied_id = (await conn.execute(select(func.max(EntryChange.id)))).scalar() or 0
+                result = await conn.stream(entries_query().execution_options(yield_per=LOAD_BATCH_SIZE))
+                async for partition in result.partitions():
+                    entries.append(*entry_rows(partition))
+        entries.trim()
+        # Not while a read applies events to the old snapshot
+        async with self.lock:
+            self.entries, self.applied_id, self.stale = entries, applied_id, False
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        log.info("Loaded %d entries into the analytics engine in %.3fs (%d bytes)",
+                 entries.size, self.load_seconds, entries.nbytes)
+
+    async def sync(self, db: AsyncSession) -> bool:
+        """Apply the changes committed since the snapshot's last one; False if it needs a reload."""
+        async with self.lock:
+            if self.stale:
+                return False
+            events = (await db.execute(
+                select(EntryChange.id, EntryChange.op, EntryChange.data)
+                .where(EntryChange.id > self.applied_id).order_by(EntryChange.id)
+            )).all()
+            if events and events[0].id != self.applied_id + 1:
+                oldest = (await db.execute(select(func.min(EntryChange.id)))).scalar()
+                if oldest > self.applied_id + 1:
+                    # Events expired before this process read them
+                    self.reload(db.bind)
+                    return False
+            for event_id, op, data in events:
+                if op in RELOAD_OPS:
+                    self.reload(db.bind)
+                    return False
+                await self.apply(db, op, orjson.loads(data))
+                self.applied_id = event_id
+            return True
+
+    async def apply(self, db: AsyncSession, op: str, data: dict):
+        entries = self.entries
+        if op == "created":
+            entries.add(data["entry"])
+        elif op == "updated":
+            entries.remove([data["entry_id"]])
+            entries.add(data["entry"])
+        elif op == "deleted":
+            entries.remove([data["entry_id"]])
+        elif op == "deleted_many":
+            entries.remove(data["entry_ids"])
+        elif op == "updated_many":
+            entries.remove(data["entry_ids"])
+            rows = (await db.execute(entries_query().where(Entry.id.in_(data["entry_ids"])))).all()
+            if rows:
+                entries.append(*entry_rows(rows))
+
+    async def names_of(self, db: AsyncSession, model, version: int) -> dict[int, str]:
+        """Names of the categories or projects, read again only when their table changed."""
+        table = model.__tablename__
+        cached = self.names.get(table)
+        if cached is None or cached[0] != version:
+            cached = (version, dict((await db.execute(select(model.id, model.name))).all()))
+            self.names[table] = cached
+        return cached[1]
+
+    async def summary_rows(self, db: AsyncSession, versions: dict, date_from: Optional[date], date_to: Optional[date]):
+        """The rows the SQL summary reads: (month, entry type, amount) and (category name, amount).
+
+        None while the snapshot is being reloaded.
+        """
+        if not await self.sync(db):
+            return None
+        names = await self.names_of(db, Category, versions.get("categories", 0))
+        monthly, by_category = self.entries.monthly(date_from, date_to)
+        return (
+            [(month_date(m), EntryType.EINNAHME if income else EntryType.AUSGABE, Decimal(cents).scaleb(-2))
+             for m, income, _, cents in monthly],
+            [(names[c], Decimal(cents).scaleb(-2)) for c, cents in by_category if c in names],
+        )
+
+    async def project_rows(self, db: AsyncSession, versions: dict, allocation: str, date_from: Optional[date],
+                           date_to: Optional[date], project_id: Optional[int] = None):
+        """The rows of ``project_summary_query``: (id, name, month, income, expense), by name and month.
+
+        None while the snapshot is being reloaded.
+        """
+        if not await self.sync(db):
+            return None
+        names = await self.names_of(db, Project, versions.get("projects", 0))
+        sums: dict[tuple[int, int], list] = {}
+        for project, month, income, cents in self.entries.project_monthly(allocation, date_from, date_to, project_id):
+            if project in names:
+                sums.setdefault((project, month), [None, None])[0 if income else 1] = Decimal(cents) / 100
+        rows = [(p, names[p], month_date(m), income, expense) for (p, m), (income, expense) in sums.items()]
+        seen = {p for p, _ in sums}
+        rows += [(p, name, None, None, None) for p, name in names.items()
+                 if p not in seen and (not project_id or p == project_id)]
+        return sorted(rows, key=lambda r: (r[1], r[2] or date.min))
+
+    def stats(self) -> dict:
+        if self.entries is None:
+            return {"enabled": self.enabled, "loaded": False}
+        entries = self.entries
+        live = entries.size - entries.dead
+        return {
+            "enabled": self.enabled,
+            "loaded": True,
+            "stale": self.stale,
+            "entries": live,
+            "rows": entries.size,
+            "project_links": entries.edge_count,
+            "applied_change_id": self.applied_id,
+            "load_seconds": self.load_seconds,
+            "bytes": entries.nbytes,
+            "bytes_per_million_entries": round(entries.nbytes / live * 1_000_000) if live else None,
+        }
+
+
+analytics = AnalyticsEngine()
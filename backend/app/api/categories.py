@@ -1,14 +1,28 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from ..database import get_db
+import orjson
+from ..replica import get_read_db
 from ..models.entry import Category
 from ..schemas.entry import CategoryOut
+from ..watermarks import conditional_get, not_modified, set_etag, snapshot
 
 router = APIRouter(prefix="/api/categories", tags=["categories"])
 
 
-@router.get("", response_model=list[CategoryOut])
-async def list_categories(db: AsyncSession = Depends(get_db)):
+async def load_categories(db: AsyncSession) -> bytes:
     result = await db.execute(select(Category).order_by(Category.name))
-    return result.scalars().all()
+    return orjson.dumps([CategoryOut.model_validate(c).model_dump() for c in result.scalars()])
+
+
+@router.get("", response_model=list[CategoryOut])
+async def list_categories(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """All categories, served from an in-process snapshot while the table is unchanged."""
+    etag, versions, fresh = await conditional_get(request, db, "categories")
+    if fresh:
+        return not_modified(etag)
+
+    body = await snapshot("categories", versions.get("categories", 0), lambda: load_categories(db))
+    response = Response(body, media_type="application/json")
+    set_etag(response, etag)
+    return response
@@ -1,122 +1,908 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from datetime import date
-from typing import Optional
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import (
+    Date, DateTime, Integer, select, delete, insert, update, case, cast, func, literal, null, true, tuple_, any_, union_all,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, INTERVAL, aggregate_order_by, insert as pg_insert
+from datetime import date, timedelta
+import base64
+import csv
+import io
+import json
+import orjson
+import re
+from decimal import Decimal
+from typing import Literal, Optional
+from ..analytics import analytics
+from ..cache import cache_key, notify_write, result_cache
+from ..changefeed import feed, monthly_deltas, record_change
 from ..database import get_db
-from ..models.entry import Entry, Project, entry_projects
-from ..schemas.entry import EntryCreate, EntryUpdate, EntryOut
+from ..replica import get_read_db
+from ..importer import import_entries, iter_csv_records, iter_ndjson_records
+from ..models.entry import Entry, EntryType, Category, Project, entry_projects, TS_CONFIG
+from ..models.rollup import MonthlyRollup, ProjectMonthlyRollup
+from ..rollups import RollupDelta, month_start, next_month, to_amount, whole_months
+from ..schemas.entry import (
+    EntryCreate, EntryUpdate, EntryOut, BulkImportResult, EntrySelection, EntryBatchUpdate, BatchResult,
+)
+from ..watermarks import conditional_get, not_modified, set_etag
 
 router = APIRouter(prefix="/api/entries", tags=["entries"])
 
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
 
-@router.get("", response_model=list[EntryOut])
-async def list_entries(
+# Relationships are not loaded unless a query asks; full entry reads take both
+ENTRY_LOADERS = (joinedload(Entry.category), selectinload(Entry.projects))
+
+# Tables whose watermarks make up the ETag of each read
+LIST_TABLES = ("entries", "entry_projects", "categories", "projects")
+SUMMARY_TABLES = ("entries", "categories")
+
+
+def encode_cursor(entry_date: date, entry_id: int, rank: Optional[float] = None) -> str:
+    parts = [entry_date.isoformat(), str(entry_id)] + ([] if rank is None else [repr(rank)])
+    return base64.urlsafe_b64encode("|".join(parts).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date, int, Optional[float]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        d, i, *rank = raw.split("|")
+        if len(rank) > 1:
+            raise ValueError(raw)
+        return date.fromisoformat(d), int(i), float(rank[0]) if rank else None
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+
+def search_tsquery(text: str):
+    """AND of all words, each matched as a prefix, or None if there are no words.
+
+    Only word characters reach to_tsquery, so user input cannot inject
+    tsquery operators.
+    """
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return None
+    return func.to_tsquery(TS_CONFIG, " & ".join(f"{t}:*" for t in terms))
+
+
+def filter_entries(
+    stmt,
     category_id: Optional[int] = None,
     project_id: Optional[int] = None,
     entry_type: Optional[str] = None,
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
-    db: AsyncSession = Depends(get_db),
+    search: Optional[str] = None,
 ):
-    q = select(Entry).order_by(Entry.date.desc())
     if category_id:
-        q = q.where(Entry.category_id == category_id)
+        stmt = stmt.where(Entry.category_id == category_id)
     if project_id:
-        q = q.join(entry_projects).where(entry_projects.c.project_id == project_id)
+        # Joining on the id alone: adding entry_date makes the planner take the
+        # two correlated conditions for independent and misjudge the row count
+        stmt = stmt.join(entry_projects, entry_projects.c.entry_id == Entry.id).where(entry_projects.c.project_id == project_id)
     if entry_type:
-        q = q.where(Entry.entry_type == entry_type)
+        stmt = stmt.where(Entry.entry_type == entry_type)
     if date_from:
-        q = q.where(Entry.date >= date_from)
+        stmt = stmt.where(Entry.date >= date_from)
     if date_to:
-        q = q.where(Entry.date <= date_to)
-    result = await db.execute(q)
-    return result.scalars().unique().all()
+        stmt = stmt.where(Entry.date <= date_to)
+    if search and (tsquery := search_tsquery(search)) is not None:
+        stmt = stmt.where(Entry.search_vector.bool_op("@@")(tsquery))
+    return stmt
+
+
+def list_query(
+    category_id: Optional[int] = None,
+    project_id: Optional[int] = None,
+    entry_type: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    cursor: Optional[str] = None,
+    base=None,
+    search: Optional[str] = None,
+    sort: Optional[str] = None,
+):
+    """Filtered entries newest first, or by relevance when searching.
+
+    Relevance ordering adds a ``rank`` column, which the page cursor carries.
+    """
+    stmt = filter_entries(select(Entry) if base is None else base,
+                          category_id, project_id, entry_type, date_from, date_to, search)
+    tsquery = search_tsquery(search) if search else None
+    after = decode_cursor(cursor) if cursor else None
+    if tsquery is not None and (sort or "relevance") == "relevance":
+        rank = func.ts_rank(Entry.search_vector, tsquery)
+        stmt = stmt.add_columns(rank.label("rank")).order_by(rank.desc(), Entry.date.desc(), Entry.id.desc())
+        if after:
+            if after[2] is None:
+                raise HTTPException(400, "Invalid cursor")
+            stmt = stmt.where(tuple_(rank, Entry.date, Entry.id) < tuple_(after[2], after[0], after[1]))
+    else:
+        stmt = stmt.order_by(Entry.date.desc(), Entry.id.desc())
+        if after:
+            stmt = stmt.where(tuple_(Entry.date, Entry.id) < tuple_(after[0], after[1]))
+    return stmt
+
+
+def next_page(rows, limit: Optional[int], entry=lambda row: row):
+    """Trim rows fetched with ``limit + 1`` and build the cursor of the following page."""
+    if not limit or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(entry(last).date, entry(last).id, getattr(last, "rank", None))
+
+
+async def stream_ndjson(bind, stmt, fields=None):
+    # The request session is already closed once the body is sent, so the
+    # stream runs on its own session and server-side cursor
+    async with AsyncSession(bind, expire_on_commit=False) as session:
+        stmt = stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+        if fields:
+            result = await session.stream(stmt)
+            async for partition in result.partitions():
+                yield b"".join(orjson.dumps(fast_entry(row, fields)) + b"\n" for row in partition)
+            return
+        result = await session.stream_scalars(stmt)
+        async for partition in result.partitions():
+            yield "".join(EntryOut.model_validate(e).model_dump_json() + "\n" for e in partition)
+
+
+# Every field of EntryOut, in its order
+ENTRY_FIELDS = tuple(EntryOut.model_fields)
+
+# How the fast path fills each field from a row of fast_list_base()
+FIELD_VALUES = {
+    "id": lambda row: row.id,
+    "date": lambda row: row.date,
+    "description": lambda row: row.description,
+    "amount": lambda row: float(row.amount),
+    "entry_type": lambda row: row.entry_type.value,
+    "category_id": lambda row: row.category_id,
+    "category": lambda row: {"id": row.category_id, "name": row.category_name} if row.category_id is not None else None,
+    "projects": lambda row: [{"id": i, "name": n} for i, n in zip(row.ids or (), row.names or ())],
+    "notes": lambda row: row.notes,
+}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[tuple[str, ...]]:
+    """``fields=id,date,amount`` as a tuple in EntryOut order; None for all fields."""
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - FIELD_VALUES.keys()
+    if unknown or not requested:
+        raise HTTPException(400, f"Unknown fields: {', '.join(sorted(unknown))}" if unknown else "No fields given")
+    return tuple(f for f in ENTRY_FIELDS if f in requested)
+
+
+def fast_list_base(fields=ENTRY_FIELDS):
+    """Plain columns for the fast path: category joined, projects as id/name arrays.
+
+    Only what ``fields`` needs is selected and joined; id and date are
+    always there for the page cursor.
+    """
+    columns = [Entry.id, Entry.date]
+    columns += [getattr(Entry, f) for f in ("description", "amount", "entry_type", "notes") if f in fields]
+    if "category_id" in fields or "category" in fields:
+        columns.append(Entry.category_id)
+    stmt = select(*columns).select_from(Entry)
+    if "category" in fields:
+        stmt = stmt.add_columns(Category.name.label("category_name")).outerjoin(Category, Entry.category_id == Category.id)
+    if "projects" in fields:
+        linked = (
+            select(
+                func.array_agg(aggregate_order_by(Project.id, Project.id)).label("ids"),
+                func.array_agg(aggregate_order_by(Project.name, Project.id)).label("names"),
+            )
+            .select_from(entry_projects.join(Project))
+            .where(entry_projects.c.entry_id == Entry.id)
+            .lateral()
+        )
+        stmt = stmt.add_columns(linked.c.ids, linked.c.names).join(linked, true())
+    return stmt
+
+
+def fast_entry(row, fields=ENTRY_FIELDS) -> dict:
+    """The same JSON object EntryOut produces (or its ``fields``), built straight from a row."""
+    return {f: FIELD_VALUES[f](row) for f in fields}
+
+
+@router.get("", response_model=list[EntryOut])
+async def list_entries(
+    request: Request,
+    response: Response,
+    category_id: Optional[int] = None,
+    project_id: Optional[int] = None,
+    entry_type: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    q: Optional[str] = Query(None, description="Full-text search over description and notes"),
+    sort: Optional[Literal["date", "relevance"]] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated subset of the entry fields"),
+    stream: bool = False,
+    fast: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """List entries newest first.
+
+    With ``limit`` the result is a page and the ``X-Next-Cursor`` response
+    header carries the cursor for the following page (absent on the last
+    page). With ``stream=true`` rows are sent as NDJSON from a server-side
+    cursor instead of being collected into one response. ``fast=true``
+    returns the same JSON built from plain rows and encoded by orjson,
+    without ORM objects or response-model validation.
+
+    ``q`` matches word prefixes in description and notes (German stemming)
+    and orders by relevance unless ``sort=date``.
+
+    ``fields`` returns only the named fields, read on the fast path; the
+    category and projects are only joined when asked for.
+
+    Collected responses carry an ETag; ``If-None-Match`` with the current
+    one is answered with 304 without running the query.
+    """
+    params = dict(category_id=category_id, project_id=project_id, entry_type=entry_type,
+                  date_from=date_from, date_to=date_to, cursor=cursor, search=q, sort=sort)
+    selected = parse_fields(fields)
+
+    if stream:
+        if selected:
+            stmt = list_query(**params, base=fast_list_base(selected))
+        else:
+            stmt = list_query(**params).options(*ENTRY_LOADERS)
+        if limit:
+            stmt = stmt.limit(limit)
+        return StreamingResponse(stream_ndjson(db.bind, stmt, selected), media_type="application/x-ndjson")
+
+    etag, _, fresh = await conditional_get(request, db, *LIST_TABLES)
+    if fresh:
+        return not_modified(etag)
+    if fast or selected:
+        response = await list_entries_fast(db, limit, etag, selected or ENTRY_FIELDS, **params)
+        set_etag(response, etag)
+        return response
+    set_etag(response, etag)
+
+    stmt = list_query(**params).options(*ENTRY_LOADERS)
+    # The ETag in the key keeps other workers' writes from being served as fresh
+    key = cache_key("entries", limit=limit, etag=etag, **params)
+    version = result_cache.version
+    cached = result_cache.get(key)
+    if cached is None:
+        if limit:
+            stmt = stmt.limit(limit + 1)
+        rows, next_cursor = next_page((await db.execute(stmt)).all(), limit, entry=lambda row: row[0])
+        cached = ([EntryOut.model_validate(row[0]) for row in rows], next_cursor)
+        result_cache.set(key, cached, version)
+    entries, next_cursor = cached
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return entries
+
+
+async def list_entries_fast(db, limit, etag, fields, **params):
+    key = cache_key("entries_fast", limit=limit, etag=etag, fields=fields, **params)
+    version = result_cache.version
+    cached = result_cache.get(key)
+    if cached is None:
+        stmt = list_query(**params, base=fast_list_base(fields))
+        if limit:
+            stmt = stmt.limit(limit + 1)
+        rows, next_cursor = next_page((await db.execute(stmt)).all(), limit)
+        cached = (orjson.dumps([fast_entry(r, fields) for r in rows]), next_cursor)
+        result_cache.set(key, cached, version)
+    body, next_cursor = cached
+    return Response(body, media_type="application/json",
+                    headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+
+EXPORT_COLUMNS = ["date", "description", "amount", "type", "category", "projects", "notes"]
+
+
+def export_query():
+    project_names = (
+        select(func.array_agg(aggregate_order_by(Project.name, Project.name)))
+        .select_from(entry_projects.join(Project))
+        .where(entry_projects.c.entry_id == Entry.id)
+        .scalar_subquery()
+    )
+    return (
+        select(Entry.date, Entry.description, Entry.amount, Entry.entry_type,
+               Category.name.label("category"), project_names.label("projects"), Entry.notes)
+        .select_from(Entry)
+        .outerjoin(Category, Entry.category_id == Category.id)
+    )
+
+
+def csv_rows(rows) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue()
+
+
+def export_csv_row(row) -> list:
+    d, description, amount, entry_type, category, projects, notes = row
+    return [d.isoformat(), description, amount, entry_type.value, category or "", ";".join(projects or []), notes or ""]
+
+
+def export_record(row) -> dict:
+    d, description, amount, entry_type, category, projects, notes = row
+    return {
+        "date": d.isoformat(), "description": description, "amount": float(amount),
+        "type": entry_type.value, "category": category, "projects": projects or [], "notes": notes,
+    }
+
+
+async def stream_export(bind, q, format: str):
+    if format == "csv":
+        # The header goes out before the query runs
+        yield csv_rows([EXPORT_COLUMNS])
+    async with bind.connect() as conn:
+        result = await conn.stream(q.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for partition in result.partitions():
+            if format == "csv":
+                yield csv_rows(export_csv_row(row) for row in partition)
+            else:
+                yield "".join(json.dumps(export_record(row), ensure_ascii=False) + "\n" for row in partition)
+
+
+@router.get("/export")
+async def export_entries(
+    format: Literal["csv", "ndjson"] = "csv",
+    category_id: Optional[int] = None,
+    project_id: Optional[int] = None,
+    entry_type: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    q: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Stream matching entries in booking order, e.g. for the Einnahmen-Ausgaben-Rechnung.
+
+    Rows are flattened in SQL (category name, project names) and read from a
+    server-side cursor. The CSV columns match what ``POST /bulk`` accepts.
+    """
+    stmt = filter_entries(export_query(), category_id, project_id, entry_type, date_from, date_to, q)
+    stmt = stmt.order_by(Entry.date, Entry.id)
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_export(db.bind, stmt, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="entries.{format}"'},
+    )
+
+
+ENTRY_COLUMNS = (Entry.id, Entry.date, Entry.description, Entry.amount, Entry.entry_type, Entry.category_id, Entry.notes)
+
+
+def written_entry(written, project_ids):
+    """Response columns for a row returned by a write CTE, shaped like the fast path's rows.
+
+    Names come from the category and projects the written ids point to, in
+    the same statement as the write.
+    """
+    linked = (
+        select(
+            func.array_agg(aggregate_order_by(Project.id, Project.id)).label("ids"),
+            func.array_agg(aggregate_order_by(Project.name, Project.id)).label("names"),
+        )
+        .where(Project.id.in_(project_ids))
+        .lateral()
+    )
+    return (
+        select(written, Category.name.label("category_name"), linked.c.ids, linked.c.names)
+        .select_from(written)
+        .outerjoin(Category, written.c.category_id == Category.id)
+        .join(linked, true())
+    )
+
+
+@router.get("/changes")
+async def entry_changes(request: Request, after: Optional[int] = Query(None, ge=0)):
+    """Server-Sent Events for every entry change, for dashboards to patch their state.
+
+    Each event is named after the change (``created``, ``updated``,
+    ``deleted``, or ``updated_many``/``deleted_many``/``imported`` for batch
+    writes) and carries the entry and its signed month/category deltas. Its
+    id is the resume token: browsers send it back as ``Last-Event-ID`` when
+    they reconnect, other clients pass ``after``.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        after = int(last_event_id)
+    return StreamingResponse(feed.events(after), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @router.post("", response_model=EntryOut, status_code=201)
 async def create_entry(data: EntryCreate, db: AsyncSession = Depends(get_db)):
-    entry = Entry(
+    """Insert the entry and its project links and return it, all in one statement."""
+    new = insert(Entry).values(
         date=data.date,
         description=data.description,
-        amount=data.amount,
+        amount=to_amount(data.amount),
         entry_type=data.entry_type,
         category_id=data.category_id,
         notes=data.notes,
-    )
-    if data.project_ids:
-        projects = (await db.execute(select(Project).where(Project.id.in_(data.project_ids)))).scalars().all()
-        entry.projects = projects
-    db.add(entry)
+    ).returning(*ENTRY_COLUMNS).cte("new")
+    # Unknown project ids are dropped
+    links = insert(entry_projects).from_select(
+        ["entry_id", "entry_date", "project_id"], select(new.c.id, new.c.date, Project.id).join_from(new, Project, Project.id.in_(data.project_ids)),
+    ).returning(entry_projects.c.project_id).cte("links")
+    row = (await db.execute(written_entry(new, select(links.c.project_id)))).one()
+
+    delta = RollupDelta()
+    delta.add(row.date, row.amount, row.entry_type, row.category_id, row.ids or ())
+    deltas = monthly_deltas(delta)
+    await delta.apply(db)
+    entry = fast_entry(row)
+    await record_change(db, "created", deltas, entry=entry, entry_id=row.id)
+    await notify_write(db)
     await db.commit()
-    await db.refresh(entry)
+    result_cache.invalidate()
     return entry
 
 
+@router.post("/bulk", response_model=BulkImportResult, status_code=201)
+async def bulk_import(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    skip_invalid: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    """Import many entries in one transaction via COPY.
+
+    The body is CSV (header row, projects separated by ";") or NDJSON; the
+    format follows ``format`` or else the Content-Type. Any invalid line
+    rolls the whole import back with a 422 unless ``skip_invalid`` is set,
+    in which case the valid lines are kept and the errors reported.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    parse = iter_csv_records if format == "csv" else iter_ndjson_records
+    importer, seconds = await import_entries(db, parse(request.stream()))
+
+    result = {
+        "inserted": importer.inserted,
+        "error_count": importer.error_count,
+        "errors": importer.errors,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(importer.inserted / seconds, 1) if seconds else 0.0,
+    }
+    if importer.error_count and not skip_invalid:
+        await db.rollback()
+        raise HTTPException(422, {**result, "inserted": 0})
+    if importer.inserted:
+        await record_change(db, "imported")
+    await notify_write(db)
+    await db.commit()
+    result_cache.invalidate()
+    return result
+
+
+async def lock_selection(db: AsyncSession, selection: EntrySelection) -> list[int]:
+    """Ids of the selected entries, row-locked until the transaction ends."""
+    stmt = select(Entry.id)
+    if selection.ids is not None:
+        stmt = stmt.where(Entry.id == any_(literal(selection.ids, ARRAY(Integer))))
+    else:
+        f = selection.filter
+        stmt = filter_entries(stmt, f.category_id, f.project_id, f.entry_type, f.date_from, f.date_to, f.q)
+    return (await db.execute(stmt.order_by(Entry.id).with_for_update(of=Entry))).scalars().all()
+
+
+@router.patch("", response_model=BatchResult)
+async def update_entries(data: EntryBatchUpdate, db: AsyncSession = Depends(get_db)):
+    """Apply the same changes to many entries with set-based statements.
+
+    ``project_ids`` replaces the project links of every selected entry.
+    Rollups are corrected from SQL aggregates before and after the change.
+    """
+    ids = await lock_selection(db, data)
+    if not ids:
+        return {"affected": 0}
+    selected = literal(ids, ARRAY(Integer))
+    delta = RollupDelta()
+    await delta.add_stored(db, ids, sign=-1)
+
+    changes = data.changes.model_dump(exclude_unset=True)
+    project_ids = changes.pop("project_ids", None)
+    if "amount" in changes:
+        changes["amount"] = to_amount(changes["amount"])
+    if changes:
+        await db.execute(update(Entry).where(Entry.id == any_(selected)).values(**changes))
+    if project_ids is not None:
+        await db.execute(delete(entry_projects).where(entry_projects.c.entry_id == any_(selected)))
+        # Unknown project ids are dropped, as on a single update
+        await db.execute(insert(entry_projects).from_select(
+            ["entry_id", "entry_date", "project_id"],
+            select(Entry.id, Entry.date, Project.id).join(Project, Project.id.in_(project_ids))
+            .where(Entry.id == any_(selected)),
+        ))
+
+    await delta.add_stored(db, ids)
+    deltas = monthly_deltas(delta)
+    await delta.apply(db)
+    await record_change(db, "updated_many", deltas, entry_ids=ids)
+    await notify_write(db)
+    await db.commit()
+    result_cache.invalidate()
+    return {"affected": len(ids)}
+
+
+@router.delete("", response_model=BatchResult)
+async def delete_entries(data: EntrySelection, db: AsyncSession = Depends(get_db)):
+    """Delete many entries in one statement; their project links cascade."""
+    ids = await lock_selection(db, data)
+    if not ids:
+        return {"affected": 0}
+    delta = RollupDelta()
+    await delta.add_stored(db, ids, sign=-1)
+    deltas = monthly_deltas(delta)
+    await delta.apply(db)
+    await db.execute(delete(Entry).where(Entry.id == any_(literal(ids, ARRAY(Integer)))))
+    await record_change(db, "deleted_many", deltas, entry_ids=ids)
+    await notify_write(db)
+    await db.commit()
+    result_cache.invalidate()
+    return {"affected": len(ids)}
+
+
 @router.put("/{entry_id}", response_model=EntryOut)
 async def update_entry(entry_id: int, data: EntryUpdate, db: AsyncSession = Depends(get_db)):
-    entry = await db.get(Entry, entry_id)
-    if not entry:
+    """Lock the entry, then update it and its project links in one statement.
+
+    The old row is returned next to the new one, so the rollup delta needs
+    no separate read. As in ``delete_entry`` the lock comes first: a
+    statement that waits for it still reads the links of its own snapshot.
+    """
+    changes = data.model_dump(exclude_unset=True)
+    project_ids = changes.pop("project_ids", None)
+    if "amount" in changes:
+        changes["amount"] = to_amount(changes["amount"])
+
+    locked = (await db.execute(select(Entry.id).where(Entry.id == entry_id).with_for_update())).scalar()
+    if locked is None:
         raise HTTPException(404, "Entry not found")
-    for field, value in data.model_dump(exclude_unset=True).items():
-        if field == "project_ids":
-            projects = (await db.execute(select(Project).where(Project.id.in_(value)))).scalars().all()
-            entry.projects = projects
-        else:
-            setattr(entry, field, value)
+
+    old_links = select(entry_projects.c.project_id).where(entry_projects.c.entry_id == entry_id)
+    old = (
+        select(Entry.id, Entry.date, Entry.amount, Entry.entry_type, Entry.category_id,
+               select(func.array_agg(entry_projects.c.project_id))
+               .where(entry_projects.c.entry_id == entry_id).scalar_subquery().label("project_ids"))
+        .where(Entry.id == entry_id)
+        .cte("old")
+    )
+    new = (
+        update(Entry)
+        .where(Entry.id == old.c.id)
+        # Without field changes the row is still locked and returned
+        .values(**changes or {"id": Entry.id})
+        .returning(*ENTRY_COLUMNS, old.c.date.label("old_date"), old.c.amount.label("old_amount"),
+                   old.c.entry_type.label("old_entry_type"), old.c.category_id.label("old_category_id"),
+                   old.c.project_ids.label("old_project_ids"))
+        .cte("new")
+    )
+    if project_ids is None:
+        new_links = old_links
+    else:
+        dropped = (
+            delete(entry_projects)
+            .where(entry_projects.c.entry_id == new.c.id, entry_projects.c.project_id.not_in(project_ids))
+            .returning(entry_projects.c.project_id)
+            .cte("dropped")
+        )
+        added = (
+            pg_insert(entry_projects)
+            .from_select(["entry_id", "entry_date", "project_id"],
+                         select(new.c.id, new.c.date, Project.id).join_from(new, Project, Project.id.in_(project_ids)))
+            .on_conflict_do_nothing()
+            .returning(entry_projects.c.project_id)
+            .cte("added")
+        )
+        # Sibling CTEs see the links as they were before the statement
+        new_links = old_links.where(entry_projects.c.project_id.not_in(select(dropped.c.project_id))).union(
+            select(added.c.project_id))
+    row = (await db.execute(written_entry(new, new_links))).one()
+
+    delta = RollupDelta()
+    delta.add(row.old_date, row.old_amount, row.old_entry_type, row.old_category_id, row.old_project_ids or (), sign=-1)
+    delta.add(row.date, row.amount, row.entry_type, row.category_id, row.ids or ())
+    deltas = monthly_deltas(delta)
+    await delta.apply(db)
+    entry = fast_entry(row)
+    await record_change(db, "updated", deltas, entry=entry, entry_id=row.id)
+    await notify_write(db)
     await db.commit()
-    await db.refresh(entry)
+    result_cache.invalidate()
     return entry
 
 
 @router.delete("/{entry_id}", status_code=204)
 async def delete_entry(entry_id: int, db: AsyncSession = Depends(get_db)):
-    entry = await db.get(Entry, entry_id)
-    if not entry:
+    """Lock the entry, then delete it and read its links in one statement.
+
+    A statement that waits for a row lock still reads with the snapshot it
+    started with, so the lock comes first: once it is held, no concurrent
+    update can change the links the rollup delta subtracts.
+    """
+    locked = (await db.execute(select(Entry.id).where(Entry.id == entry_id).with_for_update())).scalar()
+    if locked is None:
         raise HTTPException(404, "Entry not found")
-    await db.delete(entry)
+    links = select(func.array_agg(entry_projects.c.project_id)).where(entry_projects.c.entry_id == entry_id)
+    deleted = (await db.execute(
+        delete(Entry).where(Entry.id == entry_id)
+        .returning(*ENTRY_COLUMNS, links.scalar_subquery().label("project_ids"))
+    )).one()
+    delta = RollupDelta()
+    delta.add(deleted.date, deleted.amount, deleted.entry_type, deleted.category_id, deleted.project_ids or (),
+              sign=-1)
+    deltas = monthly_deltas(delta)
+    await delta.apply(db)
+    await record_change(db, "deleted", deltas, entry_id=entry_id)
+    await notify_write(db)
     await db.commit()
+    result_cache.invalidate()
+
+
+def summary_queries(date_from: Optional[date] = None, date_to: Optional[date] = None):
+    month = func.date_trunc("month", Entry.date).label("month")
+    monthly_q = select(month, Entry.entry_type, func.sum(Entry.amount)).group_by(month, Entry.entry_type)
+    category_q = (
+        select(Category.name, func.sum(Entry.amount))
+        .join(Category, Entry.category_id == Category.id)
+        .where(Entry.entry_type == EntryType.AUSGABE)
+        .group_by(Entry.category_id, Category.name)
+    )
+    if date_from:
+        monthly_q = monthly_q.where(Entry.date >= date_from)
+        category_q = category_q.where(Entry.date >= date_from)
+    if date_to:
+        monthly_q = monthly_q.where(Entry.date <= date_to)
+        category_q = category_q.where(Entry.date <= date_to)
+    return monthly_q, category_q
+
+
+def rollup_summary_queries(first_month: Optional[date] = None, last_month: Optional[date] = None):
+    monthly_q = (
+        select(MonthlyRollup.month, MonthlyRollup.entry_type, func.sum(MonthlyRollup.amount))
+        .where(MonthlyRollup.entry_count > 0)
+        .group_by(MonthlyRollup.month, MonthlyRollup.entry_type)
+    )
+    category_q = (
+        select(Category.name, func.sum(MonthlyRollup.amount))
+        .join(Category, MonthlyRollup.category_id == Category.id)
+        .where(MonthlyRollup.entry_type == EntryType.AUSGABE, MonthlyRollup.entry_count > 0)
+        .group_by(MonthlyRollup.category_id, Category.name)
+    )
+    if first_month:
+        monthly_q = monthly_q.where(MonthlyRollup.month >= first_month)
+        category_q = category_q.where(MonthlyRollup.month >= first_month)
+    if last_month:
+        monthly_q = monthly_q.where(MonthlyRollup.month <= last_month)
+        category_q = category_q.where(MonthlyRollup.month <= last_month)
+    return monthly_q, category_q
+
+
+async def summary_rows(db: AsyncSession, date_from: Optional[date], date_to: Optional[date]):
+    """(month, entry type, amount) and (category name, amount) rows for the summary.
+
+    Whole months come from the rollup tables; only the partial months at
+    the edges of ``date_from``/``date_to`` are aggregated from raw entries.
+    """
+    monthly_rows, category_rows = [], []
+    full = whole_months(date_from, date_to)
+    if full is None:
+        edges = [(date_from, date_to)]
+    else:
+        first, last = full
+        monthly_q, category_q = rollup_summary_queries(first, last)
+        monthly_rows += (await db.execute(monthly_q)).all()
+        category_rows += (await db.execute(category_q)).all()
+        edges = []
+        if first and date_from < first:
+            edges.append((date_from, first - timedelta(days=1)))
+        if last and date_to >= next_month(last):
+            edges.append((next_month(last), date_to))
+    for lo, hi in edges:
+        monthly_q, category_q = summary_queries(lo, hi)
+        monthly_rows += (await db.execute(monthly_q)).all()
+        category_rows += (await db.execute(category_q)).all()
+    return monthly_rows, category_rows
 
 
 @router.get("/summary")
 async def summary(
+    request: Request,
+    response: Response,
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    q = select(Entry)
-    if date_from:
-        q = q.where(Entry.date >= date_from)
-    if date_to:
-        q = q.where(Entry.date <= date_to)
-    result = await db.execute(q)
-    entries = result.scalars().unique().all()
+    """Totals, monthly and per-category figures for a date range.
+
+    Read from the rollups and entries, or from the analytics engine when it
+    is enabled and loaded.
+    """
+    etag, versions, fresh = await conditional_get(request, db, *SUMMARY_TABLES)
+    if fresh:
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    key = cache_key("summary", date_from=date_from, date_to=date_to, etag=etag)
+    version = result_cache.version
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
 
-    total_income = sum(float(e.amount) for e in entries if e.entry_type.value == "Einnahme")
-    total_expense = sum(float(e.amount) for e in entries if e.entry_type.value == "Ausgabe")
+    rows = await analytics.summary_rows(db, versions, date_from, date_to) if analytics.ready else None
+    monthly_rows, category_rows = rows or await summary_rows(db, date_from, date_to)
 
-    # Monthly breakdown
+    # Sums stay Decimal until the response is built, so totals are exact
+    total_income = Decimal(0)
+    total_expense = Decimal(0)
     monthly = {}
-    for e in entries:
-        key = e.date.strftime("%Y-%m")
-        if key not in monthly:
-            monthly[key] = {"month": key, "income": 0, "expense": 0}
-        if e.entry_type.value == "Einnahme":
-            monthly[key]["income"] += float(e.amount)
+    for m, entry_type, amount in monthly_rows:
+        month = m.strftime("%Y-%m")
+        if month not in monthly:
+            monthly[month] = {"month": month, "income": Decimal(0), "expense": Decimal(0)}
+        if entry_type == EntryType.EINNAHME:
+            monthly[month]["income"] += amount
+            total_income += amount
         else:
-            monthly[key]["expense"] += float(e.amount)
+            monthly[month]["expense"] += amount
+            total_expense += amount
 
-    # Category breakdown (expenses only)
     by_category = {}
-    for e in entries:
-        if e.entry_type.value == "Ausgabe" and e.category:
-            name = e.category.name
-            by_category[name] = by_category.get(name, 0) + float(e.amount)
+    for name, amount in category_rows:
+        by_category[name] = by_category.get(name, Decimal(0)) + amount
 
-    return {
-        "total_income": total_income,
-        "total_expense": total_expense,
-        "balance": total_income - total_expense,
-        "monthly": sorted(monthly.values(), key=lambda x: x["month"]),
-        "by_category": [{"name": k, "value": v} for k, v in sorted(by_category.items())],
+    result = {
+        "total_income": float(total_income),
+        "total_expense": float(total_expense),
+        "balance": float(total_income - total_expense),
+        "monthly": [
+            {"month": month, "income": float(m["income"]), "expense": float(m["expense"])}
+            for month, m in sorted(monthly.items())
+        ],
+        "by_category": [{"name": k, "value": float(v)} for k, v in sorted(by_category.items())],
     }
+    result_cache.set(key, result, version)
+    return result
+
+
+# Step between two periods; date_trunc has "quarter", intervals do not
+PERIOD_STEPS = {"day": "1 day", "week": "1 week", "month": "1 month", "quarter": "3 months", "year": "1 year"}
+
+
+def timeseries_query(
+    granularity: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    group_by: Optional[str] = None,
+):
+    """Income, expense, net and running balance per period, as one statement.
+
+    Totals are aggregated per period and group, the periods between the
+    first and last one are filled in with ``generate_series``, and a window
+    sum turns the nets into a balance. The balance starts from everything
+    booked before ``date_from``, so it is the real balance at each period's
+    end; that opening amount is read from the monthly rollups.
+    """
+    unit = literal(granularity, literal_execute=True)
+    period = func.date_trunc(unit, cast(Entry.date, DateTime))
+    names = None
+    if group_by == "category":
+        key, source, names = Entry.category_id, Entry.__table__, Category
+        rollup, rollup_key = MonthlyRollup, MonthlyRollup.category_id
+    elif group_by == "project":
+        # An entry counts in full for each of its projects
+        key, names = entry_projects.c.project_id, Project
+        source = Entry.__table__.join(entry_projects, entry_projects.c.entry_id == Entry.id)
+        rollup, rollup_key = ProjectMonthlyRollup, ProjectMonthlyRollup.project_id
+    else:
+        key, source = null().cast(Integer), Entry.__table__
+        rollup, rollup_key = MonthlyRollup, null().cast(Integer)
+    income = func.sum(Entry.amount).filter(Entry.entry_type == EntryType.EINNAHME)
+    expense = func.sum(Entry.amount).filter(Entry.entry_type == EntryType.AUSGABE)
+
+    totals = select(period.label("period"), key.label("key"), income.label("income"), expense.label("expense")) \
+        .select_from(source).group_by(period, key)
+    totals = filter_entries(totals, date_from=date_from, date_to=date_to).cte("totals")
+    groups = select(totals.c.key)
+    opening = None
+    if date_from:
+        # Whole months before date_from come from the rollups, the rest of its month from entries
+        signed = case((Entry.entry_type == EntryType.EINNAHME, Entry.amount), else_=-Entry.amount)
+        rollup_signed = case((rollup.entry_type == EntryType.EINNAHME, rollup.amount), else_=-rollup.amount)
+        before = union_all(
+            select(rollup_key.label("key"), func.sum(rollup_signed).label("amount"))
+            .where(rollup.month < month_start(date_from)).group_by(rollup_key),
+            select(key.label("key"), func.sum(signed).label("amount")).select_from(source)
+            .where(Entry.date >= month_start(date_from), Entry.date < date_from).group_by(key),
+        ).subquery()
+        opening = select(before.c.key, func.sum(before.c.amount).label("amount")) \
+            .group_by(before.c.key).cte("opening")
+        groups = groups.union(select(opening.c.key))
+    else:
+        groups = groups.distinct()
+    groups = groups.cte("groups")
+
+    first = func.date_trunc(unit, cast(literal(date_from), DateTime)) if date_from else func.min(totals.c.period)
+    last = func.date_trunc(unit, cast(literal(date_to), DateTime)) if date_to else func.max(totals.c.period)
+    step = cast(literal(PERIOD_STEPS[granularity]), INTERVAL)
+    periods = select(func.generate_series(first, last, step).label("period")).cte("periods")
+
+    net = func.coalesce(totals.c.income, 0) - func.coalesce(totals.c.expense, 0)
+    balance = func.sum(net).over(partition_by=groups.c.key, order_by=periods.c.period)
+    if opening is not None:
+        balance = func.coalesce(opening.c.amount, 0) + balance
+    joined = periods.join(groups, true()).outerjoin(
+        totals, (totals.c.period == periods.c.period) & totals.c.key.is_not_distinct_from(groups.c.key)
+    )
+    if opening is not None:
+        joined = joined.outerjoin(opening, opening.c.key.is_not_distinct_from(groups.c.key))
+    name = null()
+    if names is not None:
+        joined = joined.outerjoin(names, names.id == groups.c.key)
+        name = names.name
+    return (
+        select(
+            groups.c.key, name.label("name"), cast(periods.c.period, Date).label("period"),
+            func.coalesce(totals.c.income, 0).label("income"), func.coalesce(totals.c.expense, 0).label("expense"),
+            net.label("net"), balance.label("balance"),
+        )
+        .select_from(joined)
+        .order_by(groups.c.key.nulls_first(), periods.c.period)
+    )
+
+
+@router.get("/timeseries")
+async def timeseries(
+    request: Request,
+    granularity: Literal["day", "week", "month", "quarter", "year"] = "month",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    group_by: Optional[Literal["category", "project"]] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Per-period figures with gaps filled, optionally one series per category or project.
+
+    Periods start on the first day of their day, ISO week, month, quarter or
+    year. Without ``group_by`` there is a single series with ``id`` and
+    ``name`` null; grouped by category, uncategorized entries form that series.
+    """
+    tables = SUMMARY_TABLES + (("entry_projects", "projects") if group_by == "project" else ())
+    etag, _, fresh = await conditional_get(request, db, *tables)
+    if fresh:
+        return not_modified(etag)
+
+    key = cache_key("timeseries", granularity=granularity, date_from=date_from, date_to=date_to,
+                    group_by=group_by, etag=etag)
+    version = result_cache.version
+    body = result_cache.get(key)
+    if body is None:
+        series = {}
+        for group, name, period, income, expense, net, balance in (await db.execute(
+            timeseries_query(granularity, date_from, date_to, group_by)
+        )).all():
+            if group not in series:
+                series[group] = {"id": group, "name": name, "points": []}
+            series[group]["points"].append({
+                "period": period, "income": float(income), "expense": float(expense),
+                "net": float(net), "balance": float(balance),
+            })
+        # Daily series run to thousands of points; orjson keeps encoding off the profile
+        body = orjson.dumps({"granularity": granularity, "group_by": group_by, "series": list(series.values())})
+        result_cache.set(key, body, version)
+    response = Response(body, media_type="application/json")
+    set_etag(response, etag)
+    return response
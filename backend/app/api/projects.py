@@ -1,23 +1,197 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, union_all
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Literal, Optional
+import orjson
+from ..analytics import analytics
+from ..cache import cache_key, notify_write, result_cache
 from ..database import get_db
-from ..models.entry import Project
+from ..replica import get_read_db
+from ..models.entry import Entry, EntryType, Project, entry_projects
+from ..models.rollup import ProjectMonthlyRollup
+from ..rollups import next_month, whole_months
 from ..schemas.entry import ProjectOut, ProjectCreate
+from ..watermarks import conditional_get, not_modified, set_etag, snapshot
 
 router = APIRouter(prefix="/api/projects", tags=["projects"])
 
+SUMMARY_TABLES = ("entries", "entry_projects", "projects")
 
-@router.get("", response_model=list[ProjectOut])
-async def list_projects(db: AsyncSession = Depends(get_db)):
+
+async def load_projects(db: AsyncSession) -> bytes:
     result = await db.execute(select(Project).order_by(Project.name))
-    return result.scalars().all()
+    return orjson.dumps([ProjectOut.model_validate(p).model_dump() for p in result.scalars()])
+
+
+@router.get("", response_model=list[ProjectOut])
+async def list_projects(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """All projects, served from an in-process snapshot while the table is unchanged."""
+    etag, versions, fresh = await conditional_get(request, db, "projects")
+    if fresh:
+        return not_modified(etag)
+
+    body = await snapshot("projects", versions.get("projects", 0), lambda: load_projects(db))
+    response = Response(body, media_type="application/json")
+    set_etag(response, etag)
+    return response
 
 
 @router.post("", response_model=ProjectOut, status_code=201)
 async def create_project(data: ProjectCreate, db: AsyncSession = Depends(get_db)):
     project = Project(name=data.name)
     db.add(project)
+    await notify_write(db)
     await db.commit()
+    result_cache.invalidate()
     await db.refresh(project)
     return project
+
+
+def project_links(allocation: str, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                  project_id: Optional[int] = None):
+    """Each entry's amount per linked project, as allocated."""
+    month = func.date_trunc("month", Entry.date).cast(Entry.date.type)
+    amount = Entry.amount
+    if allocation == "split":
+        # Every link of the entry is in the join, so this counts its projects
+        amount = Entry.amount / func.count().over(partition_by=Entry.id)
+    stmt = (
+        select(entry_projects.c.project_id, month.label("month"), Entry.entry_type, amount.label("amount"))
+        .join(entry_projects, entry_projects.c.entry_id == Entry.id)
+    )
+    if date_from:
+        stmt = stmt.where(Entry.date >= date_from)
+    if date_to:
+        stmt = stmt.where(Entry.date <= date_to)
+    if project_id and allocation == "full":
+        stmt = stmt.where(entry_projects.c.project_id == project_id)
+    return stmt
+
+
+def project_summary_query(
+    allocation: str = "full",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    project_id: Optional[int] = None,
+):
+    """Income and expense per project and month in one aggregate over the links.
+
+    With ``full`` allocation whole months come from the project rollups and
+    only the partial months at the edges from the entries, as in the entry
+    summary. Projects without entries in the range get a row with a null month.
+    """
+    full = whole_months(date_from, date_to) if allocation == "full" else None
+    if full is None:
+        parts = [project_links(allocation, date_from, date_to, project_id)]
+    else:
+        first, last = full
+        rollups = select(ProjectMonthlyRollup.project_id, ProjectMonthlyRollup.month,
+                         ProjectMonthlyRollup.entry_type, ProjectMonthlyRollup.amount) \
+            .where(ProjectMonthlyRollup.entry_count > 0)
+        if first:
+            rollups = rollups.where(ProjectMonthlyRollup.month >= first)
+        if last:
+            rollups = rollups.where(ProjectMonthlyRollup.month <= last)
+        if project_id:
+            rollups = rollups.where(ProjectMonthlyRollup.project_id == project_id)
+        parts = [rollups]
+        if first and date_from < first:
+            parts.append(project_links(allocation, date_from, first - timedelta(days=1), project_id))
+        if last and date_to >= next_month(last):
+            parts.append(project_links(allocation, next_month(last), date_to, project_id))
+    links = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+
+    stmt = (
+        select(
+            Project.id, Project.name, links.c.month,
+            func.sum(links.c.amount).filter(links.c.entry_type == EntryType.EINNAHME),
+            func.sum(links.c.amount).filter(links.c.entry_type == EntryType.AUSGABE),
+        )
+        .outerjoin(links, links.c.project_id == Project.id)
+        .group_by(Project.id, links.c.month)
+        .order_by(Project.name, links.c.month)
+    )
+    if project_id:
+        stmt = stmt.where(Project.id == project_id)
+    return stmt
+
+
+def figures(income: Decimal, expense: Decimal) -> dict:
+    net = income - expense
+    return {
+        "income": float(income),
+        "expense": float(expense),
+        "net": float(net),
+        "margin": float(net / income) if income else None,
+    }
+
+
+async def project_summaries(request: Request, db: AsyncSession, project_id: Optional[int] = None, **params):
+    etag, versions, fresh = await conditional_get(request, db, *SUMMARY_TABLES)
+    if fresh:
+        return not_modified(etag)
+
+    key = cache_key("project_summary", project_id=project_id, etag=etag, **params)
+    version = result_cache.version
+    body = result_cache.get(key)
+    if body is None:
+        rows = await analytics.project_rows(db, versions, project_id=project_id, **params) if analytics.ready else None
+        if rows is None:
+            rows = (await db.execute(project_summary_query(project_id=project_id, **params))).all()
+        projects = {}
+        for pid, name, month, income, expense in rows:
+            if pid not in projects:
+                projects[pid] = {"id": pid, "name": name, "income": Decimal(0), "expense": Decimal(0), "monthly": []}
+            if month is None:
+                continue
+            income, expense = income or Decimal(0), expense or Decimal(0)
+            project = projects[pid]
+            project["income"] += income
+            project["expense"] += expense
+            project["monthly"].append({"month": month.strftime("%Y-%m"), **figures(income, expense)})
+        if project_id and not projects:
+            raise HTTPException(404, "Project not found")
+        result = [
+            {"id": p["id"], "name": p["name"], **figures(p["income"], p["expense"]), "monthly": p["monthly"]}
+            for p in projects.values()
+        ]
+        body = orjson.dumps(result[0] if project_id else {"allocation": params["allocation"], "projects": result})
+        result_cache.set(key, body, version)
+    response = Response(body, media_type="application/json")
+    set_etag(response, etag)
+    return response
+
+
+@router.get("/summary")
+async def projects_summary(
+    request: Request,
+    allocation: Literal["full", "split"] = "full",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Income, expense, net and margin per project, in total and per month.
+
+    Entries linked to several projects are counted by the ``allocation``
+    policy: ``full`` books the whole amount to each of them, so project
+    figures can add up to more than the overall summary; ``split`` divides
+    the amount evenly between them, so the figures add up to the total of
+    all entries that have a project. Entries without a project are left out.
+    ``margin`` is net over income, null without income.
+    """
+    return await project_summaries(request, db, allocation=allocation, date_from=date_from, date_to=date_to)
+
+
+@router.get("/{project_id}/summary")
+async def project_summary(
+    project_id: int,
+    request: Request,
+    allocation: Literal["full", "split"] = "full",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """One project's figures, with the same ``allocation`` policy as ``/api/projects/summary``."""
+    return await project_summaries(request, db, project_id, allocation=allocation, date_from=date_from, date_to=date_to)
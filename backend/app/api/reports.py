@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert
+from ..database import get_db
+from ..models.report import ReportJob, ReportStatus
+from ..reports import runner
+from ..schemas.report import ReportCreate, ReportOut
+
+router = APIRouter(prefix="/api/reports", tags=["reports"])
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "json": "application/json"}
+
+
+def report_out(job: ReportJob) -> ReportOut:
+    out = ReportOut.model_validate(job)
+    if job.status == ReportStatus.DONE:
+        out.download_url = f"{router.prefix}/{job.id}/download"
+    return out
+
+
+async def get_job(db: AsyncSession, report_id: int) -> ReportJob:
+    job = await db.get(ReportJob, report_id)
+    if not job:
+        raise HTTPException(404, "Report not found")
+    return job
+
+
+@router.post("", response_model=ReportOut, status_code=202)
+async def create_report(data: ReportCreate, db: AsyncSession = Depends(get_db)):
+    """Queue a report for the date range; poll ``GET /api/reports/{id}`` until it is done.
+
+    The CSV holds tables of totals, months, categories and projects, then
+    every entry in the columns of ``/api/entries/export``; the JSON holds the
+    same under ``totals``, ``monthly``, ``by_category``, ``by_project`` and
+    ``entries``.
+    """
+    job = (await db.execute(
+        insert(ReportJob).values(format=data.format, date_from=data.date_from, date_to=data.date_to)
+        .returning(ReportJob)
+    )).scalar_one()
+    await db.commit()
+    runner.notify()
+    return report_out(job)
+
+
+# Status reads go to the primary: a replica could lag behind the workers
+@router.get("/{report_id}", response_model=ReportOut)
+async def get_report(report_id: int, db: AsyncSession = Depends(get_db)):
+    return report_out(await get_job(db, report_id))
+
+
+@router.get("/{report_id}/download")
+async def download_report(report_id: int, db: AsyncSession = Depends(get_db)):
+    job = await get_job(db, report_id)
+    if job.status == ReportStatus.EXPIRED:
+        raise HTTPException(410, "Report expired")
+    if job.status != ReportStatus.DONE:
+        raise HTTPException(409, f"Report is {job.status.value}")
+    return FileResponse(
+        job.file_path, media_type=MEDIA_TYPES[job.format],
+        filename=f"einnahmen-ausgaben-{job.date_from.isoformat()}-{job.date_to.isoformat()}.{job.format}",
+    )
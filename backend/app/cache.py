@@ -0,0 +1,113 @@
+"""Per-process result cache for read endpoints, invalidated by writes.
+
+Every cached value is tagged with the data version that was current when
+its query started. Writes bump the version, which makes all older values
+misses. With ``CACHE_NOTIFY_CHANNEL`` set, writers also send a Postgres
+NOTIFY inside their transaction so the other uvicorn workers bump theirs.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class ResultCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self._data: OrderedDict[Hashable, tuple[int, float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default=None):
+        item = self._data.get(key, _MISSING)
+        if item is not _MISSING:
+            version, expires, value = item
+            if version == self.version and expires > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, version: int):
+        """Store ``value`` as computed from data at ``version``."""
+        if self.maxsize <= 0 or version != self.version:
+            return
+        self._data[key] = (version, time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        self.version += 1
+        self.invalidations += 1
+        self._data.clear()
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+result_cache = ResultCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+
+
+def cache_key(name: str, **params) -> tuple:
+    return (name, *sorted((k, v) for k, v in params.items() if v is not None))
+
+
+async def notify_write(db: AsyncSession):
+    """Tell other workers about this write; delivered when the transaction commits."""
+    if settings.CACHE_NOTIFY_CHANNEL:
+        await db.execute(text("SELECT pg_notify(:channel, :pid)"),
+                         {"channel": settings.CACHE_NOTIFY_CHANNEL, "pid": str(os.getpid())})
+
+
+class NotifyListener:
+    """Holds a connection LISTENing on the cache channel for other workers' writes."""
+
+    def __init__(self, engine: AsyncEngine, channel: str):
+        self.engine = engine
+        self.channel = channel
+        self.conn = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        if payload != str(os.getpid()):
+            result_cache.invalidate()
+
+    async def start(self):
+        self.conn = await self.engine.connect()
+        raw = await self.conn.get_raw_connection()
+        await raw.driver_connection.add_listener(self.channel, self._on_notify)
+        log.info("Listening for cache invalidations on %s", self.channel)
+
+    async def stop(self):
+        if self.conn is not None:
+            raw = await self.conn.get_raw_connection()
+            await raw.driver_connection.remove_listener(self.channel, self._on_notify)
+            await self.conn.close()
+            self.conn = None
@@ -0,0 +1,279 @@
+"""Change feed for live dashboards: entry writes pushed as Server-Sent Events.
+
+Every entry write records an event in ``entry_changes`` inside its own
+transaction and sends the event id with a Postgres NOTIFY on
+``CHANGE_FEED_CHANNEL``. Each uvicorn worker LISTENs there, reads the new
+events once and hands them to the queues of its connected clients, so a
+write in one worker reaches the dashboards on all of them.
+
+Writers record events under an advisory lock held until commit, so events
+become visible in id order and a reader never skips one that commits late.
+The id doubles as the resume token: every stream starts with a ``ready``
+event carrying the current id, and a client reconnecting with
+``Last-Event-ID`` is first sent what it missed from the table. A client
+that falls ``CHANGE_FEED_QUEUE_SIZE`` events behind is sent ``overflow``
+and disconnected instead of buffering without bound; it resumes the same
+way. Events are kept for ``CHANGE_FEED_RETENTION_HOURS``; a token older
+than that gets ``reset``, telling the client to fetch everything again.
+
+The LISTEN connection is opened in the background and reopened with
+backoff whenever it is lost, so the app starts without a database and
+survives its restarts; after reconnecting, the events missed meanwhile
+are read from the table.
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import AsyncIterator, Optional
+import orjson
+from sqlalchemy import Integer, Text, cast, delete, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from .config import settings
+from .database import engine
+from .models.change import EntryChange
+
+log = logging.getLogger(__name__)
+
+# Advisory lock key serializing event writers until they commit
+FEED_LOCK = 0x46454544
+# Events read per query when catching up a resuming client
+REPLAY_BATCH_SIZE = 500
+CLEANUP_INTERVAL = 3600
+# How long browsers wait before reconnecting a dropped stream
+RETRY_MS = 3000
+# Backoff between attempts to (re)open the LISTEN connection, in seconds
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30
+# How often the LISTEN connection is checked when no notification comes
+LISTEN_CHECK_INTERVAL = 30
+
+# Queued in place of the events a slow client could not take
+OVERFLOW = object()
+
+
+def monthly_deltas(delta) -> list[dict]:
+    """The month/category rows of a RollupDelta as JSON, amounts signed; read them before it is applied."""
+    return [
+        {"month": month.strftime("%Y-%m"), "entry_type": entry_type.value, "category_id": category_id,
+         "amount": float(amount), "count": count}
+        for (month, entry_type, category_id), (amount, count) in sorted(
+            delta.monthly.items(), key=lambda kv: (kv[0][0], kv[0][1].name, kv[0][2] or 0))
+        if amount or count
+    ]
+
+
+async def record_change(db: AsyncSession, op: str, deltas: Optional[list[dict]] = None, entry: Optional[dict] = None,
+                        entry_id: Optional[int] = None, entry_ids: Optional[list[int]] = None):
+    """Add an event to the writing transaction; listeners hear of it on commit.
+
+    Call it last before committing, after the rollups are updated: the lock
+    is then held briefly and always taken after the rollup row locks.
+    Without ``deltas`` (see ``monthly_deltas``) clients re-fetch the summaries.
+    """
+    data = {"op": op, "entry_id": entry_id, "entry": entry, "deltas": deltas}
+    if entry_ids is not None:
+        data["entry_ids"] = entry_ids
+    # One statement: the id is drawn only once the lock is held, then announced
+    lock = select(func.pg_advisory_xact_lock(FEED_LOCK)).subquery("lock")
+    new = (
+        insert(EntryChange)
+        .from_select(["op", "entry_id", "data"],
+                     select(literal(op), literal(entry_id, Integer), literal(orjson.dumps(data).decode())).select_from(lock))
+        .returning(EntryChange.id)
+        .cte("new")
+    )
+    await db.execute(select(func.pg_notify(settings.CHANGE_FEED_CHANNEL, cast(new.c.id, Text))))
+
+
+def sse(event: str, event_id: Optional[int] = None, data: str = "{}") -> bytes:
+    """One Server-Sent Events message; ``data`` must be a single line."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n".encode()
+
+
+class ChangeFeed:
+    """Fans the events of all workers out to this worker's SSE clients."""
+
+    def __init__(self, bind: AsyncEngine = engine, channel: str = settings.CHANGE_FEED_CHANNEL,
+                 queue_size: int = settings.CHANGE_FEED_QUEUE_SIZE):
+        self.bind = bind
+        self.channel = channel
+        self.queue_size = queue_size
+        self.subscribers: set[asyncio.Queue] = set()
+        self.last_id = 0
+        self.wakeup = asyncio.Event()
+        self.conn = None
+        self.raw = None
+        self.connected = asyncio.Event()
+        self.lost = asyncio.Event()
+        self.tasks: list[asyncio.Task] = []
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.wakeup.set()
+
+    def _on_lost(self, connection):
+        self.lost.set()
+
+    async def start(self):
+        """Listen in the background; the app starts even if the database is down."""
+        self.tasks = [asyncio.create_task(self.listen()), asyncio.create_task(self.deliver()),
+                      asyncio.create_task(self.clean_up())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.disconnect()
+
+    async def connect(self):
+        self.lost.clear()
+        self.conn = await self.bind.connect()
+        self.raw = (await self.conn.get_raw_connection()).driver_connection
+        await self.raw.add_listener(self.channel, self._on_notify)
+        self.raw.add_termination_listener(self._on_lost)
+        # Listening first, so nothing committed from here on goes unnoticed
+        if not self.last_id:
+            async with AsyncSession(self.bind) as db:
+                self.last_id = (await db.execute(select(func.max(EntryChange.id)))).scalar() or 0
+        # After a reconnect: read what was committed while nobody listened
+        self.wakeup.set()
+        self.connected.set()
+        log.info("Change feed listening on %s", self.channel)
+
+    async def disconnect(self, broken: bool = False):
+        """Give the connection back, or drop it from the pool if it is ``broken``."""
+        self.connected.clear()
+        if self.conn is not None:
+            conn, raw, self.conn, self.raw = self.conn, self.raw, None, None
+            if not broken:
+                try:
+                    await raw.remove_listener(self.channel, self._on_notify)
+                    raw.remove_termination_listener(self._on_lost)
+                    await conn.close()
+                    return
+                except Exception:
+                    pass
+            await conn.invalidate()
+
+    async def listen(self):
+        """Keep a LISTEN connection open, reconnecting with backoff."""
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                await self.connect()
+                delay = RECONNECT_DELAY
+                while not self.lost.is_set():
+                    try:
+                        await asyncio.wait_for(self.lost.wait(), LISTEN_CHECK_INTERVAL)
+                    except asyncio.TimeoutError:
+                        # Outside any transaction, so the connection never idles in one
+                        await self.raw.execute("SELECT 1")
+                log.warning("Change feed lost its connection; reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Change feed cannot listen (%s); retrying in %.1fs", e, delay)
+            await self.disconnect(broken=True)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def read(self, after: int, limit: Optional[int] = None) -> list[tuple[int, str, str]]:
+        stmt = select(EntryChange.id, EntryChange.op, EntryChange.data).where(EntryChange.id > after) \
+            .order_by(EntryChange.id).limit(limit)
+        async with AsyncSession(self.bind) as db:
+            return [tuple(row) for row in (await db.execute(stmt)).all()]
+
+    def publish(self, event: tuple[int, str, str]):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow: drop its backlog and let it resume from the table
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(OVERFLOW)
+
+    async def deliver(self):
+        """Read new events once per wakeup, however many notifications came in."""
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                events = await self.read(self.last_id)
+            except Exception:
+                log.exception("Could not read new entry changes")
+                await asyncio.sleep(1)
+                self.wakeup.set()
+                continue
+            for event in events:
+                self.publish(event)
+            if events:
+                self.last_id = events[-1][0]
+
+    async def clean_up(self):
+        while True:
+            try:
+                await self.expire()
+            except Exception:
+                log.exception("Could not expire old entry changes")
+            await asyncio.sleep(CLEANUP_INTERVAL)
+
+    async def expire(self) -> int:
+        """Delete events past the retention period, always keeping the newest."""
+        cutoff = func.now() - timedelta(hours=settings.CHANGE_FEED_RETENTION_HOURS)
+        async with self.bind.begin() as conn:
+            newest = select(func.max(EntryChange.id)).scalar_subquery()
+            result = await conn.execute(
+                delete(EntryChange).where(EntryChange.created_at < cutoff, EntryChange.id < newest))
+        return result.rowcount
+
+    async def can_resume(self, after: int) -> bool:
+        """Whether every event after ``after`` is still in the table."""
+        async with AsyncSession(self.bind) as db:
+            oldest, newest = (await db.execute(select(func.min(EntryChange.id), func.max(EntryChange.id)))).one()
+        if newest is None:
+            return after == 0
+        # Ids skipped by rolled-back writes also end up here; a needless reset is harmless
+        return oldest <= after + 1 and after <= newest
+
+    async def events(self, after: Optional[int] = None,
+                     heartbeat: float = settings.CHANGE_FEED_HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+        """The SSE stream of one client: missed events after ``after``, then live ones."""
+        queue = asyncio.Queue(self.queue_size)
+        # Subscribed before the replay reads the table, so no event falls in between
+        self.subscribers.add(queue)
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            sent = self.last_id
+            if after is not None:
+                if not await self.can_resume(after):
+                    yield sse("reset")
+                else:
+                    sent = after
+                    while batch := await self.read(sent, REPLAY_BATCH_SIZE):
+                        for event_id, op, data in batch:
+                            yield sse(op, event_id, data)
+                        sent = batch[-1][0]
+            # Gives new and reset clients a token to resume from
+            yield sse("ready", sent)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # A comment keeps proxies from closing an idle stream
+                    yield b": keepalive\n\n"
+                    continue
+                if event is OVERFLOW:
+                    yield sse("overflow")
+                    return
+                event_id, op, data = event
+                if event_id > sent:
+                    yield sse(op, event_id, data)
+                    sent = event_id
+        finally:
+            self.subscribers.discard(queue)
+
+
+feed = ChangeFeed()
@@ -1,9 +1,73 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .config import settings
+from .metrics import Histogram, instrument_engine
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, max_overflow: int = settings.DB_MAX_OVERFLOW, **kw):
+        super().__init__(*args, max_overflow=max_overflow, **kw)
+        # As configured; QueuePool keeps it only in a private attribute
+        self.max_overflow = max_overflow
+        self.checkout_wait = Histogram()
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.checkout_wait.observe(time.perf_counter() - started)
+
+
+def make_engine(url: str, **overrides) -> AsyncEngine:
+    """An engine with the pool configured from settings; ``overrides`` win."""
+    options = dict(
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE},
+    )
+    engine = create_async_engine(url, **{**options, **overrides})
+    instrument_engine(engine)
+    return engine
+
+
+def pool_status(engine: AsyncEngine) -> dict:
+    pool = engine.pool
+    status = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        # QueuePool.overflow() is negative while fewer than pool_size connections exist
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "timeout": pool.timeout(),
+    }
+    if isinstance(pool, InstrumentedPool):
+        status["max_overflow"] = pool.max_overflow
+        status["timeouts"] = pool.timeouts
+        status["checkout_wait_seconds"] = pool.checkout_wait.snapshot()
+    return status
+
+
+engine = make_engine(settings.DATABASE_URL)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Without a replica, reads share the primary engine and its pool
+read_engine = make_engine(settings.DATABASE_URL_READ) if settings.DATABASE_URL_READ else engine
+read_session = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
 
 
 class Base(DeclarativeBase):
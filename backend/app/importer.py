@@ -0,0 +1,184 @@
+"""Bulk loading of entries from CSV or NDJSON through Postgres COPY."""
+import csv
+import json
+import time
+from typing import AsyncIterator
+from pydantic import ValidationError
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models.entry import Category, Project
+from .rollups import RollupDelta
+from .schemas.entry import EntryImportRow
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+ENTRY_COLUMNS = ["id", "date", "description", "amount", "entry_type", "category_id", "notes"]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+
+async def iter_csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict]]:
+    """Comma-separated with a header row; several projects are joined by ";"."""
+    header = None
+    pending, start, lineno = None, 0, 0
+    async for line in iter_lines(chunks):
+        lineno += 1
+        if pending is None:
+            pending, start = line, lineno
+        else:
+            pending += "\n" + line
+        # A quoted field may span lines; wait until its quotes are balanced
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, None
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [h.strip().lower() for h in values]
+        else:
+            yield start, dict(zip(header, values))
+    if pending is not None:
+        yield start, ValueError("unterminated quoted field")
+
+
+async def iter_ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict]]:
+    lineno = 0
+    async for line in iter_lines(chunks):
+        lineno += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield lineno, ValueError(f"invalid JSON: {e.msg}")
+            continue
+        yield lineno, record
+
+
+def format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc']) or 'row'}: {e['msg']}" for e in exc.errors())
+
+
+class BulkImporter:
+    """Validates rows as they arrive and COPYs them in batches.
+
+    Everything runs inside the session's transaction; the caller commits or
+    rolls back. Category and project names are resolved once per batch and
+    remembered for the rest of the import; unknown names are created.
+    Category ids given through ``category_id`` must already exist.
+    """
+
+    def __init__(self, db: AsyncSession, batch_size: int = BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.batch: list[tuple[int, EntryImportRow]] = []
+        self.categories: dict[str, int] = {}
+        self.category_ids: set[int] = set()
+        self.projects: dict[str, int] = {}
+        self.inserted = 0
+        self.error_count = 0
+        self.errors: list[dict] = []
+
+    def error(self, line: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    async def add(self, line: int, record):
+        if isinstance(record, Exception):
+            self.error(line, str(record))
+            return
+        if not isinstance(record, dict) or not record:
+            self.error(line, "expected an object with entry fields")
+            return
+        try:
+            row = EntryImportRow.model_validate(record)
+        except ValidationError as e:
+            self.error(line, format_validation_error(e))
+            return
+        self.batch.append((line, row))
+        if len(self.batch) >= self.batch_size:
+            await self.flush()
+
+    async def resolve_names(self, model, names: set[str], known: dict[str, int]):
+        missing = names - known.keys()
+        if not missing:
+            return
+        await self.db.execute(
+            insert(model).values([{"name": n} for n in missing]).on_conflict_do_nothing(index_elements=["name"])
+        )
+        known.update((await self.db.execute(select(model.name, model.id).where(model.name.in_(missing)))).all())
+
+    async def resolve_category_ids(self, ids: set[int]):
+        missing = ids - self.category_ids
+        if missing:
+            found = (await self.db.execute(select(Category.id).where(Category.id.in_(missing)))).scalars()
+            self.category_ids.update(found)
+
+    async def flush(self):
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+
+        await self.resolve_names(Category, {r.category for _, r in batch if r.category}, self.categories)
+        await self.resolve_category_ids({r.category_id for _, r in batch if r.category_id is not None})
+        await self.resolve_names(Project, {p for _, r in batch for p in r.projects}, self.projects)
+
+        rows = []
+        for line, r in batch:
+            category_id = r.category_id
+            if r.category:
+                category_id = self.categories[r.category]
+            elif category_id is not None and category_id not in self.category_ids:
+                self.error(line, f"category_id: unknown category id {category_id}")
+                continue
+            rows.append((r, category_id))
+        if not rows:
+            return
+
+        ids = (await self.db.execute(
+            text("SELECT nextval(pg_get_serial_sequence('entries', 'id')) FROM generate_series(1, :n)"),
+            {"n": len(rows)},
+        )).scalars().all()
+        entry_records = [
+            (entry_id, r.date, r.description, r.amount, r.entry_type.name, category_id, r.notes)
+            for entry_id, (r, category_id) in zip(ids, rows)
+        ]
+        project_records = [
+            (entry_id, r.date, self.projects[p]) for entry_id, (r, _) in zip(ids, rows) for p in r.projects
+        ]
+
+        # COPY on the session's own connection keeps it in the same transaction
+        conn = await (await self.db.connection()).get_raw_connection()
+        await conn.driver_connection.copy_records_to_table("entries", records=entry_records, columns=ENTRY_COLUMNS)
+        if project_records:
+            await conn.driver_connection.copy_records_to_table(
+                "entry_projects", records=project_records, columns=["entry_id", "entry_date", "project_id"]
+            )
+        delta = RollupDelta()
+        for entry_id, (r, category_id) in zip(ids, rows):
+            delta.add(r.date, r.amount, r.entry_type, category_id, [self.projects[p] for p in r.projects])
+        await delta.apply(self.db)
+        self.inserted += len(entry_records)
+
+
+async def import_entries(db: AsyncSession, records: AsyncIterator[tuple[int, dict]], batch_size: int = BATCH_SIZE) -> tuple[BulkImporter, float]:
+    started = time.perf_counter()
+    importer = BulkImporter(db, batch_size)
+    async for line, record in records:
+        await importer.add(line, record)
+    await importer.flush()
+    importer.errors.sort(key=lambda e: e["line"])
+    return importer, time.perf_counter() - started
@@ -1,8 +1,54 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .api import entries, categories, projects
+from sqlalchemy import text
+from .analytics import analytics
+from .api import entries, categories, projects, reports
+from .cache import NotifyListener, result_cache
+from .changefeed import feed as change_feed
+from .config import settings
+from .database import engine, read_engine, pool_status
+from .metrics import MetricsMiddleware, metric_lines, registry
+from .partitions import ensure_partitions
+from .replica import LAST_WRITE_HEADER, ReadYourWritesMiddleware
+from .reports import runner as report_runner
+from .warmup import warmup
 
-app = FastAPI(title="Income & Expense Tracker")
+log = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await ensure_partitions(engine)
+    except Exception:
+        # Bookings still land in the default partition; the next start retries
+        log.exception("Could not create the yearly entry partitions")
+    # Runs in the background; /api/health/ready waits for it
+    warmup.start(read_engine, engine, connections=settings.WARMUP_CONNECTIONS)
+    listener = None
+    if settings.CACHE_NOTIFY_CHANNEL:
+        listener = NotifyListener(engine, settings.CACHE_NOTIFY_CHANNEL)
+        await listener.start()
+    # Listens in the background and reconnects, so a database outage does not stop the start
+    await change_feed.start()
+    if settings.ANALYTICS_ENGINE:
+        analytics.start(engine)
+    if settings.REPORT_WORKERS:
+        await report_runner.start()
+    yield
+    await warmup.stop()
+    await analytics.stop()
+    await report_runner.stop()
+    await change_feed.stop()
+    if listener:
+        await listener.stop()
+
+
+app = FastAPI(title="Income & Expense Tracker", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,13 +56,83 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Query-Count", "Server-Timing", "ETag", LAST_WRITE_HEADER],
 )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(entries.router)
 app.include_router(categories.router)
 app.include_router(projects.router)
+app.include_router(reports.router)
 
 
 @app.get("/api/health")
+@app.get("/api/health/live")
 async def health():
+    """Liveness: the process serves requests. Says nothing about the database."""
     return {"status": "ok"}
+
+
+async def database_status(bind) -> str:
+    async def ping():
+        async with bind.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    try:
+        # Covers waiting for a pooled connection as well as the query
+        await asyncio.wait_for(ping(), settings.READY_TIMEOUT_SECONDS)
+        return "ok"
+    except Exception as e:
+        return f"unreachable: {type(e).__name__}"
+
+
+@app.get("/api/health/ready")
+async def ready():
+    """Readiness: warmup finished and every database answers; 503 otherwise."""
+    engines = dict.fromkeys(warmup.engines or (engine,))
+    databases = await asyncio.gather(*(database_status(bind) for bind in engines))
+    is_ready = warmup.done and all(d == "ok" for d in databases)
+    return JSONResponse({
+        "status": "ready" if is_ready else "not ready",
+        "warmup": warmup.status(),
+        "databases": [{"url": bind.url.render_as_string(hide_password=True), "status": status, "pool": pool_status(bind)}
+                      for bind, status in zip(engines, databases)],
+    }, status_code=200 if is_ready else 503)
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
+
+
+@app.get("/api/analytics/stats")
+async def analytics_stats():
+    return analytics.stats()
+
+
+@app.get("/api/pool")
+async def pool():
+    return pool_status(engine)
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    pool = pool_status(engine)
+    cache = result_cache.stats()
+    extra = [
+        *metric_lines("db_pool_checked_out", "gauge", "Connections in use.", pool["checked_out"]),
+        *metric_lines("db_pool_idle", "gauge", "Idle pooled connections.", pool["idle"]),
+        *metric_lines("db_pool_overflow", "gauge", "Connections above pool_size.", pool["overflow"]),
+        *metric_lines("db_pool_timeouts_total", "counter", "Checkouts that hit pool_timeout.", pool["timeouts"]),
+        "# HELP db_pool_checkout_wait_seconds Time spent waiting for a pooled connection.",
+        "# TYPE db_pool_checkout_wait_seconds histogram",
+        *(f'db_pool_checkout_wait_seconds_bucket{{le="{le}"}} {n}'
+          for le, n in pool["checkout_wait_seconds"]["buckets"].items()),
+        f'db_pool_checkout_wait_seconds_sum {pool["checkout_wait_seconds"]["sum"]}',
+        f'db_pool_checkout_wait_seconds_count {pool["checkout_wait_seconds"]["count"]}',
+        *metric_lines("result_cache_hits_total", "counter", "Result cache hits.", cache["hits"]),
+        *metric_lines("result_cache_misses_total", "counter", "Result cache misses.", cache["misses"]),
+        *metric_lines("result_cache_evictions_total", "counter", "Result cache LRU evictions.", cache["evictions"]),
+    ]
+    return PlainTextResponse(registry.render(extra), media_type="text/plain; version=0.0.4")
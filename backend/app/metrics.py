@@ -0,0 +1,202 @@
+"""Request, SQL and pool metrics, exposed in Prometheus text format."""
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Iterable, Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from .config import settings
+
+slow_log = logging.getLogger("app.sql.slow")
+
+# Upper bounds in seconds, Prometheus style; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """(upper bound, observations <= bound) pairs ending with +Inf."""
+        total, out = 0, []
+        for bound, n in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": dict(self.cumulative())}
+
+
+class RequestStats:
+    __slots__ = ("queries", "sql_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+# Statistics of the request being handled, read by the SQL hooks
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses: dict[int, int] = defaultdict(int)
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+class Registry:
+    """Per route template request and SQL totals, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.routes: dict[tuple[str, str], RouteMetrics] = defaultdict(RouteMetrics)
+        self.queries_outside_requests = 0
+        self.failed_queries = 0
+        self.slow_queries = 0
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        m = self.routes[(method, route)]
+        m.latency.observe(seconds)
+        m.statuses[status] += 1
+        m.queries += stats.queries
+        m.sql_seconds += stats.sql_seconds
+
+    def render(self, extra: Iterable[str] = ()) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), m in sorted(self.routes.items()):
+            labels = f'method="{method}",route="{_escape(route)}"'
+            for bound, n in m.latency.cumulative():
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {n}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {m.latency.sum}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {m.latency.count}")
+        lines += ["# HELP http_requests_total Responses by route template and status.",
+                  "# TYPE http_requests_total counter"]
+        for (method, route), m in sorted(self.routes.items()):
+            for status, n in sorted(m.statuses.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {n}')
+        lines += ["# HELP sql_statements_total SQL statements executed while handling requests.",
+                  "# TYPE sql_statements_total counter"]
+        for (method, route), m in sorted(self.routes.items()):
+            lines.append(f'sql_statements_total{{method="{method}",route="{_escape(route)}"}} {m.queries}')
+        lines += ["# HELP sql_duration_seconds_total Time spent in SQL statements while handling requests.",
+                  "# TYPE sql_duration_seconds_total counter"]
+        for (method, route), m in sorted(self.routes.items()):
+            lines.append(f'sql_duration_seconds_total{{method="{method}",route="{_escape(route)}"}} {m.sql_seconds}')
+        lines += [
+            "# HELP sql_slow_statements_total Statements slower than SLOW_QUERY_MS.",
+            "# TYPE sql_slow_statements_total counter",
+            f"sql_slow_statements_total {self.slow_queries}",
+            "# HELP sql_failed_statements_total Statements that raised an error.",
+            "# TYPE sql_failed_statements_total counter",
+            f"sql_failed_statements_total {self.failed_queries}",
+            "# HELP sql_statements_outside_requests_total Statements run by background tasks and startup.",
+            "# TYPE sql_statements_outside_requests_total counter",
+            f"sql_statements_outside_requests_total {self.queries_outside_requests}",
+            *extra,
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def metric_lines(name: str, kind: str, help: str, value) -> list[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+registry = Registry()
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Count and time every statement, attributing it to the current request."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def finish(conn, statement):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_seconds += elapsed
+        else:
+            registry.queries_outside_requests += 1
+        if settings.SLOW_QUERY_MS is not None and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+            registry.slow_queries += 1
+            slow_log.warning("%.1f ms: %s", elapsed * 1000, " ".join(statement.split())[:1000])
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        finish(conn, statement)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def handle_error(context):
+        # after_cursor_execute does not run for a failed statement; take its start time here
+        conn = context.connection
+        if context.statement is not None and conn is not None and conn.info.get("query_started"):
+            registry.failed_queries += 1
+            finish(conn, context.statement)
+
+
+class MetricsMiddleware:
+    """Records latency, status and SQL totals per route template.
+
+    With ``DEBUG_QUERY_HEADERS`` the response also carries ``X-Query-Count``
+    and a ``Server-Timing`` header with the SQL time of the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.DEBUG_QUERY_HEADERS:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("X-Query-Count", str(stats.queries))
+                    headers.append("Server-Timing", (
+                        f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                        f"app;dur={(time.perf_counter() - started) * 1000:.1f}"
+                    ))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            registry.observe_request(scope["method"], getattr(route, "path", "<unmatched>"), status,
+                                     time.perf_counter() - started, stats)
+            current_request.reset(token)
@@ -1 +1,5 @@
 from .entry import Entry, EntryProject, Project, Category
+from .rollup import MonthlyRollup, ProjectMonthlyRollup
+from .watermark import TableVersion
+from .report import ReportJob
+from .change import EntryChange
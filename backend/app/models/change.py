@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, func
+from ..database import Base
+
+
+class EntryChange(Base):
+    """One published entry change; the id is the resume token of the change feed."""
+    __tablename__ = "entry_changes"
+    id = Column(BigInteger, primary_key=True)
+    # created, updated, deleted, or updated_many/deleted_many/imported for batches;
+    # reset after a rollup rebuild
+    op = Column(String(20), nullable=False)
+    entry_id = Column(Integer, nullable=True)
+    # The event as sent, serialized once by the writer
+    data = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
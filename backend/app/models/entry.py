@@ -1,13 +1,32 @@
-from sqlalchemy import Column, Integer, String, Numeric, Date, Text, ForeignKey, Table, Enum as SAEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column, Integer, String, Numeric, Date, Text, ForeignKey, ForeignKeyConstraint, Table, Index, Computed, DDL,
+    event, literal_column, Enum as SAEnum,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 import enum
 from ..database import Base
 
 entry_projects = Table(
     "entry_projects",
     Base.metadata,
-    Column("entry_id", Integer, ForeignKey("entries.id", ondelete="CASCADE"), primary_key=True),
+    Column("entry_id", Integer, primary_key=True),
+    # entries is partitioned by date, so references to it carry the date too
+    Column("entry_date", Date, nullable=False),
     Column("project_id", Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True),
+    ForeignKeyConstraint(["entry_id", "entry_date"], ["entries.id", "entries.date"],
+                         ondelete="CASCADE", onupdate="CASCADE"),
+    # The primary key leads with entry_id; project filters need the reverse
+    Index("ix_entry_projects_project_id_entry_id", "project_id", "entry_id"),
+)
+
+
+# Text search configuration for descriptions and notes
+TS_CONFIG = literal_column("'german'::regconfig")
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('german'::regconfig, coalesce(description, '')), 'A') || "
+    "setweight(to_tsvector('german'::regconfig, coalesce(notes, '')), 'B')"
 )
 
 
@@ -18,28 +37,104 @@ class EntryType(str, enum.Enum):
 
 class Category(Base):
     __tablename__ = "categories"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String(100), unique=True, nullable=False)
 
 
 class Project(Base):
     __tablename__ = "projects"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String(100), unique=True, nullable=False)
 
 
 class Entry(Base):
     __tablename__ = "entries"
-    id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False)
+    __table_args__ = (
+        # Newest-first listing and keyset pages; the included columns let
+        # summary aggregate a date range with an index-only scan
+        Index(
+            "ix_entries_date_id", "date", "id",
+            postgresql_include=["entry_type", "category_id", "amount"],
+        ),
+        Index("ix_entries_category_id_date_id", "category_id", "date", "id"),
+        Index("ix_entries_entry_type_date_id", "entry_type", "date", "id"),
+        Index("ix_entries_search_vector", "search_vector", postgresql_using="gin"),
+        # One partition per booking year, see app.partitions
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+    # The partition key has to be part of the primary key; ids stay unique through their sequence
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    date = Column(Date, primary_key=True)
     description = Column(String(500), nullable=False)
     amount = Column(Numeric(12, 2), nullable=False)
     entry_type = Column(SAEnum(EntryType), nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
     notes = Column(Text, nullable=True)
+    # Matches in the description rank above matches in the notes
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR, persisted=True)))
+
+    # Queries choose their own loader options; touching an unloaded one is an error
+    category = relationship("Category", lazy="raise")
+    projects = relationship("Project", secondary=entry_projects, lazy="raise", order_by="Project.id")
+
+
+CREATE_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_entries_partition(year int) RETURNS boolean LANGUAGE plpgsql AS $$
+DECLARE
+    part text := 'entries_' || year;
+    lo date := make_date(year, 1, 1);
+    hi date := make_date(year + 1, 1, 1);
+    create_part text := 'CREATE TABLE ' || quote_ident(part) || ' PARTITION OF entries FOR VALUES FROM ('
+        || quote_literal(lo) || ') TO (' || quote_literal(hi) || ')';
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM entries_default WHERE date >= lo AND date < hi) THEN
+        EXECUTE create_part;
+        RETURN true;
+    END IF;
+    -- The default partition may not keep rows of a new partition's range:
+    -- move them over, restoring the project links the delete cascades away
+    CREATE TEMP TABLE moved_entries AS
+        SELECT id, date, description, amount, entry_type, category_id, notes
+        FROM entries_default WHERE date >= lo AND date < hi;
+    CREATE TEMP TABLE moved_links AS
+        SELECT l.entry_id, l.entry_date, l.project_id
+        FROM entry_projects l JOIN moved_entries e ON e.id = l.entry_id AND e.date = l.entry_date;
+    DELETE FROM entries_default WHERE date >= lo AND date < hi;
+    EXECUTE create_part;
+    INSERT INTO entries (id, date, description, amount, entry_type, category_id, notes)
+        SELECT * FROM moved_entries;
+    INSERT INTO entry_projects (entry_id, entry_date, project_id) SELECT * FROM moved_links;
+    DROP TABLE moved_entries, moved_links;
+    RETURN true;
+END
+$$
+"""
+
+ENSURE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION ensure_entries_partitions(first_year int, last_year int) RETURNS int LANGUAGE plpgsql AS $$
+DECLARE
+    created int := 0;
+BEGIN
+    FOR y IN first_year..last_year LOOP
+        IF create_entries_partition(y) THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END
+$$
+"""
 
-    category = relationship("Category", lazy="selectin")
-    projects = relationship("Project", secondary=entry_projects, lazy="selectin")
+event.listen(Entry.__table__, "after_create", DDL("CREATE TABLE entries_default PARTITION OF entries DEFAULT"))
+# After every table exists, since moving rows touches entry_projects
+for statement in (CREATE_PARTITION_FUNCTION, ENSURE_PARTITIONS_FUNCTION):
+    event.listen(Base.metadata, "after_create", DDL(statement))
+event.listen(Base.metadata, "after_create", DDL(
+    "SELECT ensure_entries_partitions(extract(year FROM current_date)::int, extract(year FROM current_date)::int + 1)"
+))
 
 
 # Alias for import convenience
@@ -0,0 +1,36 @@
+import enum
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Float, Text, Index, func, Enum as SAEnum
+from ..database import Base
+
+
+class ReportStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    # Done, but the artifact was removed after the retention period
+    EXPIRED = "expired"
+
+
+class ReportJob(Base):
+    """A queued or generated report; the workers in app.reports pick these up."""
+    __tablename__ = "report_jobs"
+    __table_args__ = (
+        # Workers take the oldest queued job
+        Index("ix_report_jobs_status_created_at", "status", "created_at"),
+    )
+    id = Column(Integer, primary_key=True)
+    status = Column(SAEnum(ReportStatus), nullable=False, default=ReportStatus.QUEUED)
+    format = Column(String(10), nullable=False)
+    date_from = Column(Date, nullable=False)
+    date_to = Column(Date, nullable=False)
+    progress = Column(Float, nullable=False, default=0)
+    # Claims so far; a job whose worker died is retried a few times
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    file_path = Column(String(500), nullable=True)
+    file_size = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, Numeric, Date, ForeignKey, Index, func, literal_column, Enum as SAEnum
+from ..database import Base
+from .entry import EntryType
+
+
+class MonthlyRollup(Base):
+    """Per-month totals of entries by type and category, kept in step with every write."""
+    __tablename__ = "monthly_rollups"
+    id = Column(Integer, primary_key=True)
+    month = Column(Date, nullable=False)
+    entry_type = Column(SAEnum(EntryType), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    amount = Column(Numeric(14, 2), nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+
+
+# Entries without a category share one rollup row per month and type
+monthly_rollup_key = (MonthlyRollup.month, MonthlyRollup.entry_type, func.coalesce(MonthlyRollup.category_id, literal_column("0")))
+Index("uq_monthly_rollups_key", *monthly_rollup_key, unique=True)
+
+
+class ProjectMonthlyRollup(Base):
+    """Per-month totals of entries by type for each linked project."""
+    __tablename__ = "project_monthly_rollups"
+    month = Column(Date, primary_key=True)
+    entry_type = Column(SAEnum(EntryType), primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    amount = Column(Numeric(14, 2), nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
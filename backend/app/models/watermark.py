@@ -0,0 +1,62 @@
+from sqlalchemy import Column, String, BigInteger, DDL, event
+from ..database import Base
+
+# Tables whose writes move a watermark; conditional GETs combine the ones they read
+WATCHED_TABLES = ("categories", "projects", "entries", "entry_projects")
+
+
+class TableVersion(Base):
+    """One bump of a table's change counter; the table's version is the sum of its rows.
+
+    Statement triggers insert a row in the writing transaction rather than
+    update a shared one, so writers never wait on each other's counter.
+    """
+    __tablename__ = "table_versions"
+    id = Column(BigInteger, primary_key=True)
+    name = Column(String(63), nullable=False, index=True)
+    version = Column(BigInteger, nullable=False, server_default="1")
+
+
+# Advisory lock key of the writer folding the bumps, and how often one does
+FOLD_LOCK = 0x56455253
+FOLD_EVERY = 64
+
+# Every FOLD_EVERY-th bump folds the committed rows into one per table, in
+# the same transaction, so readers see the same sums before and after. A
+# writer that finds another one folding just skips it.
+BUMP_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    bump bigint;
+BEGIN
+    INSERT INTO table_versions (name) VALUES (TG_TABLE_NAME) RETURNING id INTO bump;
+    IF mod(bump, {FOLD_EVERY}) = 0 AND pg_try_advisory_xact_lock({FOLD_LOCK}) THEN
+        WITH folded AS (DELETE FROM table_versions WHERE id < bump RETURNING name, version)
+        INSERT INTO table_versions (name, version) SELECT name, sum(version) FROM folded GROUP BY name;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# Counters start at the creation time in milliseconds, so a recreated
+# database does not hand out versions a client may still hold
+SEED_VERSIONS = """
+INSERT INTO table_versions (name, version)
+SELECT t.name, (extract(epoch FROM clock_timestamp()) * 1000)::bigint
+FROM unnest(ARRAY[{names}]) AS t(name)
+WHERE NOT EXISTS (SELECT 1 FROM table_versions v WHERE v.name = t.name)
+""".format(names=", ".join(f"'{t}'" for t in WATCHED_TABLES))
+
+
+def trigger_ddl(table: str) -> list[str]:
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_bump_version ON {table}",
+        f"CREATE TRIGGER {table}_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()",
+    ]
+
+
+# create_all runs this after every table exists; migrations do the same by hand
+for statement in [BUMP_FUNCTION, SEED_VERSIONS, *(s for t in WATCHED_TABLES for s in trigger_ddl(t))]:
+    event.listen(Base.metadata, "after_create", DDL(statement))
@@ -0,0 +1,52 @@
+"""Yearly partitions of the entries table.
+
+``entries`` is range-partitioned by booking year; dates outside the created
+years land in ``entries_default``. The API creates the current and next
+year's partitions on startup, so a new year's bookings have their partition
+before they arrive. Creating a partition moves any rows of its year out of
+the default partition, project links included.
+
+Usage: python -m app.partitions [FIRST_YEAR [LAST_YEAR]]
+"""
+import asyncio
+import sys
+from datetime import date
+from typing import Optional
+from sqlalchemy import text
+from .database import engine
+
+
+async def ensure_partitions(bind, first_year: Optional[int] = None, last_year: Optional[int] = None) -> int:
+    """Create the missing partitions from ``first_year`` through ``last_year``; returns how many."""
+    this_year = date.today().year
+    first_year = first_year or this_year
+    last_year = last_year or max(first_year, this_year + 1)
+    async with bind.begin() as conn:
+        return (await conn.execute(text("SELECT ensure_entries_partitions(:first, :last)"),
+                                   {"first": first_year, "last": last_year})).scalar()
+
+
+async def partitions(bind) -> list[tuple[str, str, int]]:
+    """Name, bounds and estimated row count of every partition."""
+    async with bind.connect() as conn:
+        return (await conn.execute(text("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), greatest(c.reltuples, 0)::bigint
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'entries'::regclass
+            ORDER BY c.relname
+        """))).all()
+
+
+async def main(args: list[str]) -> int:
+    years = [int(a) for a in args]
+    created = await ensure_partitions(engine, *years)
+    for name, bounds, rows in await partitions(engine):
+        print(f"{name:20} {bounds:55} ~{rows} rows")
+    print(f"{created} partitions created.")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 or not all(a.isdigit() for a in sys.argv[1:]):
+        sys.exit("usage: python -m app.partitions [FIRST_YEAR [LAST_YEAR]]")
+    sys.exit(asyncio.run(main(sys.argv[1:])))
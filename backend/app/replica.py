@@ -0,0 +1,62 @@
+"""Routing of GET endpoints to the read replica, with read-your-writes.
+
+A successful write stamps the response with its time, as the ``last_write``
+cookie and the ``X-Last-Write`` header. Reads that send either back within
+``READ_YOUR_WRITES_SECONDS`` go to the primary, so a client never sees the
+replica lag behind its own changes.
+"""
+import math
+import time
+from fastapi import Request
+from starlette.datastructures import MutableHeaders
+from .config import settings
+from .database import async_session, read_session
+
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def wrote_recently(request: Request) -> bool:
+    for value in (request.headers.get(LAST_WRITE_HEADER), request.cookies.get(LAST_WRITE_COOKIE)):
+        try:
+            if value and time.time() - float(value) < settings.READ_YOUR_WRITES_SECONDS:
+                return True
+        except ValueError:
+            pass
+    return False
+
+
+def read_db(primary, replica):
+    """A ``get_db`` alternative for reads: ``replica`` unless the client wrote recently."""
+    async def get_read_db(request: Request):
+        factory = primary if wrote_recently(request) else replica
+        async with factory() as session:
+            yield session
+    return get_read_db
+
+
+get_read_db = read_db(async_session, read_session)
+
+
+class ReadYourWritesMiddleware:
+    """Stamps successful non-GET responses with the time of the write."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                stamp = f"{time.time():.3f}"
+                headers = MutableHeaders(scope=message)
+                headers.append(LAST_WRITE_HEADER, stamp)
+                headers.append("Set-Cookie", f"{LAST_WRITE_COOKIE}={stamp}; Max-Age="
+                               f"{math.ceil(settings.READ_YOUR_WRITES_SECONDS)}; Path=/; SameSite=Lax")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,297 @@
+"""Background generation of the annual Einnahmen-Ausgaben-Rechnung.
+
+Jobs live in ``report_jobs``, so a restart loses none: ``POST /api/reports``
+only queues one, and every API process runs ``REPORT_WORKERS`` workers that
+claim queued jobs. Claims are serialized by an advisory lock and stop at
+``REPORT_MAX_RUNNING`` running jobs across all processes, which bounds the
+report queries against the database. Running jobs refresh a heartbeat as
+they write; one whose heartbeat is older than ``REPORT_STALE_SECONDS`` lost
+its worker and is queued again, at most ``MAX_ATTEMPTS`` times in all.
+
+A report is read in one repeatable-read transaction, so its totals and its
+entry list agree, and is written to ``REPORT_DIR`` as CSV or JSON. Artifacts
+are deleted ``REPORT_RETENTION_HOURS`` after the job finished.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Optional
+import orjson
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .api.entries import EXPORT_COLUMNS, STREAM_BATCH_SIZE, csv_rows, export_csv_row, export_query, export_record
+from .config import settings
+from .database import engine
+from .models.entry import Category, Entry, EntryType, Project
+from .models.report import ReportJob, ReportStatus
+from .rollups import raw_monthly_query, raw_project_query
+
+log = logging.getLogger(__name__)
+
+# Advisory lock key serializing claims between processes
+CLAIM_LOCK = 0x52455054
+MAX_ATTEMPTS = 3
+# Seconds between progress writes, which double as heartbeats
+PROGRESS_INTERVAL = 1.0
+CLEANUP_INTERVAL = 300
+
+
+class JobLost(Exception):
+    """The job was given to another worker after this one missed its heartbeat."""
+
+
+def in_range(stmt, date_from: date, date_to: date):
+    return stmt.where(Entry.date >= date_from, Entry.date <= date_to)
+
+
+def sums() -> dict:
+    return {"income": Decimal(0), "expense": Decimal(0)}
+
+
+def figures(s: dict) -> dict:
+    return {"income": s["income"], "expense": s["expense"], "net": s["income"] - s["expense"]}
+
+
+def report_sections(monthly_rows, project_rows, categories: dict, projects: dict) -> dict:
+    """Totals, months, categories and projects of a report; amounts stay Decimal."""
+    total, monthly = sums(), defaultdict(sums)
+    by_category, by_project = defaultdict(sums), defaultdict(sums)
+    for month, entry_type, category_id, amount, _ in monthly_rows:
+        side = "income" if entry_type == EntryType.EINNAHME else "expense"
+        total[side] += amount
+        monthly[month][side] += amount
+        by_category[category_id][side] += amount
+    for _, entry_type, project_id, amount, _ in project_rows:
+        by_project[project_id]["income" if entry_type == EntryType.EINNAHME else "expense"] += amount
+    return {
+        "totals": figures(total),
+        "monthly": [{"month": m.strftime("%Y-%m"), **figures(s)} for m, s in sorted(monthly.items())],
+        # Uncategorized entries sort first, with a null name
+        "by_category": [
+            {"name": categories.get(c), **figures(s)}
+            for c, s in sorted(by_category.items(), key=lambda kv: (kv[0] is not None, categories.get(kv[0]) or ""))
+        ],
+        # An entry counts in full for each of its projects, as in the project rollups
+        "by_project": [{"name": projects[p], **figures(s)}
+                       for p, s in sorted(by_project.items(), key=lambda kv: projects[kv[0]])],
+    }
+
+
+def sections_csv(job: ReportJob, sections: dict) -> str:
+    def table(label, rows, key):
+        return [[label, "income", "expense", "net"],
+                *([r[key] or "", r["income"], r["expense"], r["net"]] for r in rows), []]
+
+    return csv_rows([
+        ["Einnahmen-Ausgaben-Rechnung", job.date_from.isoformat(), job.date_to.isoformat()], [],
+        *table("total", [{"total": "total", **sections["totals"]}], "total"),
+        *table("month", sections["monthly"], "month"),
+        *table("category", sections["by_category"], "name"),
+        *table("project", sections["by_project"], "name"),
+        EXPORT_COLUMNS,
+    ])
+
+
+def as_floats(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, dict):
+        return {k: as_floats(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [as_floats(v) for v in value]
+    return value
+
+
+class ReportRunner:
+    """Claims queued report jobs and writes their artifacts."""
+
+    def __init__(self, bind: AsyncEngine = engine, directory: str = settings.REPORT_DIR,
+                 workers: int = settings.REPORT_WORKERS, max_running: int = settings.REPORT_MAX_RUNNING):
+        self.bind = bind
+        self.directory = Path(directory)
+        self.workers = workers
+        self.max_running = max_running
+        self.wakeup = asyncio.Event()
+        self.tasks: list[asyncio.Task] = []
+
+    def notify(self):
+        """Wake idle workers, e.g. after queueing a job."""
+        self.wakeup.set()
+
+    async def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self.clean_up()))
+        log.info("Started %d report workers", self.workers)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def work(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                ran = await self.run_next()
+            except Exception:
+                log.exception("Report worker failed to claim a job")
+                ran = False
+            if not ran:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), settings.REPORT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def clean_up(self):
+        while True:
+            try:
+                await self.expire()
+            except Exception:
+                log.exception("Could not expire old reports")
+            await asyncio.sleep(CLEANUP_INTERVAL)
+
+    async def claim(self) -> Optional[ReportJob]:
+        """Take the oldest queued job, unless ``max_running`` jobs already run."""
+        async with self.bind.begin() as conn:
+            await conn.execute(select(func.pg_advisory_xact_lock(CLAIM_LOCK)))
+            lost = (ReportJob.status == ReportStatus.RUNNING) \
+                & (ReportJob.heartbeat_at < func.now() - timedelta(seconds=settings.REPORT_STALE_SECONDS))
+            await conn.execute(update(ReportJob).where(lost, ReportJob.attempts >= MAX_ATTEMPTS).values(
+                status=ReportStatus.FAILED, error="The report worker stopped too often", finished_at=func.now(),
+            ))
+            await conn.execute(update(ReportJob).where(lost).values(status=ReportStatus.QUEUED))
+            running = (await conn.execute(
+                select(func.count()).select_from(ReportJob).where(ReportJob.status == ReportStatus.RUNNING)
+            )).scalar()
+            if running >= self.max_running:
+                return None
+            oldest = (
+                select(ReportJob.id).where(ReportJob.status == ReportStatus.QUEUED)
+                .order_by(ReportJob.created_at, ReportJob.id).limit(1)
+                .with_for_update(skip_locked=True).scalar_subquery()
+            )
+            row = (await conn.execute(
+                update(ReportJob).where(ReportJob.id == oldest)
+                .values(status=ReportStatus.RUNNING, attempts=ReportJob.attempts + 1, progress=0, error=None,
+                        started_at=func.now(), heartbeat_at=func.now())
+                .returning(*ReportJob.__table__.c)
+            )).one_or_none()
+        return ReportJob(**row._mapping) if row else None
+
+    async def report(self, job: ReportJob, **values) -> bool:
+        """Update the job if this worker still holds it; the attempt count tells claims apart."""
+        async with self.bind.begin() as conn:
+            result = await conn.execute(
+                update(ReportJob)
+                .where(ReportJob.id == job.id, ReportJob.attempts == job.attempts,
+                       ReportJob.status == ReportStatus.RUNNING)
+                .values(heartbeat_at=func.now(), **values)
+            )
+        return result.rowcount == 1
+
+    async def run_next(self) -> bool:
+        """Claim and generate one job; returns whether there was one."""
+        job = await self.claim()
+        if job is None:
+            return False
+        try:
+            path = await self.generate(job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job straight to the next worker
+            await self.report(job, status=ReportStatus.QUEUED)
+            raise
+        except JobLost:
+            log.warning("Report %d was taken over by another worker", job.id)
+        except Exception as e:
+            log.exception("Report %d failed", job.id)
+            await self.report(job, status=ReportStatus.FAILED, error=str(e) or type(e).__name__,
+                              finished_at=func.now())
+        else:
+            await self.report(job, status=ReportStatus.DONE, progress=1, file_path=str(path),
+                              file_size=path.stat().st_size, finished_at=func.now())
+        # A slot is free again
+        self.notify()
+        return True
+
+    async def generate(self, job: ReportJob) -> Path:
+        path = self.directory / f"report-{job.id}.{job.format}"
+        # Each claim writes its own file, so a worker that lost the job cannot mix into the next one's
+        partial = self.directory / f"report-{job.id}-{job.attempts}.{job.format}.part"
+        try:
+            await self.write(job, partial)
+            # Checked last, so only the worker holding the job puts its file in place
+            if not await self.report(job):
+                raise JobLost()
+            await asyncio.to_thread(os.replace, partial, path)
+        except BaseException:
+            await asyncio.to_thread(partial.unlink, missing_ok=True)
+            raise
+        return path
+
+    async def write(self, job: ReportJob, partial: Path):
+        async with self.bind.connect() as conn:
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+            async with conn.begin():
+                total = (await conn.execute(
+                    in_range(select(func.count()).select_from(Entry), job.date_from, job.date_to)
+                )).scalar()
+                sections = report_sections(
+                    (await conn.execute(in_range(raw_monthly_query(), job.date_from, job.date_to))).all(),
+                    (await conn.execute(in_range(raw_project_query(), job.date_from, job.date_to))).all(),
+                    dict((await conn.execute(select(Category.id, Category.name))).all()),
+                    dict((await conn.execute(select(Project.id, Project.name))).all()),
+                )
+                entries = in_range(export_query(), job.date_from, job.date_to).order_by(Entry.date, Entry.id)
+                result = await conn.stream(entries.execution_options(yield_per=STREAM_BATCH_SIZE))
+
+                with open(partial, "wb") as f:
+                    if job.format == "csv":
+                        head, separator, tail = sections_csv(job, sections).encode(), b"", b""
+                    else:
+                        # The entries are streamed into the trailing empty list
+                        head = orjson.dumps({
+                            "date_from": job.date_from, "date_to": job.date_to, **as_floats(sections), "entries": [],
+                        })[:-2]
+                        separator, tail = b",", b"]}"
+                    await asyncio.to_thread(f.write, head)
+                    written, reported = 0, time.monotonic()
+                    async for partition in result.partitions():
+                        if job.format == "csv":
+                            chunk = csv_rows(export_csv_row(row) for row in partition).encode()
+                        else:
+                            chunk = separator.join(orjson.dumps(export_record(row)) for row in partition)
+                            if written:
+                                chunk = separator + chunk
+                        await asyncio.to_thread(f.write, chunk)
+                        written += len(partition)
+                        if time.monotonic() - reported >= PROGRESS_INTERVAL:
+                            reported = time.monotonic()
+                            if not await self.report(job, progress=min(written / total, 0.99)):
+                                raise JobLost()
+                    await asyncio.to_thread(f.write, tail)
+
+    async def expire(self) -> int:
+        """Delete artifacts past the retention period; returns how many."""
+        cutoff = func.now() - timedelta(hours=settings.REPORT_RETENTION_HOURS)
+        async with self.bind.begin() as conn:
+            expired = (await conn.execute(
+                select(ReportJob.id, ReportJob.file_path)
+                .where(ReportJob.status == ReportStatus.DONE, ReportJob.finished_at < cutoff)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if expired:
+                await conn.execute(update(ReportJob).where(ReportJob.id.in_([i for i, _ in expired]))
+                                   .values(status=ReportStatus.EXPIRED, file_path=None))
+        for _, file_path in expired:
+            await asyncio.to_thread(Path(file_path).unlink, missing_ok=True)
+        return len(expired)
+
+
+runner = ReportRunner()
@@ -0,0 +1,203 @@
+"""Monthly rollups of entry amounts, maintained incrementally on every write.
+
+``monthly_rollups`` holds totals per (month, entry_type, category_id) and
+``project_monthly_rollups`` per (month, entry_type, project_id). Writers
+collect their changes in a ``RollupDelta`` and apply it in the same
+transaction as the entry change; ``rebuild`` and ``check`` recompute the
+tables from raw entries.
+
+Usage: python -m app.rollups rebuild|check
+"""
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+from sqlalchemy import Integer, select, delete, func, literal, text, union_all, any_
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from .changefeed import record_change
+from .database import async_session
+from .models.entry import Entry, EntryType, entry_projects
+from .models.rollup import MonthlyRollup, ProjectMonthlyRollup, monthly_rollup_key
+
+CENT = Decimal("0.01")
+
+
+def to_amount(value) -> Decimal:
+    """Round like Numeric(12, 2) does, so deltas match what gets stored."""
+    return Decimal(str(value)).quantize(CENT, ROUND_HALF_UP)
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def next_month(d: date) -> date:
+    return (d.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def whole_months(date_from: Optional[date], date_to: Optional[date]) -> Optional[tuple[Optional[date], Optional[date]]]:
+    """The first and last month lying completely inside the range.
+
+    ``None`` bounds stay open; returns ``None`` if no whole month fits.
+    """
+    first = last = None
+    if date_from is not None:
+        first = date_from if date_from.day == 1 else next_month(date_from)
+    if date_to is not None:
+        last = month_start(month_start(date_to + timedelta(days=1)) - timedelta(days=1))
+    if first and last and first > last:
+        return None
+    return first, last
+
+
+class RollupDelta:
+    """Signed changes to the rollup rows, applied with one upsert per table."""
+
+    def __init__(self):
+        self.monthly = defaultdict(lambda: [Decimal(0), 0])
+        self.projects = defaultdict(lambda: [Decimal(0), 0])
+
+    def add(self, entry_date: date, amount, entry_type: EntryType, category_id: Optional[int],
+            project_ids=(), sign: int = 1):
+        amount = to_amount(amount) * sign
+        month = month_start(entry_date)
+        row = self.monthly[(month, EntryType(entry_type), category_id)]
+        row[0] += amount
+        row[1] += sign
+        for project_id in project_ids:
+            row = self.projects[(month, EntryType(entry_type), project_id)]
+            row[0] += amount
+            row[1] += sign
+
+    async def add_stored(self, db: AsyncSession, ids: list[int], sign: int = 1):
+        """Add the entries ``ids`` as currently stored, aggregated in SQL instead of loaded."""
+        selected = Entry.id == any_(literal(ids, ARRAY(Integer)))
+        for month, entry_type, category_id, amount, count in (await db.execute(raw_monthly_query().where(selected))).all():
+            row = self.monthly[(month, entry_type, category_id)]
+            row[0] += amount * sign
+            row[1] += count * sign
+        for month, entry_type, project_id, amount, count in (await db.execute(raw_project_query().where(selected))).all():
+            row = self.projects[(month, entry_type, project_id)]
+            row[0] += amount * sign
+            row[1] += count * sign
+
+    async def apply(self, db: AsyncSession):
+        # Sorted keys give concurrent writers the same row lock order
+        monthly = [
+            {"month": m, "entry_type": t, "category_id": c, "amount": a, "entry_count": n}
+            for (m, t, c), (a, n) in sorted(self.monthly.items(), key=lambda kv: (kv[0][0], kv[0][1].name, kv[0][2] or 0))
+            if a or n
+        ]
+        projects = [
+            {"month": m, "entry_type": t, "project_id": p, "amount": a, "entry_count": n}
+            for (m, t, p), (a, n) in sorted(self.projects.items(), key=lambda kv: (kv[0][0], kv[0][1].name, kv[0][2]))
+            if a or n
+        ]
+        if monthly:
+            stmt = insert(MonthlyRollup).values(monthly)
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=list(monthly_rollup_key),
+                set_={
+                    "amount": MonthlyRollup.amount + stmt.excluded.amount,
+                    "entry_count": MonthlyRollup.entry_count + stmt.excluded.entry_count,
+                },
+            ))
+        if projects:
+            stmt = insert(ProjectMonthlyRollup).values(projects)
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=[ProjectMonthlyRollup.month, ProjectMonthlyRollup.entry_type, ProjectMonthlyRollup.project_id],
+                set_={
+                    "amount": ProjectMonthlyRollup.amount + stmt.excluded.amount,
+                    "entry_count": ProjectMonthlyRollup.entry_count + stmt.excluded.entry_count,
+                },
+            ))
+        self.monthly.clear()
+        self.projects.clear()
+
+
+def raw_monthly_query():
+    month = func.date_trunc("month", Entry.date).cast(Entry.date.type).label("month")
+    return (
+        select(month, Entry.entry_type, Entry.category_id, func.sum(Entry.amount).label("amount"),
+               func.count().label("entry_count"))
+        .group_by(month, Entry.entry_type, Entry.category_id)
+    )
+
+
+def raw_project_query():
+    month = func.date_trunc("month", Entry.date).cast(Entry.date.type).label("month")
+    return (
+        select(month, Entry.entry_type, entry_projects.c.project_id, func.sum(Entry.amount).label("amount"),
+               func.count().label("entry_count"))
+        .join(entry_projects, entry_projects.c.entry_id == Entry.id)
+        .group_by(month, Entry.entry_type, entry_projects.c.project_id)
+    )
+
+
+async def rebuild(db: AsyncSession):
+    """Recompute both rollup tables from raw entries; the caller commits."""
+    # Writers would otherwise slip deltas in between the delete and the insert
+    await db.execute(text("LOCK TABLE entries, entry_projects IN SHARE MODE"))
+    await db.execute(delete(MonthlyRollup))
+    await db.execute(delete(ProjectMonthlyRollup))
+    q = raw_monthly_query()
+    await db.execute(insert(MonthlyRollup).from_select(
+        ["month", "entry_type", "category_id", "amount", "entry_count"], q))
+    q = raw_project_query()
+    await db.execute(insert(ProjectMonthlyRollup).from_select(
+        ["month", "entry_type", "project_id", "amount", "entry_count"], q))
+    # The totals may have moved under every client; they start over
+    await record_change(db, "reset")
+
+
+async def check(db: AsyncSession) -> list[dict]:
+    """Rollup rows that disagree with the raw entries; empty when consistent."""
+    mismatches = []
+    for model, key, raw in [
+        (MonthlyRollup, "category_id", raw_monthly_query()),
+        (ProjectMonthlyRollup, "project_id", raw_project_query()),
+    ]:
+        stored = select(model.month, model.entry_type, getattr(model, key), model.amount, model.entry_count)
+        combined = union_all(
+            stored.add_columns(literal(1).label("side")),
+            raw.add_columns(literal(-1).label("side")),
+        ).subquery()
+        diff = (
+            select(
+                combined.c.month, combined.c.entry_type, combined.c[key],
+                func.sum(combined.c.amount * combined.c.side).label("amount"),
+                func.sum(combined.c.entry_count * combined.c.side).label("entry_count"),
+            )
+            .group_by(combined.c.month, combined.c.entry_type, combined.c[key])
+            .having((func.sum(combined.c.amount * combined.c.side) != 0)
+                    | (func.sum(combined.c.entry_count * combined.c.side) != 0))
+        )
+        for month, entry_type, key_value, amount, count in (await db.execute(diff)).all():
+            mismatches.append({
+                "table": model.__tablename__, "month": month, "entry_type": entry_type.value, key: key_value,
+                "amount_diff": amount, "count_diff": count,
+            })
+    return mismatches
+
+
+async def main(command: str) -> int:
+    async with async_session() as session:
+        if command == "rebuild":
+            await rebuild(session)
+            await session.commit()
+            print("Rollups rebuilt.")
+            return 0
+        mismatches = await check(session)
+        for m in mismatches:
+            print(m)
+        print(f"{len(mismatches)} mismatching rollup rows.")
+        return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("rebuild", "check"):
+        sys.exit("usage: python -m app.rollups rebuild|check")
+    sys.exit(asyncio.run(main(sys.argv[1])))
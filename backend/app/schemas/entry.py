@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, AliasChoices, field_validator, model_validator
+import datetime
 from datetime import date
-from typing import Optional
+from decimal import Decimal
+from typing import Annotated, Optional
 from ..models.entry import EntryType
 
 
@@ -31,7 +33,8 @@ class EntryCreate(BaseModel):
 
 
 class EntryUpdate(BaseModel):
-    date: Optional[date] = None
+    # Spelled out: inside the class body "date" is this field's None default
+    date: Optional[datetime.date] = None
     description: Optional[str] = None
     amount: Optional[float] = None
     entry_type: Optional[EntryType] = None
@@ -39,6 +42,14 @@ class EntryUpdate(BaseModel):
     project_ids: Optional[list[int]] = None
     notes: Optional[str] = None
 
+    @field_validator("date", "description", "amount", "entry_type")
+    @classmethod
+    def not_null(cls, v):
+        # Runs only for values sent; these columns may be left out but not cleared
+        if v is None:
+            raise ValueError("may be omitted but not null")
+        return v
+
 
 class EntryOut(BaseModel):
     id: int
@@ -51,3 +62,105 @@ class EntryOut(BaseModel):
     projects: list[ProjectOut] = []
     notes: Optional[str] = None
     model_config = {"from_attributes": True}
+
+
+class EntryFilter(BaseModel):
+    """The filters of ``GET /api/entries``, for batch operations."""
+    category_id: Optional[int] = None
+    project_id: Optional[int] = None
+    entry_type: Optional[EntryType] = None
+    date_from: Optional[datetime.date] = None
+    date_to: Optional[datetime.date] = None
+    q: Optional[str] = None
+
+
+class EntrySelection(BaseModel):
+    """Entries to change: an explicit id list or a non-empty filter, not both."""
+    ids: Optional[list[int]] = None
+    filter: Optional[EntryFilter] = None
+
+    @model_validator(mode="after")
+    def ids_or_filter(self):
+        has_filter = self.filter is not None and bool(self.filter.model_dump(exclude_none=True))
+        if (self.ids is not None) == has_filter:
+            raise ValueError("give either ids or a non-empty filter")
+        return self
+
+
+class EntryBatchUpdate(EntrySelection):
+    changes: EntryUpdate
+
+    @field_validator("changes")
+    @classmethod
+    def not_empty(cls, v):
+        if not v.model_fields_set:
+            raise ValueError("no fields to change")
+        return v
+
+
+class BatchResult(BaseModel):
+    affected: int
+
+
+class EntryImportRow(BaseModel):
+    """One line of a bulk import; categories and projects are given by name.
+
+    An existing category can also be picked by id through ``category_id``;
+    ``category`` is always a name, even when it is all digits.
+    """
+    date: date
+    description: str = Field(min_length=1, max_length=500)
+    amount: Decimal = Field(max_digits=12, decimal_places=2)
+    entry_type: EntryType = Field(validation_alias=AliasChoices("entry_type", "type"))
+    # Names as long as the name columns allow, so an import reports the line instead of failing
+    category: Optional[str] = Field(None, max_length=100)
+    category_id: Optional[int] = None
+    projects: list[Annotated[str, Field(max_length=100)]] = []
+    notes: Optional[str] = None
+
+    @field_validator("category", mode="before")
+    @classmethod
+    def category_as_str(cls, v):
+        if v is None or v == "":
+            return None
+        return str(v).strip()
+
+    @field_validator("category_id", mode="before")
+    @classmethod
+    def empty_category_id(cls, v):
+        # An empty CSV cell means no id
+        return None if v == "" else v
+
+    @model_validator(mode="after")
+    def one_category(self):
+        if self.category is not None and self.category_id is not None:
+            raise ValueError("give category or category_id, not both")
+        return self
+
+    @field_validator("projects", mode="before")
+    @classmethod
+    def split_projects(cls, v):
+        # CSV cells carry several project names separated by ";"
+        if v is None:
+            return []
+        if isinstance(v, str):
+            v = v.split(";")
+        return list(dict.fromkeys(p.strip() for p in v if p and p.strip()))
+
+    @field_validator("notes", mode="before")
+    @classmethod
+    def empty_notes(cls, v):
+        return v or None
+
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    error_count: int
+    errors: list[ImportLineError]
+    seconds: float
+    rows_per_second: float
@@ -0,0 +1,33 @@
+from pydantic import BaseModel, model_validator
+from datetime import date, datetime
+from typing import Literal, Optional
+from ..models.report import ReportStatus
+
+
+class ReportCreate(BaseModel):
+    date_from: date
+    date_to: date
+    format: Literal["csv", "json"] = "csv"
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.date_from > self.date_to:
+            raise ValueError("date_from is after date_to")
+        return self
+
+
+class ReportOut(BaseModel):
+    id: int
+    status: ReportStatus
+    format: str
+    date_from: date
+    date_to: date
+    progress: float
+    attempts: int
+    error: Optional[str] = None
+    file_size: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None
+    model_config = {"from_attributes": True}
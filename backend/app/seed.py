@@ -1,9 +1,25 @@
-"""Seed database with realistic Austrian bookkeeping sample data."""
+"""Seed database with realistic Austrian bookkeeping sample data.
+
+Usage:
+    python -m app.seed [--batch-size 1000]              # the hand-written sample rows
+    python -m app.seed --generate --years 3 --per-day 20 [--seed 42]
+        [--category-weights "Software=5,Miete=1"] [--project-weights "SaaS=1"]
+"""
+import argparse
 import asyncio
-from datetime import date
+import math
+import random
+import time
+from datetime import date, timedelta
+from typing import Iterator, Optional
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from .changefeed import record_change
 from .database import engine, async_session, Base
+from .importer import BulkImporter
+from .partitions import ensure_partitions
 from .models.entry import Category, Project, Entry, EntryType, entry_projects
+from .rollups import RollupDelta, to_amount
 
 CATEGORIES = [
     "Büro", "Reise", "Marketing", "Software", "Personal",
@@ -78,52 +94,212 @@ SEED_ENTRIES = [
 ]
 
 
-async def seed():
-    async with engine.begin() as conn:
+async def upsert_names(session, model, names: list[str]) -> dict[str, int]:
+    """Insert missing names in one statement and map every name to its id."""
+    await session.execute(
+        insert(model).values([{"name": n} for n in names]).on_conflict_do_nothing(index_elements=["name"])
+    )
+    return dict((await session.execute(select(model.name, model.id).where(model.name.in_(names)))).all())
+
+
+async def seed(session_factory=async_session, bind=engine, batch_size: int = 1000) -> int:
+    """Load the sample rows; safe to re-run, returns the number of new entries.
+
+    Categories and projects are upserted by name. An entry counts as already
+    present when one with the same date, description, amount and type exists.
+    """
+    async with bind.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await ensure_partitions(bind, min(e[0] for e in SEED_ENTRIES).year, max(e[0] for e in SEED_ENTRIES).year)
 
-    async with async_session() as session:
-        # Check if already seeded
-        existing = (await session.execute(select(Entry))).scalars().first()
-        if existing:
-            print("Database already seeded, skipping.")
-            return
-
-        # Categories
-        cat_map = {}
-        for name in CATEGORIES:
-            cat = Category(name=name)
-            session.add(cat)
-            await session.flush()
-            cat_map[name] = cat.id
-
-        # Projects
-        proj_map = {}
-        for name in PROJECTS:
-            proj = Project(name=name)
-            session.add(proj)
-            await session.flush()
-            proj_map[name] = proj.id
-
-        # Entries
-        for row in SEED_ENTRIES:
-            d, desc, amount, etype, cat_name, proj_name, notes = row
-            entry = Entry(
-                date=d,
-                description=desc,
-                amount=amount,
-                entry_type=EntryType(etype),
-                category_id=cat_map.get(cat_name),
-                notes=notes,
+    async with session_factory() as session:
+        cat_map = await upsert_names(session, Category, CATEGORIES)
+        proj_map = await upsert_names(session, Project, PROJECTS)
+
+        rows = [
+            (dict(date=d, description=desc, amount=to_amount(amount), entry_type=EntryType(etype),
+                  category_id=cat_map.get(cat_name), notes=notes), proj_name)
+            for d, desc, amount, etype, cat_name, proj_name, notes in SEED_ENTRIES
+        ]
+        existing = set((await session.execute(
+            select(Entry.date, Entry.description, Entry.amount, Entry.entry_type).where(
+                Entry.date.between(min(r["date"] for r, _ in rows), max(r["date"] for r, _ in rows))
             )
-            if proj_name and proj_name in proj_map:
-                proj = await session.get(Project, proj_map[proj_name])
-                entry.projects = [proj]
-            session.add(entry)
+        )).all())
+        rows = [(r, p) for r, p in rows
+                if (r["date"], r["description"], r["amount"], r["entry_type"]) not in existing]
+
+        delta = RollupDelta()
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            ids = (await session.execute(
+                insert(Entry).returning(Entry.id, sort_by_parameter_order=True), [r for r, _ in batch]
+            )).scalars().all()
+            links = [{"entry_id": i, "entry_date": r["date"], "project_id": proj_map[p]}
+                     for i, (r, p) in zip(ids, batch) if p]
+            if links:
+                await session.execute(insert(entry_projects), links)
+            for r, p in batch:
+                delta.add(r["date"], r["amount"], r["entry_type"], r["category_id"], [proj_map[p]] if p else [])
+        await delta.apply(session)
+        if rows:
+            await record_change(session, "imported")
 
         await session.commit()
-        print(f"Seeded {len(SEED_ENTRIES)} entries, {len(CATEGORIES)} categories, {len(PROJECTS)} projects.")
+        print(f"Seeded {len(rows)} new entries, {len(CATEGORIES)} categories, {len(PROJECTS)} projects.")
+        return len(rows)
+
+
+# Relative frequency of expense categories in generated data
+CATEGORY_WEIGHTS = {
+    "Büro": 8, "Reise": 6, "Marketing": 5, "Software": 12, "Personal": 2,
+    "Recht & Beratung": 3, "Versicherung": 2, "Telekommunikation": 3,
+    "Miete": 2, "Sonstiges": 4,
+}
+PROJECT_WEIGHTS = {"DeFi": 3, "Könyvelés": 1, "Consulting": 4, "SaaS": 4}
+
+INCOME_DESCRIPTIONS = ["Consulting Leistung", "SaaS Subscription Revenue", "DeFi Audit", "Workshop", "Retainer"]
+EXPENSE_DESCRIPTIONS = {
+    "Büro": ["Büromaterial", "Druckerpatronen", "Bürostuhl"],
+    "Reise": ["Zugticket", "Hotel", "Flug", "Taxi"],
+    "Marketing": ["Google Ads", "LinkedIn Ads", "Messestand"],
+    "Software": ["Hetzner Server", "GitHub", "AWS", "Figma"],
+    "Personal": ["Freelancer", "Aushilfe"],
+    "Recht & Beratung": ["Steuerberater", "Rechtsanwalt"],
+    "Versicherung": ["SVS Beitrag", "Haftpflicht"],
+    "Telekommunikation": ["A1 Mobilfunk", "Internet"],
+    "Miete": ["Büromiete", "Coworking"],
+    "Sonstiges": ["Parkgebühr", "Bankspesen"],
+}
+
+
+GENERATE_START = date(2020, 1, 1)
+
+
+def add_years(d: date, years: int) -> date:
+    """The same day ``years`` later; Feb 29 falls back to Feb 28 outside leap years."""
+    try:
+        return d.replace(year=d.year + years)
+    except ValueError:
+        return d.replace(year=d.year + years, day=28)
+
+
+def generate_entries(
+    years: int = 1,
+    per_day: float = 10,
+    start: date = GENERATE_START,
+    seed: int = 42,
+    income_share: float = 0.15,
+    project_share: float = 0.5,
+    multi_project_share: float = 0.1,
+    category_weights: Optional[dict[str, float]] = None,
+    project_weights: Optional[dict[str, float]] = None,
+) -> Iterator[dict]:
+    """Deterministic synthetic bookings in the bulk import record format.
+
+    ``per_day`` may be fractional; the same arguments always yield the same
+    rows. ``project_share`` of entries get a project, and of those
+    ``multi_project_share`` get a second one.
+    """
+    rng = random.Random(seed)
+    category_weights = category_weights or CATEGORY_WEIGHTS
+    project_weights = project_weights or PROJECT_WEIGHTS
+    categories, cat_w = list(category_weights), list(category_weights.values())
+    projects, proj_w = list(project_weights), list(project_weights.values())
+
+    days = (add_years(start, years) - start).days
+    produced = 0
+    for day in range(days):
+        d = start + timedelta(days=day)
+        target = math.floor((day + 1) * per_day)
+        for _ in range(target - produced):
+            produced += 1
+            if rng.random() < income_share:
+                entry_type, category = "Einnahme", None
+                description = rng.choice(INCOME_DESCRIPTIONS)
+                amount = round(rng.lognormvariate(7.5, 0.8), 2)
+            else:
+                entry_type = "Ausgabe"
+                category = rng.choices(categories, cat_w)[0]
+                description = rng.choice(EXPENSE_DESCRIPTIONS.get(category, ["Ausgabe"]))
+                amount = round(rng.lognormvariate(4.5, 1.1), 2)
+            linked = []
+            if rng.random() < project_share:
+                linked = rng.choices(projects, proj_w)
+                if rng.random() < multi_project_share:
+                    linked = list(dict.fromkeys(linked + rng.choices(projects, proj_w)))
+            yield {
+                "date": d,
+                "description": f"{description} #{produced}",
+                "amount": amount,
+                "entry_type": entry_type,
+                "category": category,
+                "projects": linked,
+                "notes": None,
+            }
+
+
+async def seed_generated(session_factory=async_session, bind=engine, batch_size: int = 5000, **options) -> int:
+    """Load generated entries through the COPY importer; returns the row count."""
+    async with bind.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    first_year = options.get("start", GENERATE_START).year
+    await ensure_partitions(bind, first_year, first_year + options.get("years", 1))
+
+    async with session_factory() as session:
+        importer = BulkImporter(session, batch_size)
+        for i, record in enumerate(generate_entries(**options), 1):
+            await importer.add(i, record)
+        await importer.flush()
+        if importer.error_count:
+            raise RuntimeError(f"Generated rows failed validation: {importer.errors[:5]}")
+        # Dashboards and analytics snapshots load everything again
+        await record_change(session, "imported")
+        await session.commit()
+        return importer.inserted
+
+
+def weights(text: str) -> dict[str, float]:
+    """``name=weight,...`` from the command line."""
+    result = {}
+    for part in text.split(","):
+        name, sep, weight = part.rpartition("=")
+        try:
+            result[name.strip()] = float(weight)
+        except ValueError:
+            sep = ""
+        if not sep or not name.strip():
+            raise argparse.ArgumentTypeError(f"expected name=weight, got {part!r}")
+    return result
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generate", action="store_true", help="load synthetic data instead of the sample rows")
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--per-day", type=float, default=10)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2020, 1, 1))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--income-share", type=float, default=0.15)
+    parser.add_argument("--project-share", type=float, default=0.5)
+    parser.add_argument("--multi-project-share", type=float, default=0.1)
+    parser.add_argument("--category-weights", type=weights, help="expense categories as name=weight,...")
+    parser.add_argument("--project-weights", type=weights, help="projects as name=weight,...")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per INSERT/COPY batch")
+    args = parser.parse_args(argv)
+
+    if not args.generate:
+        asyncio.run(seed(batch_size=args.batch_size))
+        return
+    started = time.perf_counter()
+    n = asyncio.run(seed_generated(
+        years=args.years, per_day=args.per_day, start=args.start, seed=args.seed,
+        income_share=args.income_share, project_share=args.project_share,
+        multi_project_share=args.multi_project_share, category_weights=args.category_weights,
+        project_weights=args.project_weights, batch_size=args.batch_size,
+    ))
+    print(f"Generated {n} entries in {time.perf_counter() - started:.1f}s.")
 
 
 if __name__ == "__main__":
-    asyncio.run(seed())
+    main()
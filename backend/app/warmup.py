@@ -0,0 +1,118 @@
+"""Startup warmup, so the first requests after a restart are not the slow ones.
+
+A fresh process pays on its first requests for opening connections,
+asyncpg's introspection of the enum types on each connection, SQLAlchemy
+compiling every statement, and each new Postgres backend loading the
+catalog of the partitioned tables. ``Warmup`` opens ``WARMUP_CONNECTIONS``
+pool connections at once and runs the hot read queries on every one of
+them, which pays all of that up front, then builds the category and
+project snapshots. The readiness probe reports "not ready" until it is done.
+"""
+import asyncio
+import logging
+import time
+from datetime import date
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from .api.categories import load_categories
+from .api.entries import (
+    ENTRY_LOADERS, LIST_TABLES, SUMMARY_TABLES, fast_list_base, list_query, rollup_summary_queries, summary_queries,
+)
+from .api.projects import load_projects
+from .rollups import month_start
+from .watermarks import snapshot, table_versions
+
+log = logging.getLogger(__name__)
+
+RETRY_SECONDS = 5
+
+
+def hot_queries(today: date) -> list:
+    """The reads behind the dashboard's page load, shaped as the endpoints build them.
+
+    Filters use today's date, so the statements are the real ones while
+    reading next to nothing.
+    """
+    first = month_start(today)
+    return [
+        list_query(date_from=today, date_to=today).options(*ENTRY_LOADERS),
+        list_query(date_from=today, date_to=today).options(*ENTRY_LOADERS).limit(1),
+        list_query(date_from=today, date_to=today, base=fast_list_base()),
+        *rollup_summary_queries(),
+        *rollup_summary_queries(first, first),
+        *summary_queries(today, today),
+    ]
+
+
+async def warm_connection(conn: AsyncConnection, today: date):
+    async with AsyncSession(bind=conn) as db:
+        for tables in (LIST_TABLES, SUMMARY_TABLES, ("categories",), ("projects",)):
+            await table_versions(db, *tables)
+        for stmt in hot_queries(today):
+            (await db.execute(stmt)).all()
+        await db.rollback()
+
+
+async def load_snapshots(bind: AsyncEngine):
+    async with AsyncSession(bind) as db:
+        versions = await table_versions(db, "categories", "projects")
+        await snapshot("categories", versions.get("categories", 0), lambda: load_categories(db))
+        await snapshot("projects", versions.get("projects", 0), lambda: load_projects(db))
+
+
+class Warmup:
+    """Runs the warmup once per process and remembers how it went."""
+
+    def __init__(self):
+        self.engines: tuple[AsyncEngine, ...] = ()
+        self.done = False
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def status(self) -> dict:
+        return {"done": self.done, "seconds": self.seconds, "error": self.error}
+
+    async def warm(self, bind: AsyncEngine, connections: int):
+        # Connections beyond pool_size would be closed again on return
+        connections = min(connections, bind.pool.size())
+        conns = await asyncio.gather(*(bind.connect() for _ in range(connections)))
+        try:
+            today = date.today()
+            await asyncio.gather(*(warm_connection(conn, today) for conn in conns))
+        finally:
+            await asyncio.gather(*(conn.close() for conn in conns))
+
+    async def run(self, *engines: AsyncEngine, connections: int):
+        """Warm every engine, retrying until the database can be reached."""
+        self.engines = engines
+        if connections <= 0:
+            self.done = True
+            return
+        started = time.perf_counter()
+        while True:
+            try:
+                for bind in dict.fromkeys(engines):
+                    await self.warm(bind, connections)
+                await load_snapshots(engines[0])
+                break
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                log.warning("Warmup failed, retrying in %ss: %s", RETRY_SECONDS, self.error)
+                await asyncio.sleep(RETRY_SECONDS)
+        self.seconds = round(time.perf_counter() - started, 3)
+        self.error = None
+        self.done = True
+        log.info("Warmed up %d connections in %.3fs", connections, self.seconds)
+
+    def start(self, *engines: AsyncEngine, connections: int):
+        self.task = asyncio.create_task(self.run(*engines, connections=connections))
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+
+warmup = Warmup()
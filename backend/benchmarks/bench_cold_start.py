@@ -0,0 +1,101 @@
+"""Cold-start benchmark: latency of the first requests after a restart.
+
+Starts the API under uvicorn against the benchmark database, waits until
+it reports ready, fires one burst of dashboard page loads at it and stops
+it again; repeated for every restart and each WARMUP_CONNECTIONS value.
+A second burst on the same process gives the steady-state latency.
+Without a warmup the process counts as ready once it is live, which is
+what a deployment without the readiness probe does.
+
+Usage (from backend/, the database must be filled by bench_endpoints):
+    python -m benchmarks.bench_cold_start --warmup 0 5 --restarts 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from httpx import AsyncClient
+
+from benchmarks.bench_endpoints import DEFAULT_DATABASE_URL, percentiles
+
+# What the dashboard requests on its first load, for a month filter and
+# with the entry list paged so that serializing it does not swamp the timings
+PAGE_LOAD = [
+    ("/api/entries", {"date_from": "2024-03-01", "date_to": "2024-03-31", "limit": 50}),
+    ("/api/entries/summary", {"date_from": "2024-03-01", "date_to": "2024-03-31"}),
+    ("/api/categories", {}),
+    ("/api/projects", {}),
+]
+
+
+async def wait_for(client: AsyncClient, path: str, timeout: float = 60) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if (await client.get(path)).status_code == 200:
+                return time.perf_counter() - started
+        except Exception:
+            pass
+        await asyncio.sleep(0.02)
+    raise TimeoutError(f"{path} did not answer within {timeout}s")
+
+
+async def cold_start(args, warmup: int, port: int) -> tuple[list[float], list[float], float]:
+    env = {
+        **os.environ, "DATABASE_URL": args.database_url, "WARMUP_CONNECTIONS": str(warmup),
+        # Nothing but the page loads should touch the database
+        "REPORT_WORKERS": "0", "CACHE_MAX_ENTRIES": "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        async with AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            ready = await wait_for(client, "/api/health/ready" if warmup else "/api/health/live")
+
+            async def call(path, params):
+                started = time.perf_counter()
+                r = await client.get(path, params=params)
+                r.raise_for_status()
+                return (time.perf_counter() - started) * 1000
+
+            bursts = [
+                await asyncio.gather(*(call(path, params) for _ in range(args.clients) for path, params in PAGE_LOAD))
+                for _ in range(2)
+            ]
+        return *bursts, ready
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def bench(args):
+    print(f"{'warmup':>8} {'ready_s':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'max_ms':>8} {'warm_p99':>9}")
+    for warmup in args.warmup:
+        first, second, ready = [], [], []
+        for _ in range(args.restarts):
+            cold, warm, seconds = await cold_start(args, warmup, args.port)
+            first += cold
+            second += warm
+            ready.append(seconds)
+        p = percentiles(first)
+        print(f"{warmup:>8} {statistics.median(ready):>8.2f} {p['p50_ms']:>8} {p['p95_ms']:>8} "
+              f"{p['p99_ms']:>8} {p['max_ms']:>8} {percentiles(second)['p99_ms']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--warmup", type=int, nargs="+", default=[0, 5], help="WARMUP_CONNECTIONS values")
+    parser.add_argument("--restarts", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=4, help="dashboards loading at once after each start")
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Load benchmark for the entry endpoints, driving the ASGI app in-process.
+
+Each dataset size is generated from scratch in a dedicated database, then
+every scenario is fired by concurrent httpx clients. Latency percentiles,
+throughput and SQL statements per request are printed and written as JSON.
+
+Usage (from backend/, the database must exist):
+    python -m benchmarks.bench_endpoints --sizes 10000 100000 1000000 --output bench.json
+    python -m benchmarks.bench_endpoints --sizes 10000 --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.analytics import analytics
+from app.cache import result_cache
+from app.config import settings
+from app.database import Base, get_db
+from app.main import app
+from app.replica import get_read_db
+from app.seed import seed_generated
+
+DEFAULT_DATABASE_URL = settings.DATABASE_URL.rsplit("/", 1)[0] + "/income_tracker_bench"
+START = date(2020, 1, 1)
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def random_month(rng: random.Random, years: int) -> tuple[date, date]:
+    first = date(START.year + rng.randrange(years), rng.randrange(1, 13), 1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return first, last
+
+
+def scenarios(years: int, max_id: int):
+    def list_month(rng):
+        first, last = random_month(rng, years)
+        return "GET", "/api/entries", {"params": {"date_from": first.isoformat(), "date_to": last.isoformat()}}
+
+    def list_month_fast(rng):
+        method, url, kwargs = list_month(rng)
+        return method, url, {"params": {**kwargs["params"], "fast": "true"}}
+
+    def list_year(rng):
+        year = START.year + rng.randrange(years)
+        return "GET", "/api/entries", {"params": {"date_from": f"{year}-01-01", "date_to": f"{year}-12-31"}}
+
+    def list_year_sparse(rng):
+        method, url, kwargs = list_year(rng)
+        return method, url, {"params": {**kwargs["params"], "fields": "id,date,amount,entry_type"}}
+
+    def list_page(rng):
+        return "GET", "/api/entries", {"params": {"limit": 100, "entry_type": rng.choice(["Einnahme", "Ausgabe"])}}
+
+    def summary_year(rng):
+        year = START.year + rng.randrange(years)
+        return "GET", "/api/entries/summary", {"params": {"date_from": f"{year}-01-01", "date_to": f"{year}-12-31"}}
+
+    def summary_all(rng):
+        return "GET", "/api/entries/summary", {}
+
+    def summary_range(rng):
+        # What the finance team slices: arbitrary ranges, mostly not whole months
+        first = START + timedelta(days=rng.randrange(365 * years - 30))
+        last = first + timedelta(days=rng.randrange(30, 365))
+        return "GET", "/api/entries/summary", {"params": {"date_from": first.isoformat(), "date_to": last.isoformat()}}
+
+    def timeseries_year(rng):
+        year = START.year + rng.randrange(years)
+        params = {"granularity": rng.choice(["day", "week"]), "date_from": f"{year}-01-01", "date_to": f"{year}-12-31"}
+        if rng.random() < 0.5:
+            params["group_by"] = "category"
+        return "GET", "/api/entries/timeseries", {"params": params}
+
+    def project_summary_year(rng):
+        year = START.year + rng.randrange(years)
+        return "GET", "/api/projects/summary", {"params": {
+            "allocation": rng.choice(["full", "split"]), "date_from": f"{year}-01-01", "date_to": f"{year}-12-31",
+        }}
+
+    def project_summary_range(rng):
+        method, url, kwargs = summary_range(rng)
+        return method, "/api/projects/summary", {"params": {**kwargs["params"], "allocation": rng.choice(["full", "split"])}}
+
+    def create(rng):
+        first, _ = random_month(rng, years)
+        return "POST", "/api/entries", {"json": {
+            "date": (first + timedelta(days=rng.randrange(28))).isoformat(),
+            "description": "Benchmark", "amount": round(rng.uniform(1, 500), 2),
+            "entry_type": "Ausgabe", "category_id": rng.randint(1, 10), "project_ids": [rng.randint(1, 4)],
+        }}
+
+    def update(rng):
+        first, _ = random_month(rng, years)
+        return "PUT", f"/api/entries/{rng.randint(1, max_id)}", {"json": {
+            "amount": round(rng.uniform(1, 500), 2), "date": (first + timedelta(days=rng.randrange(28))).isoformat(),
+        }}
+
+    return {
+        "list_entries_month": list_month,
+        "list_entries_month_fast": list_month_fast,
+        "list_entries_year": list_year,
+        "list_entries_year_sparse": list_year_sparse,
+        "list_entries_page": list_page,
+        "summary_year": summary_year,
+        "summary_all": summary_all,
+        "summary_range": summary_range,
+        "timeseries_year": timeseries_year,
+        "project_summary_year": project_summary_year,
+        "project_summary_range": project_summary_range,
+        "create_entry": create,
+        "update_entry": update,
+    }
+
+
+async def run_scenario(client: AsyncClient, build, requests: int, concurrency: int, seed: int):
+    rng = random.Random(seed)
+    calls = [build(rng) for _ in range(requests)]
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while calls:
+            method, url, kwargs = calls.pop()
+            started = time.perf_counter()
+            r = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if r.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentiles(latencies: list[float]) -> dict:
+    q = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(q[49], 2), "p95_ms": round(q[94], 2), "p99_ms": round(q[98], 2),
+        "mean_ms": round(statistics.fmean(latencies), 2), "max_ms": round(max(latencies), 2),
+    }
+
+
+async def bench(args) -> list[dict]:
+    engine = create_async_engine(args.database_url, pool_size=args.concurrency, max_overflow=0)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    if not args.cache:
+        result_cache.maxsize = 0
+    counter = QueryCounter(engine)
+    results = []
+    try:
+        for size in args.sizes:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+            days = (date(START.year + args.years, 1, 1) - START).days
+            started = time.perf_counter()
+            rows = await seed_generated(session_factory, engine, years=args.years, per_day=size / days, start=START)
+            print(f"# {rows} rows generated in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await conn.execute(text("VACUUM ANALYZE"))
+            if args.analytics:
+                analytics.enabled = True
+                await analytics.load(engine)
+                print(f"# analytics engine: {json.dumps(analytics.stats())}", file=sys.stderr)
+
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for i, (name, build) in enumerate(scenarios(args.years, rows).items()):
+                    if args.only and name not in args.only:
+                        continue
+                    result_cache.invalidate()
+                    counter.count = 0
+                    latencies, errors, wall = await run_scenario(
+                        client, build, args.requests, args.concurrency, seed=i)
+                    results.append({
+                        "size": size, "scenario": name, "requests": len(latencies), "errors": errors,
+                        "concurrency": args.concurrency, **percentiles(latencies),
+                        "throughput_rps": round(len(latencies) / wall, 1),
+                        "queries_per_request": round(counter.count / len(latencies), 2),
+                    })
+                    print_row(results[-1])
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+    return results
+
+
+COLUMNS = ["size", "scenario", "p50_ms", "p95_ms", "p99_ms", "throughput_rps", "queries_per_request", "errors"]
+
+
+def print_row(row: dict, previous: dict = None):
+    cells = [f"{row[c]:>10}" if c != "scenario" else f"{row[c]:<24}" for c in COLUMNS]
+    line = " ".join(cells)
+    if previous:
+        line += f"  p95 {row['p95_ms'] / previous['p95_ms'] - 1:+.0%} vs previous" if previous["p95_ms"] else ""
+    print(line)
+
+
+def compare(results: list[dict], path: str):
+    with open(path) as f:
+        previous = {(r["size"], r["scenario"]): r for r in json.load(f)["results"]}
+    print("\n# compared with " + path)
+    for row in results:
+        print_row(row, previous.get((row["size"], row["scenario"])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", nargs="+", help="run just these scenarios")
+    parser.add_argument("--cache", action="store_true", help="keep the result cache enabled")
+    parser.add_argument("--analytics", action="store_true", help="answer summaries from the analytics engine")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    print(" ".join(f"{c:>10}" if c != "scenario" else f"{c:<24}" for c in COLUMNS))
+    results = asyncio.run(bench(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+                       "results": results}, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import re
 from logging.config import fileConfig
 from sqlalchemy import engine_from_config, pool
 from alembic import context
@@ -13,9 +14,22 @@ if config.config_file_name is not None:
 
 target_metadata = Base.metadata
 
+# Yearly partitions of entries are created at runtime, see app.partitions
+PARTITION_NAME = re.compile(r"entries_(\d{4}|default)$")
+
+
+def include_name(name, type_, parent_names):
+    return not (type_ == "table" and PARTITION_NAME.match(name))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Postgres clones foreign keys to a partitioned table once per partition
+    return not (type_ == "foreign_key_constraint" and PARTITION_NAME.match(object.referred_table.name))
+
 
 def run_migrations_offline():
-    context.configure(url=config.get_main_option("sqlalchemy.url"), target_metadata=target_metadata, literal_binds=True)
+    context.configure(url=config.get_main_option("sqlalchemy.url"), target_metadata=target_metadata, literal_binds=True,
+                      include_name=include_name, include_object=include_object)
     with context.begin_transaction():
         context.run_migrations()
 
@@ -23,7 +37,7 @@ def run_migrations_offline():
 def run_migrations_online():
     connectable = engine_from_config(config.get_section(config.config_ini_section), prefix="sqlalchemy.", poolclass=pool.NullPool)
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(connection=connection, target_metadata=target_metadata, include_name=include_name, include_object=include_object)
         with context.begin_transaction():
             context.run_migrations()
 
@@ -0,0 +1,30 @@
+"""entry changes
+
+Revision ID: 2c8f6d4a9e17
+Revises: 9b7c3e5f1a48
+Create Date: 2026-10-18 20:41:12.518306
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '2c8f6d4a9e17'
+down_revision: Union[str, None] = '9b7c3e5f1a48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('entry_changes',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('op', sa.String(length=20), nullable=False),
+    sa.Column('entry_id', sa.Integer(), nullable=True),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('entry_changes')
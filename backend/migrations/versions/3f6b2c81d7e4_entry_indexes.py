@@ -0,0 +1,39 @@
+"""entry indexes
+
+Revision ID: 3f6b2c81d7e4
+Revises: abea4b45cc13
+Create Date: 2026-10-18 10:12:40.518203
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '3f6b2c81d7e4'
+down_revision: Union[str, None] = 'abea4b45cc13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Primary keys are already indexed; the ix_*_id indexes only cost writes
+    op.drop_index('ix_categories_id', table_name='categories')
+    op.drop_index('ix_projects_id', table_name='projects')
+    op.drop_index('ix_entries_id', table_name='entries')
+
+    op.create_index('ix_entries_date_id', 'entries', ['date', 'id'], unique=False,
+                    postgresql_include=['entry_type', 'category_id', 'amount'])
+    op.create_index('ix_entries_category_id_date_id', 'entries', ['category_id', 'date', 'id'], unique=False)
+    op.create_index('ix_entries_entry_type_date_id', 'entries', ['entry_type', 'date', 'id'], unique=False)
+    op.create_index('ix_entry_projects_project_id_entry_id', 'entry_projects', ['project_id', 'entry_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_entry_projects_project_id_entry_id', table_name='entry_projects')
+    op.drop_index('ix_entries_entry_type_date_id', table_name='entries')
+    op.drop_index('ix_entries_category_id_date_id', table_name='entries')
+    op.drop_index('ix_entries_date_id', table_name='entries')
+
+    op.create_index('ix_entries_id', 'entries', ['id'], unique=False)
+    op.create_index('ix_projects_id', 'projects', ['id'], unique=False)
+    op.create_index('ix_categories_id', 'categories', ['id'], unique=False)
@@ -0,0 +1,164 @@
+"""range-partition entries by booking year
+
+Revision ID: 5d1f0b7e9a32
+Revises: e8b35d2a71c4
+Create Date: 2026-10-18 16:42:09.311764
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = '5d1f0b7e9a32'
+down_revision: Union[str, None] = 'e8b35d2a71c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('german'::regconfig, coalesce(description, '')), 'A') || "
+    "setweight(to_tsvector('german'::regconfig, coalesce(notes, '')), 'B')"
+)
+
+ENTRY_COLUMNS = "id, date, description, amount, entry_type, category_id, notes"
+
+CREATE_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_entries_partition(year int) RETURNS boolean LANGUAGE plpgsql AS $$
+DECLARE
+    part text := 'entries_' || year;
+    lo date := make_date(year, 1, 1);
+    hi date := make_date(year + 1, 1, 1);
+    create_part text := 'CREATE TABLE ' || quote_ident(part) || ' PARTITION OF entries FOR VALUES FROM ('
+        || quote_literal(lo) || ') TO (' || quote_literal(hi) || ')';
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM entries_default WHERE date >= lo AND date < hi) THEN
+        EXECUTE create_part;
+        RETURN true;
+    END IF;
+    CREATE TEMP TABLE moved_entries AS
+        SELECT id, date, description, amount, entry_type, category_id, notes
+        FROM entries_default WHERE date >= lo AND date < hi;
+    CREATE TEMP TABLE moved_links AS
+        SELECT l.entry_id, l.entry_date, l.project_id
+        FROM entry_projects l JOIN moved_entries e ON e.id = l.entry_id AND e.date = l.entry_date;
+    DELETE FROM entries_default WHERE date >= lo AND date < hi;
+    EXECUTE create_part;
+    INSERT INTO entries (id, date, description, amount, entry_type, category_id, notes)
+        SELECT * FROM moved_entries;
+    INSERT INTO entry_projects (entry_id, entry_date, project_id) SELECT * FROM moved_links;
+    DROP TABLE moved_entries, moved_links;
+    RETURN true;
+END
+$$
+"""
+
+ENSURE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION ensure_entries_partitions(first_year int, last_year int) RETURNS int LANGUAGE plpgsql AS $$
+DECLARE
+    created int := 0;
+BEGIN
+    FOR y IN first_year..last_year LOOP
+        IF create_entries_partition(y) THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END
+$$
+"""
+
+
+def create_entry_indexes():
+    op.create_index('ix_entries_date_id', 'entries', ['date', 'id'], unique=False,
+                    postgresql_include=['entry_type', 'category_id', 'amount'])
+    op.create_index('ix_entries_category_id_date_id', 'entries', ['category_id', 'date', 'id'], unique=False)
+    op.create_index('ix_entries_entry_type_date_id', 'entries', ['entry_type', 'date', 'id'], unique=False)
+    op.create_index('ix_entries_search_vector', 'entries', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def drop_entry_indexes():
+    for name in ('ix_entries_date_id', 'ix_entries_category_id_date_id', 'ix_entries_entry_type_date_id',
+                 'ix_entries_search_vector'):
+        op.drop_index(name, table_name='entries')
+
+
+def entry_columns(*primary_key):
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('entries_id_seq'::regclass)"), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('description', sa.String(length=500), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('entry_type', postgresql.ENUM('EINNAHME', 'AUSGABE', name='entrytype', create_type=False), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR, persisted=True), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id']),
+        sa.PrimaryKeyConstraint(*primary_key),
+    ]
+
+
+def detach_entries(old_name):
+    """Rename the current entries table out of the way, keeping its rows and id sequence."""
+    op.execute("DROP TRIGGER entries_bump_version ON entries")
+    drop_entry_indexes()
+    op.rename_table('entries', old_name)
+    op.execute(f"ALTER INDEX entries_pkey RENAME TO {old_name}_pkey")
+    op.execute("ALTER SEQUENCE entries_id_seq OWNED BY NONE")
+
+
+def attach_entries(old_name):
+    op.execute("ALTER SEQUENCE entries_id_seq OWNED BY entries.id")
+    op.execute(f"INSERT INTO entries ({ENTRY_COLUMNS}) SELECT {ENTRY_COLUMNS} FROM {old_name}")
+
+
+def finish_entries():
+    create_entry_indexes()
+    op.execute("CREATE TRIGGER entries_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON entries "
+               "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()")
+
+
+def upgrade() -> None:
+    op.drop_constraint('entry_projects_entry_id_fkey', 'entry_projects', type_='foreignkey')
+    detach_entries('entries_unpartitioned')
+
+    op.create_table('entries', *entry_columns('id', 'date'), postgresql_partition_by='RANGE (date)')
+    op.execute("CREATE TABLE entries_default PARTITION OF entries DEFAULT")
+    op.execute(CREATE_PARTITION_FUNCTION)
+    op.execute(ENSURE_PARTITIONS_FUNCTION)
+    # Every year with bookings gets its partition, plus this and next year
+    op.execute("""
+        SELECT ensure_entries_partitions(
+            least(extract(year FROM min(date))::int, extract(year FROM current_date)::int),
+            greatest(extract(year FROM max(date))::int, extract(year FROM current_date)::int + 1))
+        FROM entries_unpartitioned
+    """)
+    attach_entries('entries_unpartitioned')
+
+    op.add_column('entry_projects', sa.Column('entry_date', sa.Date(), nullable=True))
+    op.execute("UPDATE entry_projects l SET entry_date = e.date FROM entries e WHERE e.id = l.entry_id")
+    op.alter_column('entry_projects', 'entry_date', nullable=False)
+    op.create_foreign_key('entry_projects_entry_id_entry_date_fkey', 'entry_projects', 'entries',
+                          ['entry_id', 'entry_date'], ['id', 'date'], ondelete='CASCADE', onupdate='CASCADE')
+
+    op.drop_table('entries_unpartitioned')
+    finish_entries()
+
+
+def downgrade() -> None:
+    op.drop_constraint('entry_projects_entry_id_entry_date_fkey', 'entry_projects', type_='foreignkey')
+    detach_entries('entries_partitioned')
+
+    op.create_table('entries', *entry_columns('id'))
+    attach_entries('entries_partitioned')
+
+    op.drop_column('entry_projects', 'entry_date')
+    op.create_foreign_key('entry_projects_entry_id_fkey', 'entry_projects', 'entries',
+                          ['entry_id'], ['id'], ondelete='CASCADE')
+
+    op.drop_table('entries_partitioned')
+    op.execute("DROP FUNCTION ensure_entries_partitions(int, int)")
+    op.execute("DROP FUNCTION create_entries_partition(int)")
+    finish_entries()
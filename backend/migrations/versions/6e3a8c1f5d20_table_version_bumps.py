@@ -0,0 +1,57 @@
+"""table versions as inserted bumps
+
+Revision ID: 6e3a8c1f5d20
+Revises: 2c8f6d4a9e17
+Create Date: 2026-10-18 23:12:40.271954
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '6e3a8c1f5d20'
+down_revision: Union[str, None] = '2c8f6d4a9e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The current versions stay as the first row of each table, so ETags keep growing
+    op.execute("ALTER TABLE table_versions DROP CONSTRAINT table_versions_pkey")
+    op.execute("ALTER TABLE table_versions ADD COLUMN id BIGSERIAL PRIMARY KEY")
+    op.alter_column('table_versions', 'version', server_default='1')
+    op.create_index(op.f('ix_table_versions_name'), 'table_versions', ['name'], unique=False)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            bump bigint;
+        BEGIN
+            INSERT INTO table_versions (name) VALUES (TG_TABLE_NAME) RETURNING id INTO bump;
+            IF mod(bump, 64) = 0 AND pg_try_advisory_xact_lock(1447383635) THEN
+                WITH folded AS (DELETE FROM table_versions WHERE id < bump RETURNING name, version)
+                INSERT INTO table_versions (name, version) SELECT name, sum(version) FROM folded GROUP BY name;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = TG_TABLE_NAME;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("LOCK TABLE table_versions")
+    op.execute("""
+        WITH folded AS (DELETE FROM table_versions RETURNING name, version)
+        INSERT INTO table_versions (name, version) SELECT name, sum(version) FROM folded GROUP BY name
+    """)
+    op.drop_index(op.f('ix_table_versions_name'), table_name='table_versions')
+    op.drop_column('table_versions', 'id')
+    op.alter_column('table_versions', 'version', server_default=None)
+    op.create_primary_key('table_versions_pkey', 'table_versions', ['name'])
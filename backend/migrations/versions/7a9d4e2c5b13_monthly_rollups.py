@@ -0,0 +1,59 @@
+"""monthly rollups
+
+Revision ID: 7a9d4e2c5b13
+Revises: 3f6b2c81d7e4
+Create Date: 2026-10-18 11:02:17.204311
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = '7a9d4e2c5b13'
+down_revision: Union[str, None] = '3f6b2c81d7e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+entrytype = postgresql.ENUM('EINNAHME', 'AUSGABE', name='entrytype', create_type=False)
+
+
+def upgrade() -> None:
+    op.create_table('monthly_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('entry_type', entrytype, nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('amount', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('entry_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_monthly_rollups_key', 'monthly_rollups',
+                    ['month', 'entry_type', sa.text('coalesce(category_id, 0)')], unique=True)
+    op.create_table('project_monthly_rollups',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('entry_type', entrytype, nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('entry_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('month', 'entry_type', 'project_id')
+    )
+
+    op.execute("""
+        INSERT INTO monthly_rollups (month, entry_type, category_id, amount, entry_count)
+        SELECT date_trunc('month', date)::date, entry_type, category_id, sum(amount), count(*)
+        FROM entries GROUP BY 1, 2, 3
+    """)
+    op.execute("""
+        INSERT INTO project_monthly_rollups (month, entry_type, project_id, amount, entry_count)
+        SELECT date_trunc('month', e.date)::date, e.entry_type, ep.project_id, sum(e.amount), count(*)
+        FROM entries e JOIN entry_projects ep ON ep.entry_id = e.id GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('project_monthly_rollups')
+    op.drop_index('uq_monthly_rollups_key', table_name='monthly_rollups')
+    op.drop_table('monthly_rollups')
@@ -0,0 +1,32 @@
+"""entry full-text search
+
+Revision ID: c4e1a9f07b26
+Revises: 7a9d4e2c5b13
+Create Date: 2026-10-18 14:21:43.518207
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = 'c4e1a9f07b26'
+down_revision: Union[str, None] = '7a9d4e2c5b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('german'::regconfig, coalesce(description, '')), 'A') || "
+    "setweight(to_tsvector('german'::regconfig, coalesce(notes, '')), 'B')"
+)
+
+
+def upgrade() -> None:
+    op.add_column('entries', sa.Column('search_vector', postgresql.TSVECTOR(),
+                                       sa.Computed(SEARCH_VECTOR, persisted=True), nullable=True))
+    op.create_index('ix_entries_search_vector', 'entries', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_entries_search_vector', table_name='entries', postgresql_using='gin')
+    op.drop_column('entries', 'search_vector')
@@ -0,0 +1,48 @@
+"""table versions for conditional GETs
+
+Revision ID: e8b35d2a71c4
+Revises: c4e1a9f07b26
+Create Date: 2026-10-18 15:07:12.846190
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'e8b35d2a71c4'
+down_revision: Union[str, None] = 'c4e1a9f07b26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+WATCHED_TABLES = ('categories', 'projects', 'entries', 'entry_projects')
+
+
+def upgrade() -> None:
+    op.create_table('table_versions',
+    sa.Column('name', sa.String(length=63), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = TG_TABLE_NAME;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        INSERT INTO table_versions (name, version)
+        SELECT name, (extract(epoch FROM clock_timestamp()) * 1000)::bigint
+        FROM unnest(ARRAY['categories', 'projects', 'entries', 'entry_projects']) AS name
+    """)
+    for table in WATCHED_TABLES:
+        op.execute(f"CREATE TRIGGER {table}_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+                   "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()")
+
+
+def downgrade() -> None:
+    for table in WATCHED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_bump_version ON {table}")
+    op.execute("DROP FUNCTION bump_table_version()")
+    op.drop_table('table_versions')
@@ -0,0 +1,128 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from app.analytics import AnalyticsEngine
+from app.cache import result_cache
+from app.main import app
+from app.rollups import rebuild
+
+pytest.importorskip("numpy")
+
+RANGES = [{}, {"date_from": "2024-02-10", "date_to": "2024-04-20"}, {"date_from": "2024-03-01"},
+          {"date_to": "2024-01-31"}, {"date_from": "2025-01-01"}]
+
+
+@pytest_asyncio.fixture
+async def engine(db_session, monkeypatch):
+    engine = AnalyticsEngine()
+    engine.enabled = True
+    monkeypatch.setattr("app.api.entries.analytics", engine)
+    monkeypatch.setattr("app.api.projects.analytics", engine)
+    # Both paths answer under the same ETag; the cache would hide one of them
+    monkeypatch.setattr(result_cache, "maxsize", 0)
+    return engine
+
+
+async def add_entries(c, rng, count):
+    for i in range(count):
+        await c.post("/api/entries", json={
+            "date": (date(2024, 1, 1) + timedelta(days=rng.randrange(150))).isoformat(),
+            "description": f"Entry {i}",
+            "amount": round(rng.uniform(0, 1000), 2),
+            "entry_type": rng.choice(["Einnahme", "Ausgabe"]),
+            "category_id": rng.choice([None, 1, 2]),
+            "project_ids": rng.choice([[], [1], [2], [1, 3], [1, 2, 3]]),
+        })
+
+
+async def assert_same_as_sql(c, engine):
+    for params in RANGES:
+        for url, extra in [("/api/entries/summary", [{}]),
+                           ("/api/projects/summary", [{"allocation": "full"}, {"allocation": "split"}]),
+                           ("/api/projects/1/summary", [{"allocation": "full"}, {"allocation": "split"}])]:
+            for more in extra:
+                engine.enabled = False
+                expected = (await c.get(url, params={**params, **more})).json()
+                engine.enabled = True
+                actual = (await c.get(url, params={**params, **more})).json()
+                assert_close(actual, expected)
+
+
+def assert_close(actual, expected):
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for k in expected:
+            assert_close(actual[k], expected[k])
+    elif isinstance(expected, list):
+        assert len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            assert_close(a, e)
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected)
+    else:
+        assert actual == expected
+
+
+@pytest.mark.asyncio
+async def test_engine_answers_like_sql(engine, db_session):
+    rng = random.Random(5)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        for name in ["SaaS", "Leerlauf"]:
+            await c.post("/api/projects", json={"name": name})
+        await add_entries(c, rng, 60)
+        await engine.load(db_session.bind)
+        assert engine.stats()["entries"] == 60
+        await assert_same_as_sql(c, engine)
+        assert (await c.get("/api/projects/99/summary")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_engine_follows_writes(engine, db_session):
+    rng = random.Random(9)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await c.post("/api/projects", json={"name": "SaaS"})
+        await engine.load(db_session.bind)
+        loaded = engine.entries
+
+        await add_entries(c, rng, 30)
+        entries = (await c.get("/api/entries")).json()
+        for e in entries[:10]:
+            await c.put(f"/api/entries/{e['id']}", json={
+                "amount": round(rng.uniform(0, 50), 2), "date": "2024-06-30", "category_id": 2, "project_ids": [2],
+            })
+        for e in entries[10:14]:
+            await c.delete(f"/api/entries/{e['id']}")
+        await c.patch("/api/entries", json={"ids": [e["id"] for e in entries[14:18]],
+                                            "changes": {"entry_type": "Einnahme", "project_ids": [1]}})
+        await c.request("DELETE", "/api/entries", json={"ids": [e["id"] for e in entries[18:20]]})
+        await assert_same_as_sql(c, engine)
+        # Applied from the change log, without reloading
+        assert engine.entries is loaded
+        stats = engine.stats()
+        assert stats["entries"] == 24 and stats["applied_change_id"] > 0
+        assert stats["bytes_per_million_entries"] > 0
+
+        # An import reloads the snapshot in the background; SQL answers meanwhile
+        await c.post("/api/entries/bulk", content="date,description,amount,entry_type,category,projects\n"
+                     "2024-02-02,Import,10.00,Einnahme,Büro,DeFi;SaaS\n", headers={"content-type": "text/csv"})
+        summary = (await c.get("/api/entries/summary")).json()
+        assert engine.stale and not engine.ready
+        engine.enabled = False
+        assert (await c.get("/api/entries/summary")).json() == summary
+        engine.enabled = True
+        await engine.task
+        assert engine.ready and engine.entries is not loaded
+        await assert_same_as_sql(c, engine)
+        assert engine.stats()["entries"] == 25
+
+        # So does a rollup rebuild, which skips the write endpoints
+        await rebuild(db_session)
+        await db_session.commit()
+        assert not await engine.sync(db_session)
+        await engine.task
+        assert await engine.sync(db_session)
@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.config import settings
+from app.main import app
+from app.rollups import check
+
+
+async def create_entries(c, n):
+    ids = []
+    for i in range(n):
+        r = await c.post("/api/entries", json={
+            "date": (date(2024, 1, 1) + timedelta(days=7 * i)).isoformat(),
+            "description": f"Miete {i}" if i % 2 else f"Kaffee {i}",
+            "amount": 10 + i,
+            "entry_type": "Ausgabe",
+            "category_id": 1,
+            "project_ids": [1] if i % 3 == 0 else [],
+        })
+        ids.append(r.json()["id"])
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_batch_update_by_ids_and_filter(db_session):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        ids = await create_entries(c, 12)
+        project = (await c.post("/api/projects", json={"name": "Umzug"})).json()
+
+        r = await c.patch("/api/entries", json={
+            "ids": ids[:4] + [999999], "changes": {"category_id": 2, "project_ids": [project["id"], 424242]},
+        })
+        assert r.json() == {"affected": 4}
+        entries = {e["id"]: e for e in (await c.get("/api/entries")).json()}
+        for i in ids[:4]:
+            assert entries[i]["category_id"] == 2
+            assert [p["name"] for p in entries[i]["projects"]] == ["Umzug"]
+        assert entries[ids[4]]["category_id"] == 1
+        assert await check(db_session) == []
+
+        # The list filters select the rows; changing date and amount moves rollups between months
+        r = await c.patch("/api/entries", json={
+            "filter": {"q": "miete", "date_from": "2024-02-01"},
+            "changes": {"amount": 0.125, "date": "2024-12-31", "entry_type": "Einnahme"},
+        })
+        expected = [i for n, i in enumerate(ids) if n % 2 and date(2024, 1, 1) + timedelta(days=7 * n) >= date(2024, 2, 1)]
+        assert r.json() == {"affected": len(expected)}
+        moved = (await c.get("/api/entries", params={"date_from": "2024-12-31"})).json()
+        assert sorted(e["id"] for e in moved) == expected
+        assert {e["amount"] for e in moved} == {0.13}
+        assert await check(db_session) == []
+
+
+@pytest.mark.asyncio
+async def test_batch_delete(db_session):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        ids = await create_entries(c, 9)
+        r = await c.request("DELETE", "/api/entries", json={"filter": {"project_id": 1}})
+        assert r.json() == {"affected": 3}
+        r = await c.request("DELETE", "/api/entries", json={"ids": ids[1:3]})
+        assert r.json() == {"affected": 2}
+        remaining = [e["id"] for e in (await c.get("/api/entries")).json()]
+        assert sorted(remaining) == [i for n, i in enumerate(ids) if n % 3 and n not in (1, 2)]
+        assert await check(db_session) == []
+
+        r = await c.request("DELETE", "/api/entries", json={"ids": []})
+        assert r.json() == {"affected": 0}
+
+
+@pytest.mark.asyncio
+async def test_batch_statements_do_not_grow_with_rows(monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG_QUERY_HEADERS", True)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        ids = await create_entries(c, 20)
+        counts = []
+        for selection in (ids[:2], ids[2:]):
+            r = await c.patch("/api/entries", json={"ids": selection, "changes": {"category_id": 2, "project_ids": [1]}})
+            counts.append(r.headers["X-Query-Count"])
+        assert counts[0] == counts[1]
+
+
+@pytest.mark.asyncio
+async def test_batch_selection_is_required():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        for body in [{"changes": {"notes": "x"}}, {"filter": {}, "changes": {"notes": "x"}},
+                     {"ids": [1], "filter": {"category_id": 1}, "changes": {"notes": "x"}},
+                     {"ids": [1], "changes": {}},
+                     # Required columns cannot be cleared, in batches either
+                     {"ids": [1], "changes": {"amount": None}}, {"ids": [1], "changes": {"date": None}},
+                     {"ids": [1], "changes": {"entry_type": None}}, {"ids": [1], "changes": {"description": None}}]:
+            assert (await c.patch("/api/entries", json=body)).status_code == 422
+        assert (await c.request("DELETE", "/api/entries", json={})).status_code == 422
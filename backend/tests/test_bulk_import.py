@@ -0,0 +1,127 @@
+import json
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+
+CSV = """date,description,amount,type,category,projects,notes,category_id
+2024-01-05,Webentwicklung,4500,Einnahme,,DeFi;SaaS,Rechnung #1
+2024-01-10,"Büromaterial, Amazon",89.90,Ausgabe,Büro,,
+2024-01-15,Hetzner Server,49.90,Ausgabe,Hosting,SaaS,"Monatlich
+abgerechnet"
+2024-01-20,Kaputt,abc,Ausgabe,,,
+2024-01-25,Unbekannt,10,Ausgabe,,,,999
+"""
+
+
+@pytest.mark.asyncio
+async def test_bulk_csv_rejects_invalid_lines():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/entries/bulk", content=CSV, headers={"content-type": "text/csv"})
+        assert r.status_code == 422
+        detail = r.json()["detail"]
+        assert detail["inserted"] == 0
+        assert [e["line"] for e in detail["errors"]] == [6, 7]
+        assert "amount" in detail["errors"][0]["error"]
+
+        assert (await c.get("/api/entries")).json() == []
+        assert len((await c.get("/api/categories")).json()) == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_csv_skip_invalid():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/entries/bulk", params={"skip_invalid": "true"}, content=CSV,
+                         headers={"content-type": "text/csv"})
+        assert r.status_code == 201
+        result = r.json()
+        assert result["inserted"] == 3
+        assert result["error_count"] == 2
+        assert result["rows_per_second"] > 0
+
+        entries = {e["description"]: e for e in (await c.get("/api/entries")).json()}
+        assert sorted(p["name"] for p in entries["Webentwicklung"]["projects"]) == ["DeFi", "SaaS"]
+        assert entries["Büromaterial, Amazon"]["category"]["name"] == "Büro"
+        assert entries["Büromaterial, Amazon"]["amount"] == 89.9
+        assert entries["Hetzner Server"]["category"]["name"] == "Hosting"
+        assert entries["Hetzner Server"]["notes"] == "Monatlich\nabgerechnet"
+
+        # Imported ids come from the sequence, so normal inserts keep working
+        r = await c.post("/api/entries", json={
+            "date": "2024-02-01", "description": "Nachher", "amount": 1, "entry_type": "Ausgabe",
+        })
+        assert r.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_bulk_overlong_names_are_line_errors():
+    long = "x" * 101
+    csv = ("date,description,amount,type,category,projects\n"
+           f"2024-01-05,Lang,1,Ausgabe,{long},\n"
+           f"2024-01-06,Lang,1,Ausgabe,,SaaS;{long}\n"
+           f"2024-01-07,Passt,1,Ausgabe,{'x' * 100},{'y' * 100}\n")
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/entries/bulk", params={"skip_invalid": "true"}, content=csv,
+                         headers={"content-type": "text/csv"})
+        assert r.status_code == 201
+        result = r.json()
+        assert (result["inserted"], [e["line"] for e in result["errors"]]) == (1, [2, 3])
+        assert "category" in result["errors"][0]["error"] and "projects" in result["errors"][1]["error"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_numeric_names_are_names():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        existing = (await c.get("/api/categories")).json()[0]
+        csv = ("date,description,amount,type,category,projects,category_id\n"
+               f"2024-01-05,Jahr,1,Ausgabe,{existing['id']},42,\n"
+               f"2024-01-06,Per Id,2,Ausgabe,,,{existing['id']}\n")
+        r = await c.post("/api/entries/bulk", content=csv, headers={"content-type": "text/csv"})
+        assert r.status_code == 201
+        assert r.json()["inserted"] == 2
+
+        entries = {e["description"]: e for e in (await c.get("/api/entries")).json()}
+        assert entries["Jahr"]["category"]["name"] == str(existing["id"])
+        assert entries["Jahr"]["category"]["id"] != existing["id"]
+        assert [p["name"] for p in entries["Jahr"]["projects"]] == ["42"]
+        assert entries["Per Id"]["category"]["id"] == existing["id"]
+
+        r = await c.post("/api/entries/bulk", content=json.dumps({
+            "date": "2024-01-07", "description": "Beides", "amount": 1, "entry_type": "Ausgabe",
+            "category": "Büro", "category_id": existing["id"],
+        }), headers={"content-type": "application/x-ndjson"})
+        assert r.status_code == 422
+        assert "category_id" in r.json()["detail"]["errors"][0]["error"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_ndjson_batches():
+    lines = [
+        {"date": f"2024-03-{i % 28 + 1:02d}", "description": f"Zeile {i}", "amount": i,
+         "entry_type": "Ausgabe", "category_id": 1, "projects": ["DeFi"] if i % 2 else []}
+        for i in range(12_000)
+    ]
+    body = "\n".join(json.dumps(line) for line in lines)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/entries/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+        assert r.status_code == 201
+        assert r.json()["inserted"] == 12_000
+
+        summary = (await c.get("/api/entries/summary")).json()
+        assert summary["total_expense"] == sum(range(12_000))
+        r = await c.get("/api/entries", params={"project_id": 1, "limit": 1000})
+        assert len(r.json()) == 1000
+
+
+@pytest.mark.asyncio
+async def test_bulk_ndjson_invalid_json():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/entries/bulk", params={"format": "ndjson"}, content='{"date": \n')
+        assert r.status_code == 422
+        assert r.json()["detail"]["errors"][0]["line"] == 1
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from app.cache import NotifyListener, ResultCache, cache_key, result_cache
+from app.main import app
+
+
+def test_lru_eviction_and_versioning():
+    cache = ResultCache(maxsize=2, ttl=60)
+    cache.set("a", 1, cache.version)
+    cache.set("b", 2, cache.version)
+    assert cache.get("a") == 1
+    cache.set("c", 3, cache.version)
+    assert cache.get("b") is None
+    assert cache.evictions == 1
+
+    stale_version = cache.version
+    cache.invalidate()
+    assert cache.get("a") is None
+    # A result computed before the write must not be stored afterwards
+    cache.set("a", 1, stale_version)
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_ttl_expiry():
+    cache = ResultCache(maxsize=2, ttl=0)
+    cache.set("a", 1, cache.version)
+    assert cache.get("a") is None
+
+
+def test_cache_key_normalizes_params():
+    assert cache_key("summary", date_to=None, date_from="2024-01-01") == cache_key("summary", date_from="2024-01-01")
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_cached_reads():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await c.post("/api/entries", json={
+            "date": "2024-06-01", "description": "Income", "amount": 1000, "entry_type": "Einnahme",
+        })
+        hits = result_cache.hits
+        assert (await c.get("/api/entries/summary")).json()["total_income"] == 1000
+        assert (await c.get("/api/entries/summary")).json()["total_income"] == 1000
+        assert len((await c.get("/api/entries", params={"limit": 10})).json()) == 1
+        assert len((await c.get("/api/entries", params={"limit": 10})).json()) == 1
+        assert result_cache.hits == hits + 2
+
+        r = await c.post("/api/entries", json={
+            "date": "2024-06-02", "description": "More", "amount": 500, "entry_type": "Einnahme",
+        })
+        assert (await c.get("/api/entries/summary")).json()["total_income"] == 1500
+        assert len((await c.get("/api/entries", params={"limit": 10})).json()) == 2
+
+        await c.put(f"/api/entries/{r.json()['id']}", json={"amount": 250})
+        assert (await c.get("/api/entries/summary")).json()["total_income"] == 1250
+
+        stats = (await c.get("/api/cache/stats")).json()
+        assert stats["hits"] == result_cache.hits
+        assert stats["invalidations"] >= 3
+
+
+@pytest.mark.asyncio
+async def test_notify_listener_invalidates(db_session):
+    listener = NotifyListener(db_session.bind, "test_cache_invalidation")
+    await listener.start()
+    try:
+        version = result_cache.version
+        await db_session.execute(text("SELECT pg_notify('test_cache_invalidation', 'other-worker')"))
+        await db_session.commit()
+        for _ in range(50):
+            if result_cache.version != version:
+                break
+            await asyncio.sleep(0.02)
+        assert result_cache.version == version + 1
+    finally:
+        await listener.stop()
@@ -0,0 +1,153 @@
+import asyncio
+import json
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import func, select, update
+from app.changefeed import ChangeFeed
+from app.main import app
+from app.models.change import EntryChange
+
+
+async def next_message(stream) -> dict:
+    """The next SSE message of ``stream`` as a dict, skipping keepalives."""
+    while True:
+        chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+        if chunk.startswith((":", "retry:")):
+            continue
+        fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+        return {"id": int(fields["id"]) if "id" in fields else None, "event": fields["event"],
+                "data": json.loads(fields["data"])}
+
+
+@pytest_asyncio.fixture
+async def feed(db_session):
+    feed = ChangeFeed(db_session.bind, queue_size=3)
+    await feed.start()
+    await asyncio.wait_for(feed.connected.wait(), 5)
+    yield feed
+    await feed.stop()
+
+
+@pytest.mark.asyncio
+async def test_writes_are_pushed_with_deltas(feed):
+    stream = feed.events()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        ready = await next_message(stream)
+        assert ready["event"] == "ready"
+
+        entry = (await c.post("/api/entries", json={
+            "date": "2024-03-05", "description": "Laptop", "amount": 900, "entry_type": "Ausgabe",
+            "category_id": 1, "project_ids": [1],
+        })).json()
+        created = await next_message(stream)
+        assert created["event"] == "created" and created["id"] > ready["id"]
+        assert created["data"]["entry"] == entry
+        assert created["data"]["deltas"] == [
+            {"month": "2024-03", "entry_type": "Ausgabe", "category_id": 1, "amount": 900.0, "count": 1},
+        ]
+
+        await c.put(f"/api/entries/{entry['id']}", json={"date": "2024-04-01", "category_id": 2})
+        updated = await next_message(stream)
+        assert updated["event"] == "updated"
+        assert updated["data"]["entry"]["category"] == {"id": 2, "name": "Software"}
+        assert updated["data"]["deltas"] == [
+            {"month": "2024-03", "entry_type": "Ausgabe", "category_id": 1, "amount": -900.0, "count": -1},
+            {"month": "2024-04", "entry_type": "Ausgabe", "category_id": 2, "amount": 900.0, "count": 1},
+        ]
+
+        await c.delete(f"/api/entries/{entry['id']}")
+        deleted = await next_message(stream)
+        assert (deleted["event"], deleted["data"]["entry_id"], deleted["data"]["entry"]) == ("deleted", entry["id"], None)
+        assert deleted["data"]["deltas"][0]["amount"] == -900.0
+
+        await c.post("/api/entries", json={"date": "2024-05-01", "description": "x", "amount": 1, "entry_type": "Einnahme"})
+        await next_message(stream)
+        await c.request("DELETE", "/api/entries", json={"filter": {"date_from": "2024-01-01"}})
+        batch = await next_message(stream)
+        assert batch["event"] == "deleted_many" and len(batch["data"]["entry_ids"]) == 1
+    await stream.aclose()
+    assert feed.subscribers == set()
+
+
+@pytest.mark.asyncio
+async def test_resume_overflow_and_reset(feed, db_session):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        for day in ["2024-01-01", "2024-01-02", "2024-01-03"]:
+            await c.post("/api/entries", json={"date": day, "description": day, "amount": 10, "entry_type": "Einnahme"})
+        ids = [event_id for event_id, _, _ in await feed.read(0)]
+
+        # Reconnecting after the first event replays only the two it missed
+        stream = feed.events(after=ids[0])
+        missed = [await next_message(stream) for _ in range(3)]
+        assert [(m["event"], m["id"]) for m in missed] == [("created", ids[1]), ("created", ids[2]), ("ready", ids[2])]
+
+        # A client that stops reading is cut off once its queue is full
+        for i in range(4):
+            await c.post("/api/entries", json={"date": "2024-02-01", "description": str(i), "amount": 1, "entry_type": "Ausgabe"})
+        for _ in range(50):
+            if feed.last_id >= ids[2] + 4:
+                break
+            await asyncio.sleep(0.02)
+        assert feed.subscribers == set()
+        assert (await next_message(stream))["event"] == "overflow"
+        await stream.aclose()
+
+        # ... and resumes from the last event it saw
+        stream = feed.events(after=ids[2])
+        resumed = [await next_message(stream) for _ in range(5)]
+        assert [m["data"]["entry"]["description"] for m in resumed[:4]] == ["0", "1", "2", "3"]
+        assert resumed[4]["event"] == "ready"
+        await stream.aclose()
+
+    await db_session.execute(update(EntryChange).where(EntryChange.id <= ids[1])
+                             .values(created_at=func.now() - timedelta(days=2)))
+    await db_session.commit()
+    assert await feed.expire() == 2
+    stream = feed.events(after=ids[0])
+    assert (await next_message(stream))["event"] == "reset"
+    assert (await next_message(stream))["event"] == "ready"
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_last_event_id_header_is_the_resume_token(monkeypatch):
+    seen = []
+
+    # ASGITransport waits for the whole body, so the stream has to end
+    async def events(after):
+        seen.append(after)
+        yield b"event: ready\ndata: {}\n\n"
+
+    monkeypatch.setattr("app.api.entries.feed.events", events)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.get("/api/entries/changes", headers={"Last-Event-ID": "42"})
+        assert r.headers["content-type"].startswith("text/event-stream")
+        await c.get("/api/entries/changes", params={"after": 7})
+        await c.get("/api/entries/changes")
+    assert seen == [42, 7, None]
+
+
+@pytest.mark.asyncio
+async def test_listener_reconnects_and_catches_up(feed, db_session, monkeypatch):
+    monkeypatch.setattr("app.changefeed.RECONNECT_DELAY", 0.01)
+    stream = feed.events()
+    assert (await next_message(stream))["event"] == "ready"
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        # The database drops the LISTEN connection, as on a restart or failover
+        pid = feed.raw.get_server_pid()
+        await db_session.execute(select(func.pg_terminate_backend(pid)))
+        for _ in range(250):
+            if feed.raw is not None and feed.raw.get_server_pid() != pid:
+                break
+            await asyncio.sleep(0.02)
+        assert feed.raw.get_server_pid() != pid
+        await c.post("/api/entries", json={"date": "2024-01-01", "description": "after", "amount": 1, "entry_type": "Einnahme"})
+        assert (await next_message(stream))["data"]["entry"]["description"] == "after"
+    await stream.aclose()
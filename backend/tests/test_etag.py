@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import func, insert, select
+from app.config import settings
+from app.main import app
+from app.models.entry import Category
+from app.models.watermark import FOLD_EVERY, TableVersion
+from app.watermarks import table_versions
+
+
+@pytest.mark.asyncio
+async def test_reference_data_revalidates_from_snapshot(monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG_QUERY_HEADERS", True)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.get("/api/projects")
+        etag = r.headers["ETag"]
+        assert [p["name"] for p in r.json()] == ["DeFi"]
+
+        r = await c.get("/api/projects", headers={"If-None-Match": etag})
+        assert r.status_code == 304 and r.content == b""
+        assert r.headers["ETag"] == etag
+        assert r.headers["X-Query-Count"] == "1"
+        assert (await c.get("/api/projects", headers={"If-None-Match": f'"x", W/{etag}'})).status_code == 304
+
+        await c.post("/api/projects", json={"name": "Beratung"})
+        r = await c.get("/api/projects", headers={"If-None-Match": etag})
+        assert r.status_code == 200
+        assert r.headers["ETag"] != etag
+        assert [p["name"] for p in r.json()] == ["Beratung", "DeFi"]
+
+        # Projects moving does not touch the categories ETag
+        r = await c.get("/api/categories")
+        assert (await c.get("/api/categories", headers={"If-None-Match": r.headers["ETag"]})).status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_entry_reads_answer_304_until_a_write(monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG_QUERY_HEADERS", True)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/entries", json={
+            "date": "2024-03-01", "description": "Laptop", "amount": 1200, "entry_type": "Ausgabe",
+            "category_id": 1, "project_ids": [1],
+        })
+        entry_id = r.json()["id"]
+
+        for amount, (path, params) in enumerate([("/api/entries", {}), ("/api/entries", {"fast": "true"}),
+                             ("/api/entries", {"limit": 10, "q": "laptop"}), ("/api/entries/summary", {})], start=1):
+            r = await c.get(path, params=params)
+            etag = r.headers["ETag"]
+            r = await c.get(path, params=params, headers={"If-None-Match": etag})
+            assert r.status_code == 304, (path, params)
+            assert r.headers["X-Query-Count"] == "1"
+
+            await c.put(f"/api/entries/{entry_id}", json={"amount": amount})
+            r = await c.get(path, params=params, headers={"If-None-Match": etag})
+            assert r.status_code == 200
+            assert r.headers["ETag"] != etag
+
+        # Streams are not collected, so they carry no ETag
+        r = await c.get("/api/entries", params={"stream": "true"})
+        assert "ETag" not in r.headers
+
+
+@pytest.mark.asyncio
+async def test_watermarks_do_not_serialize_writers(setup_db):
+    async with setup_db() as slow, setup_db() as fast, setup_db() as reader:
+        before = (await table_versions(reader, "categories"))["categories"]
+        # An open writing transaction, like a long import, holds no lock other writers need
+        await slow.execute(insert(Category).values(name="Langsam"))
+        await asyncio.wait_for(fast.execute(insert(Category).values(name="Schnell")), 2)
+        await fast.commit()
+        after_fast = (await table_versions(reader, "categories"))["categories"]
+        await slow.commit()
+        after_slow = (await table_versions(reader, "categories"))["categories"]
+        assert before < after_fast < after_slow
+
+        # Bumps are folded as writes go on, without changing the sums
+        for i in range(2 * FOLD_EVERY):
+            await fast.execute(insert(Category).values(name=f"K{i}"))
+            await fast.commit()
+        assert (await table_versions(reader, "categories"))["categories"] == after_slow + 2 * FOLD_EVERY
+        assert (await reader.execute(select(func.count()).select_from(TableVersion))).scalar() <= FOLD_EVERY + 4
@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+
+
+async def create_entries(c):
+    await c.post("/api/projects", json={"name": "SaaS"})
+    rows = [
+        ("2024-01-05", "Webentwicklung", 4500, "Einnahme", None, [1, 2], "Rechnung #1"),
+        ("2024-01-10", "Büromaterial, Amazon", 89.9, "Ausgabe", 1, [], None),
+        ("2024-02-15", 'Hetzner "Cloud"', 49.9, "Ausgabe", 2, [2], "Monatlich\nabgerechnet"),
+    ]
+    for d, description, amount, entry_type, category_id, project_ids, notes in rows:
+        await c.post("/api/entries", json={
+            "date": d, "description": description, "amount": amount, "entry_type": entry_type,
+            "category_id": category_id, "project_ids": project_ids, "notes": notes,
+        })
+
+
+@pytest.mark.asyncio
+async def test_export_csv():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await create_entries(c)
+        r = await c.get("/api/entries/export", params={"format": "csv"})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/csv")
+        assert "attachment" in r.headers["content-disposition"]
+        rows = list(csv.DictReader(io.StringIO(r.text)))
+        assert [row["description"] for row in rows] == ["Webentwicklung", "Büromaterial, Amazon", 'Hetzner "Cloud"']
+        assert rows[0]["projects"] == "DeFi;SaaS"
+        assert rows[1] == {
+            "date": "2024-01-10", "description": "Büromaterial, Amazon", "amount": "89.90", "type": "Ausgabe",
+            "category": "Büro", "projects": "", "notes": "",
+        }
+        assert rows[2]["notes"] == "Monatlich\nabgerechnet"
+
+
+@pytest.mark.asyncio
+async def test_export_csv_round_trips_through_bulk_import():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await create_entries(c)
+        exported = (await c.get("/api/entries/export")).text
+        before = (await c.get("/api/entries/summary")).json()
+        r = await c.post("/api/entries/bulk", content=exported, headers={"content-type": "text/csv"})
+        assert r.json()["inserted"] == 3
+        after = (await c.get("/api/entries/summary")).json()
+        assert after["total_income"] == 2 * before["total_income"]
+        assert after["total_expense"] == 2 * before["total_expense"]
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson_with_filters():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await create_entries(c)
+        r = await c.get("/api/entries/export", params={"format": "ndjson", "project_id": 2})
+        lines = [json.loads(line) for line in r.text.splitlines()]
+        assert [line["description"] for line in lines] == ["Webentwicklung", 'Hetzner "Cloud"']
+        assert lines[1] == {
+            "date": "2024-02-15", "description": 'Hetzner "Cloud"', "amount": 49.9, "type": "Ausgabe",
+            "category": "Software", "projects": ["SaaS"], "notes": "Monatlich\nabgerechnet",
+        }
+
+        r = await c.get("/api/entries/export", params={"format": "ndjson", "date_from": "2024-02-01"})
+        assert len(r.text.splitlines()) == 1
+        r = await c.get("/api/entries/export", params={"format": "ndjson", "entry_type": "Einnahme", "category_id": 1})
+        assert r.text == ""
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.config import settings
+from app.main import app
+
+
+@pytest.mark.asyncio
+async def test_fast_path_matches_entry_out():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await c.post("/api/projects", json={"name": "Consulting"})
+        await c.post("/api/projects", json={"name": "Ärztekammer"})
+        for i in range(30):
+            await c.post("/api/entries", json={
+                "date": f"2024-0{i % 9 + 1}-{i % 27 + 1:02d}",
+                "description": f"Buchung „{i}“ mit Ümlaut",
+                "amount": [4500, 89.9, 0.1, 1234567.89, 0][i % 5],
+                "entry_type": "Einnahme" if i % 3 else "Ausgabe",
+                "category_id": [None, 1, 2][i % 3],
+                "project_ids": [[], [1], [3, 2, 1], [2]][i % 4],
+                "notes": None if i % 2 else f"Notiz {i}",
+            })
+
+        for params in [{}, {"project_id": 2}, {"category_id": 1}, {"entry_type": "Ausgabe"},
+                       {"date_from": "2024-03-01", "date_to": "2024-06-30"}, {"limit": 7}]:
+            slow = await c.get("/api/entries", params=params)
+            fast = await c.get("/api/entries", params={**params, "fast": "true"})
+            assert fast.status_code == 200
+            assert fast.headers["content-type"] == "application/json"
+            assert fast.json() == slow.json()
+            assert fast.content == slow.content
+            assert fast.headers.get("X-Next-Cursor") == slow.headers.get("X-Next-Cursor")
+
+        cursor = (await c.get("/api/entries", params={"limit": 7, "fast": "true"})).headers["X-Next-Cursor"]
+        slow = await c.get("/api/entries", params={"limit": 7, "cursor": cursor})
+        fast = await c.get("/api/entries", params={"limit": 7, "cursor": cursor, "fast": "true"})
+        assert fast.content == slow.content
+
+
+@pytest.mark.asyncio
+async def test_sparse_fields_skip_relationship_loads(monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG_QUERY_HEADERS", True)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        for i in range(12):
+            await c.post("/api/entries", json={
+                "date": f"2024-02-{i + 1:02d}", "description": f"E{i}", "amount": i, "entry_type": "Ausgabe",
+                "category_id": [None, 1][i % 2], "project_ids": [[], [1]][i % 2],
+            })
+        full = await c.get("/api/entries")
+        # Watermarks, entries with the category joined, projects by selectin
+        assert full.headers["X-Query-Count"] == "3"
+
+        r = await c.get("/api/entries", params={"fields": "amount,id, entry_type,date"})
+        assert r.headers["X-Query-Count"] == "2"
+        assert r.json() == [{k: e[k] for k in ("id", "date", "amount", "entry_type")} for e in full.json()]
+
+        r = await c.get("/api/entries", params={"fields": "category,projects", "limit": 5})
+        assert r.json() == [{"category": e["category"], "projects": e["projects"]} for e in full.json()[:5]]
+        r = await c.get("/api/entries", params={"fields": "category,projects", "limit": 5, "cursor": r.headers["X-Next-Cursor"]})
+        assert r.json() == [{"category": e["category"], "projects": e["projects"]} for e in full.json()[5:10]]
+
+        r = await c.get("/api/entries", params={"fields": "id,description", "stream": "true"})
+        assert [json.loads(line) for line in r.text.splitlines()] == [
+            {"id": e["id"], "description": e["description"]} for e in full.json()]
+
+        assert (await c.get("/api/entries", params={"fields": "id,secret"})).status_code == 400
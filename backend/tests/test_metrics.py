@@ -0,0 +1,93 @@
+import logging
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from app.config import settings
+from app.main import app
+from app.metrics import Histogram, registry
+
+
+def test_histogram_cumulative_buckets():
+    h = Histogram(buckets=(0.1, 1))
+    for v in (0.05, 0.1, 0.5, 3):
+        h.observe(v)
+    assert h.cumulative() == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert h.count == 4
+
+
+@pytest.mark.asyncio
+async def test_query_count_headers(monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG_QUERY_HEADERS", True)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.get("/api/categories")
+        assert r.headers["X-Query-Count"] == "2"
+        assert r.headers["Server-Timing"].startswith("db;dur=")
+        # Later requests only read the watermark and reuse the snapshot
+        r = await c.get("/api/categories")
+        assert r.headers["X-Query-Count"] == "1"
+
+        r = await c.get("/api/health")
+        assert r.headers["X-Query-Count"] == "0"
+
+
+@pytest.mark.asyncio
+async def test_headers_off_by_default():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.get("/api/categories")
+        assert "X-Query-Count" not in r.headers
+
+
+@pytest.mark.asyncio
+async def test_metrics_by_route_template():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/entries", json={
+            "date": "2024-06-01", "description": "Test", "amount": 1, "entry_type": "Einnahme",
+        })
+        before = registry.routes[("PUT", "/api/entries/{entry_id}")].queries
+        await c.put(f"/api/entries/{r.json()['id']}", json={"amount": 2})
+        await c.put("/api/entries/999999", json={"amount": 2})
+        assert registry.routes[("PUT", "/api/entries/{entry_id}")].queries > before
+
+        r = await c.get("/api/metrics")
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/plain")
+        body = r.text
+        assert 'http_request_duration_seconds_bucket{method="PUT",route="/api/entries/{entry_id}",le="+Inf"}' in body
+        assert 'http_requests_total{method="PUT",route="/api/entries/{entry_id}",status="404"}' in body
+        assert 'sql_statements_total{method="POST",route="/api/entries"}' in body
+        assert "db_pool_checked_out" in body
+        assert "result_cache_hits_total" in body
+
+
+@pytest.mark.asyncio
+async def test_slow_query_log(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        with caplog.at_level(logging.WARNING, logger="app.sql.slow"):
+            await c.get("/api/categories")
+    assert any("FROM categories" in r.getMessage() for r in caplog.records)
+
+
+@pytest.mark.asyncio
+async def test_failed_statements_are_counted(db_session):
+    failed, outside = registry.failed_queries, registry.queries_outside_requests
+    for _ in range(3):
+        with pytest.raises(ProgrammingError):
+            await db_session.execute(text("SELECT * FROM missing_table"))
+        await db_session.rollback()
+    await db_session.execute(text("SELECT 1"))
+    assert (await db_session.connection()).sync_connection.info["query_started"] == []
+    assert registry.failed_queries == failed + 3
+    assert registry.queries_outside_requests > outside
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        body = (await c.get("/api/metrics")).text
+    assert f"sql_failed_statements_total {failed + 3}" in body
+    assert "sql_statements_outside_requests_total" in body
@@ -0,0 +1,77 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+
+
+async def create_entries(c, n=25):
+    for i in range(n):
+        await c.post("/api/entries", json={
+            # Several entries per day so the id tie-breaker is exercised
+            "date": (date(2024, 1, 1) + timedelta(days=i // 3)).isoformat(),
+            "description": f"Entry {i}",
+            "amount": 10 + i,
+            "entry_type": "Einnahme" if i % 2 else "Ausgabe",
+            "category_id": 1 if i % 4 == 0 else None,
+            "project_ids": [1] if i % 5 == 0 else [],
+        })
+
+
+async def fetch_all_pages(c, params, limit):
+    pages, cursor = [], None
+    while True:
+        r = await c.get("/api/entries", params={**params, "limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        pages.append(r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination_matches_full_list():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await create_entries(c)
+        for params in [{}, {"entry_type": "Einnahme"}, {"category_id": 1}, {"project_id": 1},
+                       {"date_from": "2024-01-03", "date_to": "2024-01-06"}]:
+            full = (await c.get("/api/entries", params=params)).json()
+            pages = await fetch_all_pages(c, params, limit=4)
+            assert all(len(p) <= 4 for p in pages)
+            assert [e["id"] for p in pages for e in p] == [e["id"] for e in full]
+
+        keys = [(e["date"], e["id"]) for e in full]
+        assert keys == sorted(keys, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_last_page_has_no_cursor():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await create_entries(c, 3)
+        r = await c.get("/api/entries", params={"limit": 3})
+        assert len(r.json()) == 3
+        assert "X-Next-Cursor" not in r.headers
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.get("/api/entries", params={"cursor": "not-a-cursor"})
+        assert r.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_ndjson_stream_matches_full_list():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await create_entries(c)
+        for params in [{}, {"entry_type": "Ausgabe"}, {"project_id": 1}, {"date_from": "2024-01-05"}]:
+            full = (await c.get("/api/entries", params=params)).json()
+            r = await c.get("/api/entries", params={**params, "stream": "true"})
+            assert r.status_code == 200
+            assert r.headers["content-type"].startswith("application/x-ndjson")
+            assert [json.loads(line) for line in r.text.splitlines()] == full
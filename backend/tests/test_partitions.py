@@ -0,0 +1,55 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from app.main import app
+from app.partitions import ensure_partitions, partitions
+from app.rollups import check
+
+
+async def partition_of(db, entry_id):
+    name = (await db.execute(text("SELECT tableoid::regclass::text FROM entries WHERE id = :id"), {"id": entry_id})).scalar()
+    # Creating a partition locks the parent; an open read transaction would block it
+    await db.commit()
+    return name
+
+
+@pytest.mark.asyncio
+async def test_new_partition_takes_over_rows_from_default(db_session):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/entries", json={
+            "date": "2031-03-01", "description": "Zukunft", "amount": 10, "entry_type": "Ausgabe", "project_ids": [1],
+        })
+        entry = r.json()
+        assert await partition_of(db_session, entry["id"]) == "entries_default"
+
+        assert await ensure_partitions(db_session.bind, 2030, 2031) == 2
+        assert await ensure_partitions(db_session.bind, 2030, 2031) == 0
+        assert await partition_of(db_session, entry["id"]) == "entries_2031"
+        assert {"entries_2030", "entries_2031", "entries_default"} <= {name for name, _, _ in await partitions(db_session.bind)}
+        assert (await c.get("/api/entries", params={"project_id": 1})).json() == [entry]
+
+
+@pytest.mark.asyncio
+async def test_links_follow_rows_between_partitions(db_session):
+    await ensure_partitions(db_session.bind, 2023, 2024)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/entries", json={
+            "date": "2023-12-31", "description": "Silvester", "amount": 10, "entry_type": "Ausgabe", "project_ids": [1],
+        })
+        entry_id = r.json()["id"]
+        r = await c.put(f"/api/entries/{entry_id}", json={"date": "2024-01-01"})
+        assert [p["name"] for p in r.json()["projects"]] == ["DeFi"]
+        assert await partition_of(db_session, entry_id) == "entries_2024"
+        link_date = (await db_session.execute(text("SELECT entry_date FROM entry_projects WHERE entry_id = :id"),
+                                              {"id": entry_id})).scalar()
+        assert link_date.isoformat() == "2024-01-01"
+
+        r = await c.patch("/api/entries", json={"ids": [entry_id], "changes": {"date": "2023-06-30"}})
+        assert r.json() == {"affected": 1}
+        assert [p["id"] for e in (await c.get("/api/entries")).json() for p in e["projects"]] == [1]
+        assert await check(db_session) == []
+
+        await c.delete(f"/api/entries/{entry_id}")
+        assert (await db_session.execute(text("SELECT count(*) FROM entry_projects"))).scalar() == 0
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app.database import make_engine, pool_status
+from app.main import app
+from tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.mark.asyncio
+async def test_pool_status_tracks_checkouts():
+    engine = make_engine(TEST_DATABASE_URL, pool_size=1, max_overflow=1, pool_timeout=0.2)
+    try:
+        async with engine.connect() as a, engine.connect() as b:
+            await a.execute(text("SELECT 1"))
+            await b.execute(text("SELECT 1"))
+            status = pool_status(engine)
+            assert (status["checked_out"], status["overflow"], status["max_overflow"]) == (2, 1, 1)
+            with pytest.raises(PoolTimeoutError):
+                async with engine.connect() as c:
+                    await c.execute(text("SELECT 1"))
+
+        status = pool_status(engine)
+        assert status["checked_out"] == 0
+        assert status["idle"] == 1
+        assert status["timeouts"] == 1
+        wait = status["checkout_wait_seconds"]
+        assert wait["count"] == 3
+        assert wait["sum"] >= 0.2
+        assert wait["buckets"]["+Inf"] == 3
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_waiters_queue_for_connections():
+    engine = make_engine(TEST_DATABASE_URL, pool_size=1, max_overflow=0)
+
+    async def query():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT pg_sleep(0.05)"))
+
+    try:
+        await asyncio.gather(*(query() for _ in range(3)))
+        wait = pool_status(engine)["checkout_wait_seconds"]
+        assert wait["count"] == 3
+        assert wait["sum"] >= 0.1
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pool_endpoint():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.get("/api/pool")
+        assert r.status_code == 200
+        assert {"size", "checked_out", "idle", "overflow", "checkout_wait_seconds"} <= r.json().keys()
@@ -0,0 +1,82 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+
+
+def python_project_summary(entries, allocation):
+    """Reference figures per project from the raw entries."""
+    projects = {}
+    for e in entries:
+        for p in e["projects"]:
+            amount = float(e["amount"]) / (len(e["projects"]) if allocation == "split" else 1)
+            project = projects.setdefault(p["name"], {"income": 0, "expense": 0, "monthly": {}})
+            month = project["monthly"].setdefault(e["date"][:7], {"income": 0, "expense": 0})
+            side = "income" if e["entry_type"] == "Einnahme" else "expense"
+            project[side] += amount
+            month[side] += amount
+    return projects
+
+
+@pytest.mark.asyncio
+async def test_project_summary_matches_python_reference():
+    rng = random.Random(11)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        for name in ["Consulting", "SaaS", "Leerlauf"]:
+            await c.post("/api/projects", json={"name": name})
+        for i in range(80):
+            await c.post("/api/entries", json={
+                "date": (date(2024, 1, 1) + timedelta(days=rng.randrange(150))).isoformat(),
+                "description": f"Entry {i}",
+                "amount": round(rng.uniform(0, 1000), 2),
+                "entry_type": rng.choice(["Einnahme", "Ausgabe"]),
+                "project_ids": rng.choice([[], [1], [2], [1, 3], [1, 2, 3]]),
+            })
+
+        for allocation in ["full", "split"]:
+            for params in [{}, {"date_from": "2024-02-10", "date_to": "2024-04-20"}]:
+                entries = (await c.get("/api/entries", params=params)).json()
+                expected = python_project_summary(entries, allocation)
+                r = await c.get("/api/projects/summary", params={**params, "allocation": allocation})
+                assert r.status_code == 200
+                body = r.json()
+                assert body["allocation"] == allocation
+                assert [p["name"] for p in body["projects"]] == ["Consulting", "DeFi", "Leerlauf", "SaaS"]
+                for p in body["projects"]:
+                    e = expected.get(p["name"], {"income": 0, "expense": 0, "monthly": {}})
+                    assert p["income"] == pytest.approx(e["income"])
+                    assert p["expense"] == pytest.approx(e["expense"])
+                    assert p["net"] == pytest.approx(e["income"] - e["expense"])
+                    assert [m["month"] for m in p["monthly"]] == sorted(e["monthly"])
+                    for m in p["monthly"]:
+                        assert m["income"] == pytest.approx(e["monthly"][m["month"]]["income"])
+                        assert m["expense"] == pytest.approx(e["monthly"][m["month"]]["expense"])
+
+                    one = (await c.get(f"/api/projects/{p['id']}/summary",
+                                       params={**params, "allocation": allocation})).json()
+                    assert one == p
+
+                if allocation == "split":
+                    linked = [e for e in entries if e["projects"]]
+                    income = sum(float(e["amount"]) for e in linked if e["entry_type"] == "Einnahme")
+                    assert sum(p["income"] for p in body["projects"]) == pytest.approx(income)
+
+
+@pytest.mark.asyncio
+async def test_project_summary_empty_and_unknown_project():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.get("/api/projects/1/summary")
+        assert r.json() == {"id": 1, "name": "DeFi", "income": 0.0, "expense": 0.0, "net": 0.0,
+                            "margin": None, "monthly": []}
+        entry = (await c.post("/api/entries", json={
+            "date": "2024-03-01", "description": "x", "amount": 5, "entry_type": "Ausgabe", "project_ids": [1],
+        })).json()
+        await c.delete(f"/api/entries/{entry['id']}")
+        # The emptied rollup row stays behind but must not show up as a month
+        assert (await c.get("/api/projects/1/summary")).json()["monthly"] == []
+        assert (await c.get("/api/projects/99/summary")).status_code == 404
+        assert (await c.get("/api/projects/summary", params={"allocation": "weighted"})).status_code == 422
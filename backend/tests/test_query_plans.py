@@ -0,0 +1,126 @@
+"""Plan regression tests: the hot entry queries must be served by indexes.
+
+A synthetic multi-year table is seeded so that the planner's choices are
+the ones it would make on production-sized data rather than on a handful
+of rows where a sequential scan is always cheapest.
+"""
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.api.entries import encode_cursor, list_query, summary_queries
+
+ROWS = 200_000
+YEARS = 6
+
+
+async def seed_synthetic(session):
+    await session.execute(text(f"SELECT ensure_entries_partitions(2019, {2019 + YEARS - 1})"))
+    await session.execute(text(
+        "INSERT INTO categories (name) SELECT 'Kategorie ' || i FROM generate_series(1, 20) i"
+    ))
+    await session.execute(text(
+        "INSERT INTO projects (name) SELECT 'Projekt ' || i FROM generate_series(1, 8) i"
+    ))
+    await session.execute(text(f"""
+        INSERT INTO entries (date, description, amount, entry_type, category_id)
+        SELECT date '2019-01-01' + (i % ({YEARS} * 365)),
+               'Buchung ' || i,
+               (i % 500000) / 100.0,
+               CASE WHEN i % 4 = 0 THEN 'EINNAHME'::entrytype ELSE 'AUSGABE'::entrytype END,
+               CASE WHEN i % 10 = 0 THEN NULL ELSE 1 + i % 22 END
+        FROM generate_series(1, {ROWS}) i
+    """))
+    await session.execute(text("""
+        INSERT INTO entry_projects (entry_id, entry_date, project_id)
+        SELECT id, date, 1 + id % 10 FROM entries WHERE id % 10 < 8 AND id % 3 = 0
+    """))
+    await session.commit()
+    async with session.bind.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE"))
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def explain(session, q):
+    sql = str(q.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    raw = (await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+    return list(plan_nodes(plan))
+
+
+def table_of(relation):
+    # Yearly partitions (entries_2023, entries_default) count as entries
+    return "entries" if relation.startswith("entries_") else relation
+
+
+def seq_scanned(nodes):
+    return {table_of(n["Relation Name"]) for n in nodes if n["Node Type"] == "Seq Scan"}
+
+
+def scanned_partitions(nodes):
+    return {n["Relation Name"] for n in nodes if n.get("Relation Name", "").startswith("entries_")}
+
+
+HOT_QUERIES = {
+    "first page": lambda: list_query().limit(51),
+    "next page": lambda: list_query(cursor=encode_cursor(date(2022, 6, 30), 150_000)).limit(51),
+    "one month": lambda: list_query(date_from=date(2023, 3, 1), date_to=date(2023, 3, 31)),
+    "category page": lambda: list_query(category_id=3).limit(51),
+    "category range": lambda: list_query(category_id=3, date_from=date(2023, 1, 1), date_to=date(2023, 12, 31)),
+    "type page": lambda: list_query(entry_type="Einnahme").limit(51),
+    "project page": lambda: list_query(project_id=2).limit(51),
+    "project range": lambda: list_query(project_id=2, date_from=date(2023, 1, 1), date_to=date(2023, 3, 31)),
+    # Raw summaries only cover the partial months at the edges of a range
+    "summary month buckets": lambda: summary_queries(date(2023, 3, 1), date(2023, 3, 31))[0],
+    "summary categories": lambda: summary_queries(date(2023, 3, 1), date(2023, 3, 31))[1],
+}
+
+
+@pytest.mark.asyncio
+async def test_hot_queries_avoid_sequential_scans(db_session):
+    await seed_synthetic(db_session)
+    for name, build in HOT_QUERIES.items():
+        nodes = await explain(db_session, build())
+        assert not seq_scanned(nodes) & {"entries", "entry_projects"}, name
+
+
+@pytest.mark.asyncio
+async def test_summary_is_index_only(db_session):
+    await seed_synthetic(db_session)
+    for q in summary_queries(date(2023, 3, 1), date(2023, 3, 31)):
+        nodes = await explain(db_session, q)
+        index_only = {(n["Relation Name"], n["Index Name"]) for n in nodes if n["Node Type"] == "Index Only Scan"}
+        assert index_only == {("entries_2023", "entries_2023_date_id_entry_type_category_id_amount_idx")}
+
+
+RANGED_QUERIES = {
+    "one month": (lambda: list_query(date_from=date(2023, 3, 1), date_to=date(2023, 3, 31)), {"entries_2023"}),
+    "category range": (lambda: list_query(category_id=3, date_from=date(2023, 1, 1), date_to=date(2023, 12, 31)),
+                       {"entries_2023"}),
+    "project range": (lambda: list_query(project_id=2, date_from=date(2022, 12, 1), date_to=date(2023, 1, 31)),
+                      {"entries_2022", "entries_2023"}),
+    "summary year": (lambda: summary_queries(date(2021, 1, 1), date(2021, 12, 31))[0], {"entries_2021"}),
+    "summary edges": (lambda: summary_queries(date(2020, 12, 15), date(2021, 1, 14))[1], {"entries_2020", "entries_2021"}),
+}
+
+
+@pytest.mark.asyncio
+async def test_date_ranges_prune_partitions(db_session):
+    await seed_synthetic(db_session)
+    for name, (build, expected) in RANGED_QUERIES.items():
+        nodes = await explain(db_session, build())
+        assert scanned_partitions(nodes) <= expected, name
+        assert scanned_partitions(nodes) & expected, name
+
+    # Open-ended ranges still skip the years before them
+    nodes = await explain(db_session, list_query(date_from=date(2024, 6, 1)).limit(51))
+    assert not scanned_partitions(nodes) & {f"entries_{year}" for year in range(2019, 2024)}
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from app.database import Base, make_engine
+from app.main import app
+from app.models.entry import Category
+from app.replica import get_read_db, read_db
+from app.watermarks import clear_snapshots
+from tests.conftest import TEST_DATABASE_URL
+
+# A second database on the same server stands in for the replica
+REPLICA_DATABASE_URL = TEST_DATABASE_URL + "_replica"
+
+
+@pytest_asyncio.fixture
+async def replica(setup_db):
+    admin = make_engine(TEST_DATABASE_URL, isolation_level="AUTOCOMMIT")
+    async with admin.connect() as conn:
+        name = REPLICA_DATABASE_URL.rsplit("/", 1)[1]
+        if not (await conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :n"), {"n": name})).scalar():
+            await conn.execute(text(f'CREATE DATABASE "{name}"'))
+    await admin.dispose()
+
+    engine = make_engine(REPLICA_DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    replica_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with replica_session() as session:
+        session.add(Category(name="Nur im Replikat"))
+        await session.commit()
+
+    app.dependency_overrides[get_read_db] = read_db(setup_db, replica_session)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_until_the_client_writes(replica):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.get("/api/categories")
+        assert [cat["name"] for cat in r.json()] == ["Nur im Replikat"]
+
+        r = await c.post("/api/entries", json={
+            "date": "2024-01-01", "description": "Neu", "amount": 5, "entry_type": "Ausgabe",
+        })
+        assert r.status_code == 201
+        assert "last_write" in r.cookies and r.headers["X-Last-Write"]
+
+        # The cookie pins this client to the primary, which has its own write
+        clear_snapshots()
+        r = await c.get("/api/categories")
+        assert [cat["name"] for cat in r.json()] == ["Büro", "Software"]
+        assert [e["description"] for e in (await c.get("/api/entries")).json()] == ["Neu"]
+
+        # A different client without the cookie still reads the replica
+        async with AsyncClient(transport=transport, base_url="http://test") as other:
+            assert (await other.get("/api/entries")).json() == []
+            r = await other.get("/api/entries", headers={"X-Last-Write": f"{time.time():.3f}"})
+            assert [e["description"] for e in r.json()] == ["Neu"]
+            r = await other.get("/api/entries", headers={"X-Last-Write": f"{time.time() - 60:.3f}"})
+            assert r.json() == []
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_do_not_pin_to_primary(replica):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.put("/api/entries/999999", json={"notes": "x"})
+        assert r.status_code == 404
+        assert "X-Last-Write" not in r.headers and "last_write" not in r.cookies
@@ -0,0 +1,146 @@
+import asyncio
+import csv
+import io
+from datetime import timedelta
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import func, update
+from app.main import app
+from app.models.report import ReportJob
+from app.reports import JobLost, ReportRunner
+
+ENTRIES = [
+    ("2023-12-31", 50, "Ausgabe", 1, [1]),
+    ("2024-01-10", 1000, "Einnahme", None, [1]),
+    ("2024-01-20", 120.5, "Ausgabe", 1, []),
+    ("2024-03-05", 80, "Ausgabe", 2, [1]),
+]
+
+
+async def add_entries(c):
+    for day, amount, entry_type, category_id, project_ids in ENTRIES:
+        await c.post("/api/entries", json={
+            "date": day, "description": f"Beleg {day}", "amount": amount, "entry_type": entry_type,
+            "category_id": category_id, "project_ids": project_ids,
+        })
+
+
+@pytest.mark.asyncio
+async def test_report_is_generated_in_the_background(db_session, tmp_path):
+    runner = ReportRunner(db_session.bind, tmp_path, workers=1, max_running=1)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await add_entries(c)
+        r = await c.post("/api/reports", json={"date_from": "2024-01-01", "date_to": "2024-12-31"})
+        assert r.status_code == 202
+        job = r.json()
+        assert (job["status"], job["progress"], job["download_url"]) == ("queued", 0, None)
+        assert (await c.get(f"/api/reports/{job['id']}/download")).status_code == 409
+
+        assert await runner.run_next()
+        assert not await runner.run_next()
+        job = (await c.get(f"/api/reports/{job['id']}")).json()
+        assert (job["status"], job["progress"], job["attempts"]) == ("done", 1, 1)
+        r = await c.get(job["download_url"])
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/csv")
+        assert job["file_size"] == len(r.content)
+
+        rows = list(csv.reader(io.StringIO(r.text)))
+        assert rows[0] == ["Einnahmen-Ausgaben-Rechnung", "2024-01-01", "2024-12-31"]
+        assert ["total", "1000.00", "200.50", "799.50"] in rows
+        assert ["2024-01", "1000.00", "120.50", "879.50"] in rows
+        assert ["", "1000.00", "0", "1000.00"] in rows
+        assert ["Software", "0", "80.00", "-80.00"] in rows
+        assert ["DeFi", "1000.00", "80.00", "920.00"] in rows
+        header = rows.index(["date", "description", "amount", "type", "category", "projects", "notes"])
+        assert [row[0] for row in rows[header + 1:]] == ["2024-01-10", "2024-01-20", "2024-03-05"]
+
+        job = (await c.post("/api/reports", json={
+            "date_from": "2023-01-01", "date_to": "2024-01-31", "format": "json",
+        })).json()
+        assert await runner.run_next()
+        report = (await c.get(f"/api/reports/{job['id']}/download")).json()
+        assert report["totals"] == {"income": 1000.0, "expense": 170.5, "net": 829.5}
+        assert [m["month"] for m in report["monthly"]] == ["2023-12", "2024-01"]
+        assert [e["date"] for e in report["entries"]] == ["2023-12-31", "2024-01-10", "2024-01-20"]
+        assert report["entries"][0] == {
+            "date": "2023-12-31", "description": "Beleg 2023-12-31", "amount": 50.0, "type": "Ausgabe",
+            "category": "Büro", "projects": ["DeFi"], "notes": None,
+        }
+
+        r = await c.post("/api/reports", json={"date_from": "2024-02-01", "date_to": "2024-01-01"})
+        assert r.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_claims_respect_limit_and_recover_lost_jobs(db_session, tmp_path):
+    runner = ReportRunner(db_session.bind, tmp_path, workers=1, max_running=1)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await add_entries(c)
+        first = (await c.post("/api/reports", json={"date_from": "2024-01-01", "date_to": "2024-12-31"})).json()
+        second = (await c.post("/api/reports", json={"date_from": "2023-01-01", "date_to": "2023-12-31"})).json()
+
+        # A worker claims the first job and dies without finishing it
+        claimed = await runner.claim()
+        assert claimed.id == first["id"]
+        assert await runner.claim() is None
+        assert (await c.get(f"/api/reports/{first['id']}")).json()["status"] == "running"
+
+        await db_session.execute(update(ReportJob).where(ReportJob.id == first["id"])
+                                 .values(heartbeat_at=func.now() - timedelta(minutes=5)))
+        await db_session.commit()
+        assert await runner.run_next()
+        job = (await c.get(f"/api/reports/{first['id']}")).json()
+        assert (job["status"], job["attempts"]) == ("done", 2)
+        # The dead worker may no longer touch the job, nor leave its file behind
+        assert not await runner.report(claimed, progress=0.5)
+        with pytest.raises(JobLost):
+            await runner.generate(claimed)
+        assert [p.name for p in tmp_path.iterdir()] == [f"report-{first['id']}.csv"]
+
+        assert await runner.run_next()
+        assert (await c.get(f"/api/reports/{second['id']}")).json()["status"] == "done"
+
+
+@pytest.mark.asyncio
+async def test_started_workers_pick_up_queued_jobs(db_session, tmp_path, monkeypatch):
+    runner = ReportRunner(db_session.bind, tmp_path, workers=2, max_running=2)
+    # The API wakes the application's runner; point it at this one
+    monkeypatch.setattr("app.api.reports.runner", runner)
+    await runner.start()
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as c:
+            ids = [(await c.post("/api/reports", json={"date_from": f"{y}-01-01", "date_to": f"{y}-12-31"})).json()["id"]
+                   for y in (2022, 2023, 2024)]
+            for _ in range(100):
+                statuses = {(await c.get(f"/api/reports/{i}")).json()["status"] for i in ids}
+                if statuses == {"done"}:
+                    break
+                await asyncio.sleep(0.05)
+            assert statuses == {"done"}
+    finally:
+        await runner.stop()
+    assert runner.tasks == []
+
+
+@pytest.mark.asyncio
+async def test_artifacts_expire(db_session, tmp_path):
+    runner = ReportRunner(db_session.bind, tmp_path, workers=1, max_running=1)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        job = (await c.post("/api/reports", json={"date_from": "2024-01-01", "date_to": "2024-12-31"})).json()
+        assert await runner.run_next()
+        assert await runner.expire() == 0
+        assert len(list(tmp_path.iterdir())) == 1
+
+        await db_session.execute(update(ReportJob).values(finished_at=func.now() - timedelta(days=30)))
+        await db_session.commit()
+        assert await runner.expire() == 1
+        assert list(tmp_path.iterdir()) == []
+        assert (await c.get(f"/api/reports/{job['id']}")).json()["status"] == "expired"
+        assert (await c.get(f"/api/reports/{job['id']}/download")).status_code == 410
+        assert (await c.get("/api/reports/999")).status_code == 404
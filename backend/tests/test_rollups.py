@@ -0,0 +1,68 @@
+from datetime import date
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select, update
+from app.main import app
+from app.models.rollup import MonthlyRollup, ProjectMonthlyRollup
+from app.rollups import check, rebuild, whole_months
+
+
+def test_whole_months():
+    assert whole_months(None, None) == (None, None)
+    assert whole_months(date(2024, 1, 1), date(2024, 3, 31)) == (date(2024, 1, 1), date(2024, 3, 1))
+    assert whole_months(date(2024, 1, 2), date(2024, 3, 30)) == (date(2024, 2, 1), date(2024, 2, 1))
+    assert whole_months(date(2024, 2, 1), date(2024, 2, 29)) == (date(2024, 2, 1), date(2024, 2, 1))
+    assert whole_months(date(2024, 1, 15), date(2024, 2, 10)) is None
+    assert whole_months(date(2024, 1, 15), None) == (date(2024, 2, 1), None)
+    assert whole_months(None, date(2024, 12, 30)) == (None, date(2024, 11, 1))
+
+
+@pytest.mark.asyncio
+async def test_rollups_follow_writes(db_session):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        a = (await c.post("/api/entries", json={
+            "date": "2024-01-31", "description": "A", "amount": 100.10, "entry_type": "Ausgabe",
+            "category_id": 1, "project_ids": [1],
+        })).json()
+        b = (await c.post("/api/entries", json={
+            "date": "2024-01-05", "description": "B", "amount": 0.125, "entry_type": "Einnahme",
+        })).json()
+        assert await check(db_session) == []
+
+        # Move A to another month, type, category and drop its project
+        await c.put(f"/api/entries/{a['id']}", json={
+            "date": "2024-02-01", "amount": 55.55, "entry_type": "Einnahme", "category_id": 2, "project_ids": [],
+        })
+        await c.put(f"/api/entries/{b['id']}", json={"project_ids": [1], "description": "B2"})
+        assert await check(db_session) == []
+
+        rows = (await db_session.execute(select(ProjectMonthlyRollup))).scalars().all()
+        assert sorted((r.month, r.entry_type.value, r.entry_count) for r in rows) == [
+            (date(2024, 1, 1), "Ausgabe", 0), (date(2024, 1, 1), "Einnahme", 1)]
+
+        await c.delete(f"/api/entries/{a['id']}")
+        assert await check(db_session) == []
+
+        summary = (await c.get("/api/entries/summary")).json()
+        assert summary["total_income"] == 0.13
+        assert summary["monthly"] == [{"month": "2024-01", "income": 0.13, "expense": 0.0}]
+
+
+@pytest.mark.asyncio
+async def test_check_detects_drift_and_rebuild_repairs(db_session):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await c.post("/api/entries", json={
+            "date": "2024-03-03", "description": "X", "amount": 10, "entry_type": "Ausgabe", "project_ids": [1],
+        })
+    await db_session.execute(update(MonthlyRollup).values(amount=MonthlyRollup.amount + 1))
+    await db_session.commit()
+    mismatches = await check(db_session)
+    assert len(mismatches) == 1
+    assert mismatches[0]["amount_diff"] == 1
+
+    await rebuild(db_session)
+    await db_session.commit()
+    assert await check(db_session) == []
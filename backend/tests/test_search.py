@@ -0,0 +1,91 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from app.main import app
+from app.api.entries import list_query
+
+ENTRIES = [
+    ("2024-01-05", "Tankstelle Aral", "Diesel für Dienstreise"),
+    ("2024-02-10", "Büromaterial", "Druckerpapier und Toner"),
+    ("2024-03-15", "Rechnung Kunde Müller", None),
+    ("2024-04-20", "Hosting", "Rechnungen für Server"),
+    ("2024-05-25", "Rechnungen Kunde Schmidt", "Rechnung Nr. 12"),
+    ("2024-06-30", "Fahrkarte", "Dienstreise nach Berlin"),
+]
+
+
+async def create_entries(c):
+    ids = {}
+    for i, (day, description, notes) in enumerate(ENTRIES):
+        r = await c.post("/api/entries", json={
+            "date": day, "description": description, "notes": notes, "amount": 10 + i,
+            "entry_type": "Ausgabe", "category_id": 1 if i % 2 else None,
+        })
+        ids[description] = r.json()["id"]
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_search_matches_stems_and_prefixes():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        ids = await create_entries(c)
+
+        found = lambda r: {e["description"] for e in r.json()}
+        # German stemming: "Rechnungen" finds "Rechnung" and vice versa
+        r = await c.get("/api/entries", params={"q": "rechnung"})
+        assert found(r) == {"Rechnung Kunde Müller", "Hosting", "Rechnungen Kunde Schmidt"}
+        # Prefixes match while typing; all words must match
+        assert found(await c.get("/api/entries", params={"q": "tank"})) == {"Tankstelle Aral"}
+        assert found(await c.get("/api/entries", params={"q": "dienst berl"})) == {"Fahrkarte"}
+        # Operators in the input are plain text, not tsquery syntax
+        assert found(await c.get("/api/entries", params={"q": "kunde & | ! müller:*"})) == {"Rechnung Kunde Müller"}
+        r = await c.get("/api/entries", params={"q": "!&|"})
+        assert r.status_code == 200 and len(r.json()) == len(ENTRIES)
+
+        # Description hits rank above notes-only hits
+        r = await c.get("/api/entries", params={"q": "rechnung"})
+        assert r.json()[-1]["id"] == ids["Hosting"]
+        r = await c.get("/api/entries", params={"q": "rechnung", "sort": "date"})
+        assert [e["date"] for e in r.json()] == ["2024-05-25", "2024-04-20", "2024-03-15"]
+
+        # Combined with filters, on every read path
+        params = {"q": "rechnung", "category_id": 1}
+        expected = (await c.get("/api/entries", params=params)).json()
+        assert {e["description"] for e in expected} == {"Hosting"}
+        assert (await c.get("/api/entries", params={**params, "fast": "true"})).json() == expected
+        r = await c.get("/api/entries/export", params={**params, "format": "ndjson"})
+        assert len(r.text.splitlines()) == 1
+
+
+@pytest.mark.asyncio
+async def test_search_pagination_by_relevance():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await create_entries(c)
+        for fast in ("false", "true"):
+            full = (await c.get("/api/entries", params={"q": "rechnung"})).json()
+            ids, cursor = [], None
+            while True:
+                params = {"q": "rechnung", "limit": 1, "fast": fast, **({"cursor": cursor} if cursor else {})}
+                r = await c.get("/api/entries", params=params)
+                ids += [e["id"] for e in r.json()]
+                cursor = r.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            assert ids == [e["id"] for e in full]
+
+        # A date-ordered cursor cannot continue a relevance-ordered listing
+        r = await c.get("/api/entries", params={"limit": 1})
+        r = await c.get("/api/entries", params={"q": "rechnung", "cursor": r.headers["X-Next-Cursor"]})
+        assert r.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_uses_gin_index(db_session):
+    await db_session.execute(text("SET LOCAL enable_seqscan = off"))
+    stmt = list_query(search="rechnung").limit(51)
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    plan = "\n".join((await db_session.execute(text("EXPLAIN " + sql))).scalars())
+    # The partitions' copies of ix_entries_search_vector
+    assert "search_vector_idx" in plan
@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+from app.models.change import EntryChange
+from app.models.entry import Entry, entry_projects
+from app.rollups import check
+from app.seed import SEED_ENTRIES, generate_entries, main, seed, seed_generated
+
+
+def test_generator_is_deterministic():
+    a = list(generate_entries(years=1, per_day=2.5, seed=7))
+    b = list(generate_entries(years=1, per_day=2.5, seed=7))
+    c = list(generate_entries(years=1, per_day=2.5, seed=8))
+    assert a == b
+    assert a != c
+    assert len(a) == 915  # 2020 is a leap year
+    assert a[0]["date"] == date(2020, 1, 1) and a[-1]["date"] == date(2020, 12, 31)
+    assert any(len(e["projects"]) > 1 for e in a)
+
+
+def test_generator_from_leap_day():
+    rows = list(generate_entries(start=date(2024, 2, 29), years=1, per_day=1))
+    assert rows[0]["date"] == date(2024, 2, 29) and rows[-1]["date"] == date(2025, 2, 27)
+    assert len(rows) == 365
+
+
+def test_generator_distribution():
+    rows = list(generate_entries(years=2, per_day=10, income_share=0.5, project_share=0,
+                                 category_weights={"Miete": 1}))
+    assert {e["projects"] == [] for e in rows} == {True}
+    assert {e["category"] for e in rows if e["entry_type"] == "Ausgabe"} == {"Miete"}
+    assert 0.45 < sum(e["entry_type"] == "Einnahme" for e in rows) / len(rows) < 0.55
+
+
+def test_cli_passes_the_distribution(monkeypatch):
+    calls = []
+
+    async def fake_seed_generated(**options):
+        calls.append(options)
+        return 0
+
+    monkeypatch.setattr("app.seed.seed_generated", fake_seed_generated)
+    main(["--generate", "--category-weights", "Miete=2,Recht & Beratung=0.5", "--project-weights", "SaaS=1"])
+    main(["--generate"])
+    assert calls[0]["category_weights"] == {"Miete": 2, "Recht & Beratung": 0.5}
+    assert calls[0]["project_weights"] == {"SaaS": 1}
+    assert calls[1]["category_weights"] is None and calls[1]["project_weights"] is None
+    with pytest.raises(SystemExit):
+        main(["--generate", "--category-weights", "Miete"])
+
+
+@pytest.mark.asyncio
+async def test_seed_generated(setup_db, db_session):
+    n = await seed_generated(setup_db, db_session.bind, batch_size=300, years=1, per_day=3)
+    assert n == 1098
+    assert (await db_session.execute(select(func.count()).select_from(Entry))).scalar() == n
+    # Listeners reload instead of missing the rows
+    assert (await db_session.execute(select(EntryChange.op))).scalars().all() == ["imported"]
+    assert await check(db_session) == []
+
+
+@pytest.mark.asyncio
+async def test_seed_is_idempotent(setup_db, db_session):
+    assert await seed(setup_db, db_session.bind, batch_size=7) == len(SEED_ENTRIES)
+    assert await seed(setup_db, db_session.bind, batch_size=7) == 0
+    assert (await db_session.execute(select(EntryChange.op))).scalars().all() == ["imported"]
+    assert (await db_session.execute(select(func.count()).select_from(Entry))).scalar() == len(SEED_ENTRIES)
+    linked = (await db_session.execute(select(func.count()).select_from(entry_projects))).scalar()
+    assert linked == sum(1 for row in SEED_ENTRIES if row[5])
+    assert await check(db_session) == []
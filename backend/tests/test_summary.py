@@ -0,0 +1,84 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+
+
+def python_summary(entries):
+    """The original in-Python aggregation, kept as a reference for the SQL version."""
+    total_income = sum(float(e["amount"]) for e in entries if e["entry_type"] == "Einnahme")
+    total_expense = sum(float(e["amount"]) for e in entries if e["entry_type"] == "Ausgabe")
+
+    monthly = {}
+    for e in entries:
+        key = e["date"][:7]
+        if key not in monthly:
+            monthly[key] = {"month": key, "income": 0, "expense": 0}
+        if e["entry_type"] == "Einnahme":
+            monthly[key]["income"] += float(e["amount"])
+        else:
+            monthly[key]["expense"] += float(e["amount"])
+
+    by_category = {}
+    for e in entries:
+        if e["entry_type"] == "Ausgabe" and e["category"]:
+            name = e["category"]["name"]
+            by_category[name] = by_category.get(name, 0) + float(e["amount"])
+
+    return {
+        "total_income": total_income,
+        "total_expense": total_expense,
+        "balance": total_income - total_expense,
+        "monthly": sorted(monthly.values(), key=lambda x: x["month"]),
+        "by_category": [{"name": k, "value": v} for k, v in sorted(by_category.items())],
+    }
+
+
+def assert_summary_equal(actual, expected):
+    assert actual["total_income"] == pytest.approx(expected["total_income"])
+    assert actual["total_expense"] == pytest.approx(expected["total_expense"])
+    assert actual["balance"] == pytest.approx(expected["balance"])
+    assert [m["month"] for m in actual["monthly"]] == [m["month"] for m in expected["monthly"]]
+    for a, e in zip(actual["monthly"], expected["monthly"]):
+        assert a["income"] == pytest.approx(e["income"])
+        assert a["expense"] == pytest.approx(e["expense"])
+    assert [c["name"] for c in actual["by_category"]] == [c["name"] for c in expected["by_category"]]
+    for a, e in zip(actual["by_category"], expected["by_category"]):
+        assert a["value"] == pytest.approx(e["value"])
+
+
+@pytest.mark.asyncio
+async def test_summary_matches_python_reference():
+    rng = random.Random(42)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        for i in range(80):
+            entry_type = rng.choice(["Einnahme", "Ausgabe"])
+            await c.post("/api/entries", json={
+                "date": (date(2023, 11, 1) + timedelta(days=rng.randrange(200))).isoformat(),
+                "description": f"Entry {i}",
+                "amount": round(rng.uniform(0, 5000), 2),
+                "entry_type": entry_type,
+                "category_id": rng.choice([None, 1, 2]),
+                "project_ids": rng.choice([[], [1]]),
+            })
+
+        for params in [{}, {"date_from": "2024-01-15"}, {"date_to": "2024-03-10"},
+                       {"date_from": "2024-02-01", "date_to": "2024-02-29"},
+                       {"date_from": "2023-12-01", "date_to": "2024-03-31"}, {"date_from": "2023-12-02", "date_to": "2024-04-29"}]:
+            entries = (await c.get("/api/entries", params=params)).json()
+            r = await c.get("/api/entries/summary", params=params)
+            assert r.status_code == 200
+            assert_summary_equal(r.json(), python_summary(entries))
+
+
+@pytest.mark.asyncio
+async def test_summary_empty_range():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.get("/api/entries/summary", params={"date_from": "2030-01-01"})
+        assert r.json() == {
+            "total_income": 0.0, "total_expense": 0.0, "balance": 0.0, "monthly": [], "by_category": [],
+        }
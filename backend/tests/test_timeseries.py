@@ -0,0 +1,120 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+
+
+def period_start(d: date, granularity: str) -> date:
+    if granularity == "day":
+        return d
+    if granularity == "week":
+        return d - timedelta(days=d.weekday())
+    if granularity == "month":
+        return d.replace(day=1)
+    if granularity == "quarter":
+        return d.replace(month=(d.month - 1) // 3 * 3 + 1, day=1)
+    return d.replace(month=1, day=1)
+
+
+def python_timeseries(entries, granularity, date_from=None, date_to=None, key=lambda e: [None]):
+    """Reference computation over the raw entries: gap-filled periods and running balances."""
+    periods, opening = {}, {}
+    for e in entries:
+        d = date.fromisoformat(e["date"])
+        amount = float(e["amount"]) if e["entry_type"] == "Einnahme" else -float(e["amount"])
+        for group in key(e):
+            if date_from and d < date_from:
+                opening[group] = opening.get(group, 0) + amount
+            elif not date_to or d <= date_to:
+                sums = periods.setdefault(group, {}).setdefault(period_start(d, granularity), [0, 0])
+                sums[0 if amount >= 0 else 1] += abs(amount)
+    groups = set(periods) | set(opening)
+    if not groups:
+        return {}
+    first = period_start(date_from, granularity) if date_from else min(p for g in periods.values() for p in g)
+    last = period_start(date_to, granularity) if date_to else max(p for g in periods.values() for p in g)
+    day = first
+    all_periods = []
+    while day <= last:
+        if period_start(day, granularity) == day:
+            all_periods.append(day)
+        day += timedelta(days=1)
+    result = {}
+    for group in groups:
+        balance = opening.get(group, 0)
+        points = []
+        for p in all_periods:
+            income, expense = periods.get(group, {}).get(p, [0, 0])
+            balance += income - expense
+            points.append((p.isoformat(), income, expense, income - expense, balance))
+        result[group] = points
+    return result
+
+
+def assert_series_equal(actual, expected):
+    assert {s["id"] for s in actual["series"]} == set(expected)
+    for s in actual["series"]:
+        points = [(p["period"], p["income"], p["expense"], p["net"], p["balance"]) for p in s["points"]]
+        assert [p[0] for p in points] == [p[0] for p in expected[s["id"]]]
+        for a, e in zip(points, expected[s["id"]]):
+            assert a[1:] == pytest.approx(e[1:])
+
+
+@pytest.mark.asyncio
+async def test_timeseries_matches_python_reference():
+    rng = random.Random(7)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await c.post("/api/projects", json={"name": "Consulting"})
+        for i in range(60):
+            await c.post("/api/entries", json={
+                "date": (date(2023, 10, 1) + timedelta(days=rng.randrange(300))).isoformat(),
+                "description": f"Entry {i}",
+                "amount": round(rng.uniform(0, 1000), 2),
+                "entry_type": rng.choice(["Einnahme", "Ausgabe"]),
+                "category_id": rng.choice([None, 1, 2]),
+                "project_ids": rng.choice([[], [1], [1, 2]]),
+            })
+        entries = (await c.get("/api/entries")).json()
+
+        for granularity in ["day", "week", "month", "quarter", "year"]:
+            for date_from, date_to in [(None, None), (date(2024, 2, 10), None), (date(2023, 12, 5), date(2024, 5, 20))]:
+                params = {"granularity": granularity}
+                if date_from:
+                    params["date_from"] = date_from.isoformat()
+                if date_to:
+                    params["date_to"] = date_to.isoformat()
+                r = await c.get("/api/entries/timeseries", params=params)
+                assert r.status_code == 200
+                assert_series_equal(r.json(), python_timeseries(entries, granularity, date_from, date_to))
+
+        params = {"granularity": "month", "date_from": "2024-01-01"}
+        r = (await c.get("/api/entries/timeseries", params={**params, "group_by": "category"})).json()
+        assert_series_equal(r, python_timeseries(entries, "month", date(2024, 1, 1),
+                                                 key=lambda e: [e["category_id"]]))
+        assert [s["name"] for s in r["series"]] == [None, "Büro", "Software"]
+        r = (await c.get("/api/entries/timeseries", params={**params, "group_by": "project"})).json()
+        assert_series_equal(r, python_timeseries(entries, "month", date(2024, 1, 1),
+                                                 key=lambda e: [p["id"] for p in e["projects"]]))
+        assert [s["name"] for s in r["series"]] == ["DeFi", "Consulting"]
+
+
+@pytest.mark.asyncio
+async def test_timeseries_fills_gaps_and_revalidates():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        assert (await c.get("/api/entries/timeseries")).json()["series"] == []
+        for day, amount in [("2024-01-15", 100), ("2024-04-02", 30)]:
+            await c.post("/api/entries", json={
+                "date": day, "description": "x", "amount": amount, "entry_type": "Einnahme",
+            })
+        r = await c.get("/api/entries/timeseries", params={"granularity": "month"})
+        [series] = r.json()["series"]
+        assert [(p["period"], p["income"], p["balance"]) for p in series["points"]] == [
+            ("2024-01-01", 100, 100), ("2024-02-01", 0, 100), ("2024-03-01", 0, 100), ("2024-04-01", 30, 130),
+        ]
+        r = await c.get("/api/entries/timeseries", params={"granularity": "month"}, headers={"If-None-Match": r.headers["ETag"]})
+        assert r.status_code == 304
+        assert (await c.get("/api/entries/timeseries", params={"granularity": "hour"})).status_code == 422
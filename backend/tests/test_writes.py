@@ -0,0 +1,118 @@
+import asyncio
+from datetime import date
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import delete, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.config import settings
+from app.main import app
+from app.models.entry import Entry, EntryType, entry_projects
+from app.models.rollup import ProjectMonthlyRollup
+from app.rollups import check
+
+# The row lock of updates and deletes, one write CTE, the two rollup
+# upserts and the change feed event
+MAX_WRITE_STATEMENTS = 5
+
+
+@pytest.mark.asyncio
+async def test_writes_return_the_stored_entry_in_few_statements(monkeypatch, db_session):
+    monkeypatch.setattr(settings, "DEBUG_QUERY_HEADERS", True)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        b = (await c.post("/api/projects", json={"name": "Beratung"})).json()["id"]
+        c2 = (await c.post("/api/projects", json={"name": "Coaching"})).json()["id"]
+
+        r = await c.post("/api/entries", json={
+            "date": "2024-06-01", "description": "Workshop", "amount": 99.995, "entry_type": "Einnahme",
+            "category_id": 2, "project_ids": [c2, 1, 999],
+        })
+        assert int(r.headers["X-Query-Count"]) <= MAX_WRITE_STATEMENTS
+        created = r.json()
+        assert created["amount"] == 100.0
+        assert created["category"] == {"id": 2, "name": "Software"}
+        assert created["projects"] == [{"id": 1, "name": "DeFi"}, {"id": c2, "name": "Coaching"}]
+        entry_id = created["id"]
+
+        # Keep one project, drop one, add one
+        r = await c.put(f"/api/entries/{entry_id}", json={"project_ids": [b, c2], "date": "2024-07-15", "category_id": None})
+        assert int(r.headers["X-Query-Count"]) <= MAX_WRITE_STATEMENTS
+        updated = r.json()
+        assert updated["date"] == "2024-07-15"
+        assert updated["category"] is None
+        assert [p["name"] for p in updated["projects"]] == ["Beratung", "Coaching"]
+
+        r = await c.put(f"/api/entries/{entry_id}", json={"description": "Workshop II"})
+        assert int(r.headers["X-Query-Count"]) <= MAX_WRITE_STATEMENTS
+        assert [p["name"] for p in r.json()["projects"]] == ["Beratung", "Coaching"]
+
+        # Required columns may be left out, not cleared
+        for field in ("amount", "date", "entry_type", "description"):
+            r = await c.put(f"/api/entries/{entry_id}", json={field: None})
+            assert r.status_code == 422, field
+        r = await c.put(f"/api/entries/{entry_id}", json={"category_id": None, "notes": None})
+        assert r.status_code == 200
+
+        r = await c.put(f"/api/entries/{entry_id}", json={"project_ids": []})
+        assert r.json()["projects"] == []
+        assert (await c.put("/api/entries/999999", json={"notes": "x"})).status_code == 404
+
+        # What the writes returned is what a read returns
+        r = await c.put(f"/api/entries/{entry_id}", json={"project_ids": [1], "category_id": 1, "notes": "n"})
+        listed = (await c.get("/api/entries")).json()
+        assert listed == [r.json()]
+        assert await check(db_session) == []
+
+
+async def move_concurrently(setup_db, entry_id: int, project_id: int, request) -> object:
+    """Run ``request`` while another transaction moves the entry from project 1 to ``project_id``."""
+    async with setup_db() as other:
+        await other.execute(update(Entry).where(Entry.id == entry_id).values(notes="moved"))
+        await other.execute(delete(entry_projects).where(entry_projects.c.entry_id == entry_id))
+        await other.execute(insert(entry_projects).values(entry_id=entry_id, entry_date=date(2024, 6, 1),
+                                                         project_id=project_id))
+        await other.execute(update(ProjectMonthlyRollup).where(ProjectMonthlyRollup.project_id == 1)
+                            .values(amount=0, entry_count=0))
+        await other.execute(pg_insert(ProjectMonthlyRollup).values(
+            month=date(2024, 6, 1), entry_type=EntryType.EINNAHME, project_id=project_id, amount=100, entry_count=1))
+        pending = asyncio.create_task(request)
+        await asyncio.sleep(0.3)
+        # Waiting for the row lock
+        assert not pending.done()
+        await other.commit()
+    return await pending
+
+
+async def add_linked_entry(c) -> tuple[int, int]:
+    b = (await c.post("/api/projects", json={"name": "Beratung"})).json()["id"]
+    entry_id = (await c.post("/api/entries", json={
+        "date": "2024-06-01", "description": "Workshop", "amount": 100, "entry_type": "Einnahme", "project_ids": [1],
+    })).json()["id"]
+    return entry_id, b
+
+
+@pytest.mark.asyncio
+async def test_delete_sees_links_changed_concurrently(monkeypatch, db_session, setup_db):
+    monkeypatch.setattr(settings, "DEBUG_QUERY_HEADERS", True)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        entry_id, b = await add_linked_entry(c)
+        r = await move_concurrently(setup_db, entry_id, b, c.delete(f"/api/entries/{entry_id}"))
+        assert r.status_code == 204
+        assert int(r.headers["X-Query-Count"]) <= MAX_WRITE_STATEMENTS
+    assert await check(db_session) == []
+
+
+@pytest.mark.asyncio
+async def test_update_sees_links_changed_concurrently(monkeypatch, db_session, setup_db):
+    monkeypatch.setattr(settings, "DEBUG_QUERY_HEADERS", True)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        entry_id, b = await add_linked_entry(c)
+        r = await move_concurrently(setup_db, entry_id, b, c.put(f"/api/entries/{entry_id}", json={"amount": 50}))
+        assert r.status_code == 200
+        assert int(r.headers["X-Query-Count"]) <= MAX_WRITE_STATEMENTS
+        assert [p["id"] for p in r.json()["projects"]] == [b]
+        assert r.json()["notes"] == "moved"
+    assert await check(db_session) == []